@@ -0,0 +1,165 @@
+"""
+Бенчмарк генерации договоров: старый рендер vs предкомпилированный шаблон.
+
+Для каждого типа из CONTRACT_TEMPLATES замеряется:
+  - старый способ: Document(шаблон) + три прохода replace_text_in_paragraph по параграфам,
+    таблицам, заголовкам и футерам + doc.save;
+  - новый способ: DocxTemplate.render (шаблон скомпилирован один раз, время компиляции печатается отдельно).
+Оба варианта пишут в BytesIO, чтобы не мерить диск. Дополнительно сверяется текст
+получившихся документов.
+
+Запуск:
+    python benchmark_contract_templates.py [--runs 20]
+"""
+import argparse
+import io
+import os
+import statistics
+import time
+
+from docx import Document
+
+from commands.contract_commands import (
+    CONTRACT_TEMPLATES, OBSOLETE_PLACEHOLDERS, build_contract_replacements, get_project_root,
+    number_to_words_rubles
+)
+from utils.docx_template import DocxTemplate
+
+PRIORITY_PLACEHOLDERS = ("{{date}}", "{{num_doc}}", "{{fio}}")
+
+
+def sample_data(contract_type):
+    return {
+        "contract_type": contract_type,
+        "contract_student_telegram": "@benchmark",
+        "contract_fio": "Иванов Иван Иванович",
+        "advance_amount": 120000,
+        "advance_amount_text": number_to_words_rubles(120000),
+        "payment_type": "Ежемесячный платеж",
+        "payment_months": 4,
+        "commission_months": 2,
+        "contract_address": "г. Москва, ул. Тверская, д. 1, кв. 1",
+        "contract_inn": "771234567890",
+        "contract_rs": "40817810099910004312",
+        "contract_ks": "30101810400000000225",
+        "contract_bank": "ПАО Сбербанк",
+        "contract_bik": "044525225",
+        "contract_email": "student@example.com",
+    }
+
+
+def replace_text_in_paragraph(paragraph, old_text, new_text):
+    """Старая замена: весь текст параграфа переносится в первый run."""
+    if not old_text or not new_text:
+        return False
+    runs = paragraph.runs
+    if not runs:
+        return False
+    full_text = ''.join([run.text for run in runs])
+    if old_text not in full_text:
+        return False
+    new_full_text = full_text.replace(old_text, new_text)
+    if new_full_text == full_text:
+        return False
+    for run in runs:
+        run.text = ""
+    runs[0].text = new_full_text
+    return True
+
+
+def body_paragraphs(doc):
+    yield from doc.paragraphs
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                yield from cell.paragraphs
+
+
+def legacy_render(template_path, replacements):
+    """Старый generate_contract без вычисления замен: разбор шаблона и проходы по всем параграфам."""
+    doc = Document(template_path)
+    priority = {key: replacements[key] for key in PRIORITY_PLACEHOLDERS}
+
+    for paragraph in body_paragraphs(doc):
+        for old_text, new_text in priority.items():
+            if new_text:
+                replace_text_in_paragraph(paragraph, old_text, new_text)
+
+    for _ in range(3):
+        for paragraph in body_paragraphs(doc):
+            for old_text, new_text in replacements.items():
+                if new_text == "" or old_text in priority:
+                    continue
+                replace_text_in_paragraph(paragraph, old_text, new_text)
+
+    for section in doc.sections:
+        for paragraph in list(section.header.paragraphs) + list(section.footer.paragraphs):
+            for old_text, new_text in replacements.items():
+                if new_text:
+                    replace_text_in_paragraph(paragraph, old_text, new_text)
+
+    for paragraph in body_paragraphs(doc):
+        full_text = ''.join([run.text for run in paragraph.runs])
+        for old_ph in OBSOLETE_PLACEHOLDERS:
+            if old_ph in full_text:
+                full_text = full_text.replace(old_ph, "")
+                for run in paragraph.runs:
+                    run.text = ""
+                if paragraph.runs:
+                    paragraph.runs[0].text = full_text
+
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def compiled_render(template, replacements):
+    values = {placeholder: value for placeholder, value in replacements.items() if value}
+    values.update(dict.fromkeys(OBSOLETE_PLACEHOLDERS, ""))
+    return template.render_bytes(values)
+
+
+def document_text(data):
+    doc = Document(io.BytesIO(data))
+    return [paragraph.text for paragraph in body_paragraphs(doc)]
+
+
+def measure(func, runs):
+    timings = []
+    result = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк рендера договоров")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    base_dir = get_project_root()
+    for contract_type, relative_path in CONTRACT_TEMPLATES.items():
+        template_path = os.path.join(base_dir, relative_path)
+        replacements = build_contract_replacements(sample_data(contract_type))
+
+        started = time.perf_counter()
+        template = DocxTemplate(template_path)
+        compile_ms = (time.perf_counter() - started) * 1000
+
+        legacy_ms, legacy_doc = measure(lambda: legacy_render(template_path, replacements), args.runs)
+        compiled_ms, compiled_doc = measure(lambda: compiled_render(template, replacements), args.runs)
+        same_text = document_text(legacy_doc) == document_text(compiled_doc)
+
+        print(f"📄 {contract_type} ({os.path.getsize(template_path) / 1024:.0f} КБ, "
+              f"плейсхолдеров: {len(template.placeholders)})")
+        print(f"   компиляция шаблона: {compile_ms:8.2f} мс (один раз на процесс)")
+        print(f"   старый рендер:      {legacy_ms:8.2f} мс (медиана из {args.runs})")
+        print(f"   новый рендер:       {compiled_ms:8.2f} мс (медиана из {args.runs}), "
+              f"ускорение x{legacy_ms / compiled_ms:.1f}")
+        print(f"   {'✅ текст документов совпадает' if same_text else '⚠️ текст документов отличается'}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Бенчмарк расчета ЗП фуллстека на синтетических данных.
+
+Во временной схеме сессии создаются таблицы students и fullstack_topic_assignments (перекрывают
+настоящие на время транзакции) и заполняются N фуллстек студентами с принятыми темами
+у директоров и кураторов. Замеряются:
+  - старый расчет: выборка всех записей + запрос Student на каждого студента
+    + два запроса на каждого студента для 10% бонусов;
+  - новый calculate_fullstack_salary: один агрегированный запрос (EXPLAIN ANALYZE печатается отдельно).
+Итоговые ЗП обоих вариантов сверяются. В конце транзакция откатывается — настоящие данные не затрагиваются.
+
+Запуск:
+    python benchmark_fullstack_salary.py [--students 20000]
+"""
+import argparse
+import time
+from datetime import date
+
+from sqlalchemy import func, text
+from sqlalchemy.dialects import postgresql
+
+from commands.fullstack_salary_calculator import (
+    calculate_fullstack_salary, fullstack_assignment_stats_query, FULLSTACK_START_DATE
+)
+from commands.fullstack_constants import TOPIC_FIELD_MAPPING, AUTO_MODULE_FIELD_MAPPING
+from config import Config
+from data_base.db import session
+from data_base.models import Student, FullstackTopicAssign
+
+PERIOD_START = date(2025, 10, 1)
+PERIOD_END = date(2025, 10, 31)
+
+SETUP_SQL = [
+    "CREATE TEMP TABLE students (LIKE public.students INCLUDING DEFAULTS INCLUDING INDEXES) ON COMMIT DROP",
+    "CREATE TEMP TABLE fullstack_topic_assignments "
+    "(LIKE public.fullstack_topic_assignments INCLUDING DEFAULTS INCLUDING INDEXES) ON COMMIT DROP",
+    # Треть студентов на директорах, остальные у кураторов (id 10..19); часть пришла до сентября
+    """
+    INSERT INTO students (id, fio, telegram, start_date, training_type, total_cost,
+                          mentor_id, auto_mentor_id)
+    SELECT i,
+           'Студент ' || i,
+           '@student_' || i,
+           DATE '2025-06-01' + (i % 150),
+           'Фуллстек',
+           CASE WHEN i % 50 = 0 THEN 0 ELSE 150000 + (i % 20) * 5000 END,
+           CASE WHEN i % 3 = 0 THEN 1 ELSE 10 + i % 10 END,
+           CASE WHEN i % 3 = 0 THEN 3 ELSE 10 + (i + 5) % 10 END
+    FROM generate_series(1, :students) AS i
+    """,
+    # От 1 до 4 ручных и авто тем на студента, ~5% дублей одной и той же сдачи
+    """
+    INSERT INTO fullstack_topic_assignments (student_id, mentor_id, topic_manual, topic_auto, assigned_at)
+    SELECT s.i,
+           CASE WHEN s.i % 3 = 0 THEN 1 ELSE 10 + s.i % 10 END,
+           CASE WHEN k = 1 THEN '1 модуль' ELSE 'Тема ' || k END,
+           NULL,
+           DATE '2025-09-20' + ((s.i + k) % 40)
+    FROM generate_series(1, :students) AS s(i)
+    CROSS JOIN generate_series(1, 4) AS k
+    WHERE k <= 1 + s.i % 4
+    UNION ALL
+    SELECT s.i,
+           CASE WHEN s.i % 3 = 0 THEN 3 ELSE 10 + (s.i + 5) % 10 END,
+           NULL,
+           CASE WHEN k = 2 THEN 'Сдача 2 модуля' ELSE 'Сдача ' || k || ' модуля' END,
+           DATE '2025-09-25' + ((s.i * k) % 40)
+    FROM generate_series(1, :students) AS s(i)
+    CROSS JOIN generate_series(1, 4) AS k
+    WHERE s.i % 2 = 0 AND k <= 1 + s.i % 4
+    """,
+    """
+    INSERT INTO fullstack_topic_assignments (student_id, mentor_id, topic_manual, topic_auto, assigned_at)
+    SELECT student_id, mentor_id, topic_manual, topic_auto, assigned_at
+    FROM fullstack_topic_assignments
+    WHERE id % 20 = 0
+    """,
+    "ANALYZE students",
+    "ANALYZE fullstack_topic_assignments",
+]
+
+
+def legacy_salaries(start_date, end_date):
+    """Старый расчет (без логов): N+1 запросов к students и fullstack_topic_assignments."""
+    assignments = session.query(FullstackTopicAssign).join(Student).filter(
+        Student.training_type == "Фуллстек",
+        Student.start_date >= FULLSTACK_START_DATE,
+        func.date(FullstackTopicAssign.assigned_at) >= start_date,
+        func.date(FullstackTopicAssign.assigned_at) <= end_date
+    ).order_by(FullstackTopicAssign.assigned_at, FullstackTopicAssign.id).all()
+    unique = {}
+    for a in assignments:
+        unique.setdefault((a.student_id, a.mentor_id, a.topic_manual, a.topic_auto, a.assigned_at), a)
+
+    students = {}
+    for a in unique.values():
+        data = students.get(a.student_id)
+        if data is None:
+            data = students[a.student_id] = {
+                'student': session.query(Student).filter(Student.id == a.student_id).first(),
+                'manual': 0, 'auto': 0, 'curators': {}
+            }
+        if a.mentor_id == 1 and a.topic_manual is not None:
+            data['manual'] += 1
+        elif a.mentor_id == 3 and a.topic_auto is not None:
+            data['auto'] += 1
+        elif a.mentor_id not in (1, 3):
+            curator = data['curators'].setdefault(a.mentor_id, {'direction': None, 'assignments': []})
+            if curator['direction'] is None:
+                curator['direction'] = 'manual' if a.topic_manual is not None else 'auto' if a.topic_auto else None
+            curator['assignments'].append(a)
+
+    directors = {1: 0.0, 3: 0.0}
+    curators = {}
+    for data in students.values():
+        total_cost = float(data['student'].total_cost or 0)
+        if total_cost == 0:
+            continue
+        if data['curators']:
+            for curator_id, info in data['curators'].items():
+                if info['direction'] == 'manual':
+                    accepted = sum(1 for a in info['assignments'] if a.topic_manual is not None)
+                    salary = accepted * Config.FULLSTACK_MANUAL_COURSE_COST * 0.20 / 8
+                elif info['direction'] == 'auto':
+                    accepted = sum(1 for a in info['assignments'] if a.topic_auto is not None)
+                    salary = accepted * Config.FULLSTACK_AUTO_COURSE_COST * 0.20 / 6
+                else:
+                    continue
+                curators[curator_id] = curators.get(curator_id, 0) + salary
+        else:
+            directors[1] += data['manual'] * total_cost * 0.3 / len(TOPIC_FIELD_MAPPING)
+            directors[3] += data['auto'] * total_cost * 0.3 / len(AUTO_MODULE_FIELD_MAPPING)
+
+    for student in session.query(Student).filter(
+        Student.training_type == "Фуллстек", Student.start_date >= FULLSTACK_START_DATE
+    ).all():
+        if not student.total_cost:
+            continue
+        for director_id, field, topic, own in (
+            (1, FullstackTopicAssign.topic_manual, "1 модуль", student.mentor_id == 1),
+            (3, FullstackTopicAssign.topic_auto, "Сдача 2 модуля", student.auto_mentor_id == 3),
+        ):
+            passed = session.query(FullstackTopicAssign).filter(
+                FullstackTopicAssign.student_id == student.id,
+                field == topic,
+                FullstackTopicAssign.assigned_at >= start_date,
+                FullstackTopicAssign.assigned_at <= end_date
+            ).first() is not None
+            if passed and not own:
+                directors[director_id] += float(student.total_cost) * 0.1
+    return directors, curators
+
+
+def same_salaries(left, right):
+    return left.keys() == right.keys() and all(abs(left[k] - right[k]) < 0.01 for k in left)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк расчета ЗП фуллстека")
+    parser.add_argument("--students", type=int, default=20000)
+    args = parser.parse_args()
+
+    try:
+        started = time.perf_counter()
+        for sql in SETUP_SQL:
+            session.execute(text(sql), {"students": args.students})
+        print(f"🧪 Синтетика: {args.students} студентов, подготовка {time.perf_counter() - started:.2f} с")
+
+        started = time.perf_counter()
+        legacy_directors, legacy_curators = legacy_salaries(PERIOD_START, PERIOD_END)
+        legacy_ms = (time.perf_counter() - started) * 1000
+        print(f"🐢 Старый расчет: {legacy_ms:.1f} мс")
+
+        query = fullstack_assignment_stats_query(session, PERIOD_START, PERIOD_END)
+        compiled = query.statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+        plan = session.execute(text(f"EXPLAIN (ANALYZE, FORMAT JSON) {compiled}")).scalar()
+        print(f"🗄  Агрегированный запрос (EXPLAIN ANALYZE): {plan[0]['Execution Time']:.1f} мс")
+
+        started = time.perf_counter()
+        result = calculate_fullstack_salary(PERIOD_START, PERIOD_END)
+        new_ms = (time.perf_counter() - started) * 1000
+        print(f"🚀 Новый расчет: {new_ms:.1f} мс, ускорение x{legacy_ms / new_ms:.1f}")
+
+        same = (same_salaries(legacy_directors, result['director_salaries'])
+                and same_salaries(legacy_curators, result['curator_salaries']))
+        print("✅ ЗП совпадают" if same else "⚠️ ЗП отличаются")
+    finally:
+        session.rollback()
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Бенчмарк check_postpayment_job на синтетических данных.
+
+Во временной схеме сессии создаются таблицы students и payments (перекрывают настоящие
+на время транзакции), заполняются N студентами "Устроился" и их платежами-комиссиями,
+после чего замеряются:
+  - время выполнения запроса в БД (EXPLAIN ANALYZE);
+  - время выборки строк в Python;
+  - время evaluate_postpayment_issues.
+В конце транзакция откатывается — настоящие данные не затрагиваются.
+
+Запуск:
+    python benchmark_postpayment_job.py [--students 50000]
+"""
+import argparse
+import time
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from check_postpayment_job import employed_students_query, evaluate_postpayment_issues
+from data_base.db import session
+
+SETUP_SQL = [
+    "CREATE TEMP TABLE students (LIKE public.students INCLUDING DEFAULTS INCLUDING INDEXES) ON COMMIT DROP",
+    "CREATE TEMP TABLE payments (LIKE public.payments INCLUDING DEFAULTS INCLUDING INDEXES) ON COMMIT DROP",
+    """
+    INSERT INTO students (id, fio, telegram, mentor_id, training_status, commission, salary,
+                          commission_paid, employment_date)
+    SELECT i,
+           'Студент ' || i,
+           '@student_' || i,
+           1,
+           'Устроился',
+           (1 + i % 3) || ', ' || (30 + (i % 3) * 10) || '%',
+           100000 + (i % 50) * 1000,
+           (i % 4) * 20000,
+           CURRENT_DATE - (i % 180)
+    FROM generate_series(1, :students) AS i
+    """,
+    # У двух третей студентов от 1 до 3 платежей-комиссий за последние полгода
+    """
+    INSERT INTO payments (id, student_id, amount, payment_date, comment, status, payment_kind)
+    SELECT row_number() OVER (), s.i, 20000, CURRENT_DATE - ((s.i * k) % 180), 'Комиссия', 'подтвержден', 'commission'
+    FROM generate_series(1, :students) AS s(i)
+    CROSS JOIN generate_series(1, 3) AS k
+    WHERE s.i % 3 <> 0 AND k <= 1 + s.i % 3
+    """,
+    "ANALYZE students",
+    "ANALYZE payments",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк проверки постоплаты")
+    parser.add_argument("--students", type=int, default=50000)
+    args = parser.parse_args()
+
+    try:
+        started = time.perf_counter()
+        for sql in SETUP_SQL:
+            session.execute(text(sql), {"students": args.students})
+        print(f"🧪 Синтетика: {args.students} студентов, подготовка {time.perf_counter() - started:.2f} с")
+
+        query = employed_students_query(session)
+        compiled = query.statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+        plan = session.execute(text(f"EXPLAIN (ANALYZE, FORMAT JSON) {compiled}")).scalar()
+        print(f"🗄  Запрос в БД (EXPLAIN ANALYZE): {plan[0]['Execution Time']:.1f} мс")
+
+        started = time.perf_counter()
+        rows = query.all()
+        fetch_ms = (time.perf_counter() - started) * 1000
+        print(f"📥 Выборка {len(rows)} строк: {fetch_ms:.1f} мс")
+
+        started = time.perf_counter()
+        issues = evaluate_postpayment_issues(rows, date.today())
+        evaluate_ms = (time.perf_counter() - started) * 1000
+        print(f"🧮 Проверка условий: {evaluate_ms:.1f} мс, найдено проблем: {len(issues)}")
+    finally:
+        session.rollback()
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
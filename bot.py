@@ -14,8 +14,10 @@ from commands.contract_commands import (
     start_contract_formation, handle_contract_menu, handle_student_telegram,
     handle_contract_type, handle_advance_amount, handle_payment_type, handle_months,
     handle_commission_type, handle_commission_custom, handle_fio, handle_address,
-    handle_inn, handle_rs, handle_ks, handle_bank, handle_bik, handle_email
+    handle_inn, handle_rs, handle_ks, handle_bank, handle_bik, handle_email,
+    preload_contract_templates
 )
+from commands.contract_batch_commands import handle_batch_contract_type, handle_batch_contract_file
 from commands.create_meeting import create_meeting_entry, select_meeting_type
 from commands.mentor_bonus_commands import start_bonus_process, handle_mentor_tg, handle_bonus_amount
 from commands.referral_commands import start_ref_module, show_inner_refs, ask_ref_tg, process_single_payout, \
@@ -30,8 +32,9 @@ from commands.states import NOTIFICATION_MENU, PAYMENT_NOTIFICATION_MENU, STATIS
     CONTRACT_MENU, CONTRACT_STUDENT_TG, CONTRACT_TYPE, \
     CONTRACT_ADVANCE_AMOUNT, CONTRACT_PAYMENT_TYPE, CONTRACT_MONTHS, CONTRACT_COMMISSION_TYPE, \
     CONTRACT_COMMISSION_CUSTOM, CONTRACT_FIO, CONTRACT_ADDRESS, CONTRACT_INN, CONTRACT_RS, CONTRACT_KS, \
-    CONTRACT_BANK, CONTRACT_BIK, CONTRACT_EMAIL, MEETING_TYPE_SELECTION, UE_MENU, UE_START_PERIOD, UE_END_PERIOD, \
-    EXPENSE_SUB_CATEGORY, EXPENSE_REFERRER, VPN_AWAITING_TELEGRAM, REF_MENU, REF_WAIT_TG, REF_CONFIRM_PAYOUT, PAYMENT_CHANNEL
+    CONTRACT_BANK, CONTRACT_BIK, CONTRACT_EMAIL, CONTRACT_BATCH_TYPE, CONTRACT_BATCH_FILE, \
+    MEETING_TYPE_SELECTION, UE_MENU, UE_START_PERIOD, UE_END_PERIOD, \
+    EXPENSE_SUB_CATEGORY, EXPENSE_REFERRER, VPN_AWAITING_TELEGRAM, VPN_AWAITING_COHORT, REF_MENU, REF_WAIT_TG, REF_CONFIRM_PAYOUT, PAYMENT_CHANNEL
 from commands.student_commands import (
     handle_student_deletion, handle_new_value,
     handle_payment_date, start_contract_signing, handle_contract_signing,
@@ -47,7 +50,9 @@ from commands.student_selection import find_student, handle_multiple_students
 from commands.student_statistic_commands import show_statistics_menu, \
     show_manual_testing_statistics, show_automation_testing_statistics, show_fullstack_statistics, request_period_start, \
     handle_period_start, handle_period_end, show_held_amounts
-from commands.vpn_commands import start_vpn_config, handle_vpn_telegram
+from commands.vpn_commands import start_vpn_config, handle_vpn_telegram, handle_vpn_cohort, shutdown_vpn_queue
+from utils.db_session import DBSessionApplication
+from utils.background_jobs import shutdown_report_jobs
 from commands.unit_economics_commands import (
     show_unit_economics_menu,
     show_latest_unit_economics,
@@ -66,9 +71,21 @@ TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 
 
 
+async def post_shutdown(application):
+    """Останавливает фоновые очереди при остановке бота."""
+    await shutdown_report_jobs(application)
+    await shutdown_vpn_queue(application)
+
+
 def main():
-    # Создание приложения Telegram
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    # Создание приложения Telegram (каждый апдейт обрабатывается в своей сессии БД)
+    application = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .application_class(DBSessionApplication)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     # Обработчик добавления студента
     add_student_handler = ConversationHandler(
@@ -251,6 +268,10 @@ def main():
             CONTRACT_BANK: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_bank)],
             CONTRACT_BIK: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_bik)],
             CONTRACT_EMAIL: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_email)],
+            CONTRACT_BATCH_TYPE: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_batch_contract_type)],
+            CONTRACT_BATCH_FILE: [
+                MessageHandler((filters.TEXT | filters.Document.ALL) & ~filters.COMMAND, handle_batch_contract_file)
+            ],
         },
         fallbacks=[
             MessageHandler(filters.Regex("^🔙 Отмена$"), exit_to_main_menu),
@@ -348,6 +369,9 @@ def main():
             VPN_AWAITING_TELEGRAM: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, handle_vpn_telegram),
             ],
+            VPN_AWAITING_COHORT: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_vpn_cohort),
+            ],
         },
         fallbacks=[
             MessageHandler(filters.Regex("^Главное меню$"), exit_to_main_menu),
@@ -359,6 +383,9 @@ def main():
     # application.add_handler(MessageHandler(filters.Regex("Отмена"), cancel))  # Доп. проверка
     # application.add_handler(MessageHandler(filters.ALL, debug))
 
+    # Шаблоны договоров разбираем один раз при старте
+    preload_contract_templates()
+
     # Запуск бота
     application.run_polling()
 
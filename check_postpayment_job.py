@@ -6,9 +6,9 @@
 
 import os
 import sys
-import json
 import asyncio
 from datetime import datetime, date, timedelta
+from functools import lru_cache
 from sqlalchemy import func
 from telegram import Bot
 from telegram.error import TelegramError
@@ -17,7 +17,8 @@ from telegram.error import TelegramError
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from data_base.db import session
-from data_base.models import Student, Payment
+from data_base.job_state import lock_job, sync_job_state
+from data_base.models import Student, Payment, PaymentKind
 from commands.logger import custom_logger
 
 logger = custom_logger
@@ -25,7 +26,7 @@ logger = custom_logger
 # Настройки Telegram бота
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_TOKEN')
 ADMIN_CHAT_ID = os.getenv('ADMIN_CHAT_ID')  # ID чата для отправки уведомлений
-STATE_FILE = "prev_postpayment_issues.json"
+JOB_NAME = "postpayment_issues"  # Ключ состояния джобы в таблице job_state
 
 # Загружаем переменные из .env файла
 from dotenv import load_dotenv
@@ -35,159 +36,139 @@ load_dotenv()
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_TOKEN')
 ADMIN_CHAT_ID = os.getenv('ADMIN_CHAT_ID')
 
-def calculate_commission(student):
+@lru_cache(maxsize=1024)
+def parse_commission(commission):
     """
-    Вычисляет общую комиссию и уже выплаченную сумму для студента.
+    Разбирает строку комиссии "N, P%" в (количество выплат, процент).
+    Различных строк немного, поэтому результат кэшируется.
     """
-    try:
-        if not student.commission:
-            return 0, 0
-            
-        # Разделяем данные комиссии (количество выплат, процент)
-        commission_info = student.commission.split(", ")
-        payments = int(commission_info[0]) if len(commission_info) > 0 and commission_info[0].isdigit() else 0
-        percentage = int(commission_info[1].replace("%", "")) if len(commission_info) > 1 else 0
-
-        # Зарплата
-        salary = student.salary or 0
+    if not commission:
+        return 0, 0
+    commission_info = commission.split(", ")
+    payments = int(commission_info[0]) if len(commission_info) > 0 and commission_info[0].isdigit() else 0
+    percentage = int(commission_info[1].replace("%", "")) if len(commission_info) > 1 else 0
+    return payments, percentage
 
-        # Расчёт общей комиссии
-        total_commission = (salary * percentage / 100) * payments
 
-        # Выплаченная комиссия
-        paid_commission = student.commission_paid or 0
+def resolve_employment_date(employment_date, last_commission_date):
+    """
+    Дата трудоустройства: поле employment_date, а если его нет — дата последнего платежа-комиссии.
+    """
+    if employment_date:
+        # Проверяем, что это объект date, а не строка
+        if isinstance(employment_date, str):
+            try:
+                return datetime.strptime(employment_date, "%Y-%m-%d").date()
+            except ValueError:
+                return None
+        return employment_date
+    return last_commission_date
 
-        return total_commission, paid_commission
-    except Exception as e:
-        logger.error(f"Ошибка при расчёте комиссии для студента {student.id}: {e}")
-        return 0, 0
 
-def get_last_commission_payment_date(student_id):
+def employed_students_query(db_session):
     """
-    Получает дату последнего платежа с комментарием "Комиссия" для студента.
+    Все данные для проверки одним запросом: студенты "Устроился" с комиссией
+    и дата последнего подтверждённого платежа-комиссии каждого (GROUP BY по платежам).
     """
-    try:
-        last_payment = session.query(Payment).filter(
-            Payment.student_id == student_id,
-            Payment.comment.ilike("%комисси%"),
+    last_commission = (
+        db_session.query(
+            Payment.student_id.label("student_id"),
+            func.max(Payment.payment_date).label("last_commission_date")
+        )
+        .filter(
+            Payment.payment_kind == PaymentKind.COMMISSION,
             Payment.status == "подтвержден"
-        ).order_by(Payment.payment_date.desc()).first()
-        
-        return last_payment.payment_date if last_payment else None
-    except Exception as e:
-        logger.error(f"Ошибка при получении последнего платежа комиссии для студента {student_id}: {e}")
-        return None
+        )
+        .group_by(Payment.student_id)
+        .subquery()
+    )
+    return (
+        db_session.query(
+            Student.id,
+            Student.fio,
+            Student.telegram,
+            Student.commission,
+            Student.salary,
+            Student.commission_paid,
+            Student.employment_date,
+            last_commission.c.last_commission_date,
+        )
+        .outerjoin(last_commission, last_commission.c.student_id == Student.id)
+        .filter(
+            Student.training_status == "Устроился",
+            Student.commission.isnot(None)
+        )
+    )
 
-def get_employment_date(student):
-    """
-    Получает дату трудоустройства студента.
-    """
-    try:
-        # Предполагаем, что дата трудоустройства хранится в поле employment_date
-        # Если такого поля нет, можно использовать другое поле или логику
-        if hasattr(student, 'employment_date') and student.employment_date:
-            # Проверяем, что это объект date, а не строка
-            if isinstance(student.employment_date, str):
-                try:
-                    return datetime.strptime(student.employment_date, "%Y-%m-%d").date()
-                except:
-                    return None
-            return student.employment_date
-        
-        # Альтернативная логика: ищем последний платеж "Комиссия" как дату трудоустройства
-        last_commission_date = get_last_commission_payment_date(student.id)
-        if last_commission_date:
-            return last_commission_date
-            
-        return None
-    except Exception as e:
-        logger.error(f"Ошибка при получении даты трудоустройства для студента {student.id}: {e}")
-        return None
 
-def get_current_postpayment_issues():
+def fetch_employed_students(db_session):
+    return employed_students_query(db_session).all()
+
+
+def evaluate_postpayment_issues(rows, current_date):
     """
-    Получает текущий список студентов с проблемами постоплаты.
+    Применяет три условия постоплаты к строкам fetch_employed_students.
+    В БД не ходит — работает только со снимком, поэтому легко проверяется на синтетике.
     """
-    logger.info("🔍 Начинаем проверку условий постоплаты...")
-    
-    # Получаем всех студентов со статусом "Устроился"
-    employed_students = session.query(Student).filter(
-        Student.training_status == "Устроился"
-    ).all()
-    
-    logger.info(f"📊 Найдено студентов со статусом 'Устроился': {len(employed_students)}")
-    
-    issues = []
-    current_date = date.today()
     one_month_ago = current_date - timedelta(days=30)
-    
-    for student in employed_students:
+    issues = []
+
+    for row in rows:
         try:
-            # Получаем общую и выплаченную комиссию
-            total_commission, paid_commission = calculate_commission(student)
-            
-            if total_commission == 0:
-                continue  # Пропускаем студентов без комиссии
-            
-            # Проверяем, выплачена ли вся комиссия
-            if paid_commission >= total_commission:
-                continue  # Комиссия полностью выплачена
-            
-            # Получаем дату трудоустройства
-            employment_date = get_employment_date(student)
-            
-            # Получаем дату последнего платежа комиссии
-            last_commission_date = get_last_commission_payment_date(student.id)
-            
-            # Проверяем различные условия
-            issue_reasons = []
-            
+            payments, percentage = parse_commission(row.commission)
+            total_commission = ((row.salary or 0) * percentage / 100) * payments
+            paid_commission = row.commission_paid or 0
+
+            # Пропускаем студентов без комиссии и с полностью выплаченной комиссией
+            if total_commission == 0 or paid_commission >= total_commission:
+                continue
+
+            last_commission_date = row.last_commission_date
+            employment_date = resolve_employment_date(row.employment_date, last_commission_date)
+
             # Условие 1: Сумма оплаченной комиссии не равна сумме полной комиссии
-            if paid_commission < total_commission:
-                issue_reasons.append(f"Неполная выплата комиссии: {paid_commission}/{total_commission} руб.")
-            
+            # (после проверки выше выполняется всегда)
+            issue_reasons = [f"Неполная выплата комиссии: {paid_commission}/{total_commission} руб."]
+
             # Условие 2: Нет платежей "Комиссия" + устроился больше месяца назад
-            if (not last_commission_date and employment_date and 
-                employment_date < one_month_ago):
+            if not last_commission_date and employment_date and employment_date < one_month_ago:
                 issue_reasons.append("Нет платежей 'Комиссия' + устроился больше месяца назад")
-            
+
             # Условие 3: Последний платеж "Комиссия" был больше месяца назад и не все выплатил
-            if (last_commission_date and last_commission_date < one_month_ago and 
-                paid_commission < total_commission):
+            if last_commission_date and last_commission_date < one_month_ago:
                 issue_reasons.append("Последний платеж 'Комиссия' больше месяца назад + неполная выплата")
-            
-            # Если есть проблемы, добавляем в список
-            if issue_reasons:
-                issues.append({
-                    'student_id': student.id,
-                    'student_name': student.fio,
-                    'student_telegram': student.telegram,
-                    'total_commission': total_commission,
-                    'paid_commission': paid_commission,
-                    'employment_date': str(employment_date) if employment_date else None,
-                    'last_commission_date': str(last_commission_date) if last_commission_date else None,
-                    'reasons': issue_reasons
-                })
-                
+
+            issues.append({
+                'student_id': row.id,
+                'student_name': row.fio,
+                'student_telegram': row.telegram,
+                'total_commission': total_commission,
+                'paid_commission': paid_commission,
+                'employment_date': str(employment_date) if employment_date else None,
+                'last_commission_date': str(last_commission_date) if last_commission_date else None,
+                'reasons': issue_reasons
+            })
+
         except Exception as e:
-            logger.error(f"Ошибка при проверке студента {student.id}: {e}")
+            logger.error(f"Ошибка при проверке студента {row.id}: {e}")
             continue
-    
-    logger.info(f"📊 Найдено студентов с проблемами постоплаты: {len(issues)}")
+
     return issues
 
-def load_previous_issues():
-    """Загружает предыдущий список проблем из файла."""
-    try:
-        with open(STATE_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return []
 
-def save_current_issues(issues):
-    """Сохраняет текущий список проблем в файл."""
-    with open(STATE_FILE, "w", encoding="utf-8") as f:
-        json.dump(issues, f, ensure_ascii=False, indent=2)
+def get_current_postpayment_issues():
+    """
+    Получает текущий список студентов с проблемами постоплаты.
+    """
+    logger.info("🔍 Начинаем проверку условий постоплаты...")
+
+    rows = fetch_employed_students(session)
+    logger.info(f"📊 Найдено студентов со статусом 'Устроился' и комиссией: {len(rows)}")
+
+    issues = evaluate_postpayment_issues(rows, date.today())
+
+    logger.info(f"📊 Найдено студентов с проблемами постоплаты: {len(issues)}")
+    return issues
 
 async def notify_new_issues(new_issues):
     """Уведомляет о новых проблемах с постоплатой."""
@@ -309,25 +290,20 @@ async def check_new_issues():
     """
     Проверяет новые проблемы с постоплатой и уведомляет об изменениях.
     """
+    if not lock_job(session, JOB_NAME):
+        session.rollback()
+        logger.info("⏭ Проверка постоплаты уже выполняется на другом хосте")
+        return
+
     current_issues = get_current_postpayment_issues()
-    previous_issues = load_previous_issues()
-    
-    # Создаем словари для сравнения по student_id
-    current_dict = {issue['student_id']: issue for issue in current_issues}
-    previous_dict = {issue['student_id']: issue for issue in previous_issues}
-    
-    # Находим новые проблемы
-    new_issues = []
-    for student_id, issue in current_dict.items():
-        if student_id not in previous_dict:
-            new_issues.append(issue)
-    
-    # Находим решенные проблемы (были в списке, но больше нет)
-    resolved_issues = []
-    for student_id, issue in previous_dict.items():
-        if student_id not in current_dict:
-            resolved_issues.append(issue)
-    
+
+    # Новые и решённые проблемы считаются в БД по job_state (ключ — student_id)
+    new_issues, resolved_issues = sync_job_state(
+        session, JOB_NAME, {issue['student_id']: issue for issue in current_issues}
+    )
+    session.commit()
+    logger.info(f"📊 Состояние обновлено: {len(current_issues)} проблем")
+
     # Уведомляем о новых проблемах
     if new_issues:
         await notify_new_issues(new_issues)
@@ -336,13 +312,6 @@ async def check_new_issues():
     if resolved_issues:
         await notify_resolved_issues(resolved_issues)
     
-    # Сохраняем текущее состояние, если есть изменения
-    if sorted(current_issues, key=lambda x: x['student_id']) != sorted(previous_issues, key=lambda x: x['student_id']):
-        save_current_issues(current_issues)
-        logger.info(f"📊 Состояние обновлено: {len(current_issues)} проблем")
-        if resolved_issues:
-            logger.info(f"✅ Решено проблем: {len(resolved_issues)}")
-    
     # Отправляем уведомление о завершении
     await notify_cron_job_completed()
 
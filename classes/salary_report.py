@@ -0,0 +1,174 @@
+from datetime import datetime, time
+
+from data_base.models import Salary, Mentor, SalaryKK, CareerConsultant, Student, Payment
+
+
+class SalaryReport:
+    """
+    Снимок отчета по зарплате за период.
+
+    Все данные (начисления менторов, начисления КК, студенты, платежи, имена сотрудников)
+    загружаются фиксированным числом запросов при построении отчета. Экраны "Выплатить ЗП",
+    "История операций" и выбор сотрудника работают только с этим снимком и в БД не ходят.
+    """
+
+    def __init__(self, start_date, end_date):
+        self.start_date = start_date
+        self.end_date = end_date
+        # {mentor_id: {'total', 'paid', 'to_pay', 'logs'}}
+        self.mentor_data = {}
+        # {mentor_id: full_name}
+        self.mentor_names = {}
+        # {kk_id: full_name}
+        self.kk_names = {}
+        # {kk_id: [item, ...]} — все начисления КК за период, от новых к старым
+        self.kk_items = {}
+        # {kk_id: сумма невыплаченных начислений}
+        self.kk_to_pay = {}
+
+    @classmethod
+    def build(cls, session, start_date, end_date):
+        """
+        Строит отчет за период тремя запросами:
+        1. Начисления менторов (Salary).
+        2. Имена менторов, у которых есть начисления (IN по id).
+        3. Начисления КК вместе с именем КК, ФИО студента и суммой исходного платежа (JOIN).
+        """
+        report = cls(start_date, end_date)
+
+        # Фильтр по времени (весь день до 23:59:59)
+        start_dt = datetime.combine(start_date, time.min)
+        end_dt = datetime.combine(end_date, time.max)
+
+        # 1. Начисления менторов
+        salary_records = session.query(Salary).filter(
+            Salary.date_calculated >= start_dt,
+            Salary.date_calculated <= end_dt
+        ).all()
+
+        for record in salary_records:
+            m_id = record.mentor_id
+            if not m_id:
+                continue
+
+            amount = float(record.calculated_amount)
+            data = report.mentor_data.setdefault(m_id, {'total': 0.0, 'paid': 0.0, 'to_pay': 0.0, 'logs': []})
+            data['total'] += amount
+            if record.is_paid:
+                data['paid'] += amount
+            else:
+                data['to_pay'] += amount
+
+            status_icon = "✅" if record.is_paid else "⏳"
+            date_log = record.date_calculated.strftime("%d.%m") if record.date_calculated else "??"
+            data['logs'].append(f"{status_icon} {date_log}: {record.comment} | {amount:,.2f}р.")
+
+        # 2. Имена только тех менторов, которые попали в отчет
+        if report.mentor_data:
+            mentors = session.query(Mentor.id, Mentor.full_name).filter(
+                Mentor.id.in_(list(report.mentor_data.keys()))
+            ).all()
+            report.mentor_names = {m_id: full_name for m_id, full_name in mentors}
+
+        # 3. Начисления КК одним запросом со всеми связанными данными
+        kk_rows = (
+            session.query(SalaryKK, CareerConsultant.full_name, Student.fio, Payment.amount)
+            .join(CareerConsultant, CareerConsultant.id == SalaryKK.kk_id)
+            .outerjoin(Student, Student.id == SalaryKK.student_id)
+            .outerjoin(Payment, Payment.id == SalaryKK.payment_id)
+            .filter(
+                SalaryKK.date_calculated >= start_dt,
+                SalaryKK.date_calculated <= end_dt
+            )
+            .order_by(SalaryKK.date_calculated.desc())
+            .all()
+        )
+
+        for item, kk_name, student_fio, payment_amount in kk_rows:
+            report.kk_names[item.kk_id] = kk_name
+            amount = float(item.calculated_amount)
+            report.kk_items.setdefault(item.kk_id, []).append({
+                'student_id': item.student_id,
+                'student_name': student_fio,
+                'payment_amount': float(payment_amount) if payment_amount is not None else 0.0,
+                'amount': amount,
+                'remaining_limit': float(item.remaining_limit),
+                'is_paid': item.is_paid,
+                'date_calculated': item.date_calculated,
+            })
+            if not item.is_paid:
+                report.kk_to_pay[item.kk_id] = report.kk_to_pay.get(item.kk_id, 0.0) + amount
+
+        return report
+
+    def mentor_name(self, mentor_id):
+        return self.mentor_names.get(mentor_id, f"ID {mentor_id}")
+
+    def kk_name(self, kk_id):
+        return self.kk_names.get(kk_id, "КК")
+
+    def unpaid_kk_items(self, kk_id):
+        """Невыплаченные начисления КК в хронологическом порядке."""
+        return [item for item in reversed(self.kk_items.get(kk_id, [])) if not item['is_paid']]
+
+    def summary_text(self, period_str):
+        """Текст главного экрана отчета (менторы + невыплаченные начисления КК)."""
+        text = f"📊 <b>ОТЧЕТ ПО ЗАРПЛАТЕ ({period_str})</b>\n"
+        text += "Использована таблица транзакций (Salary)\n\n"
+        text += "👨‍🏫 <b>Менторы:</b>\n"
+
+        total_to_pay_global = 0.0
+        found_any = False
+
+        for m_id, data in self.mentor_data.items():
+            to_pay = data['to_pay']
+            paid = data['paid']
+
+            if to_pay == 0 and paid == 0:
+                continue
+
+            found_any = True
+            total_to_pay_global += to_pay
+
+            line = f"• {self.mentor_name(m_id)}: <b>{to_pay:,.2f} руб.</b> (с налогом: {to_pay * 1.06:,.2f})"
+            if paid > 0:
+                line += f" | <i>выплачено: {paid:,.2f} руб.</i>"
+            text += line + "\n"
+
+        if not found_any:
+            text += "Нет начислений за этот период.\n"
+
+        # --- БЛОК КАРЬЕРНЫХ КОНСУЛЬТАНТОВ ---
+        text += "\n💼 <b>Карьерные Консультанты:</b>\n"
+
+        if not self.kk_to_pay:
+            text += "<i>Начислений по КК не найдено</i>\n"
+        else:
+            for kk_id, kk_sum in self.kk_to_pay.items():
+                total_to_pay_global += kk_sum
+                text += f"👤 <b>{self.kk_name(kk_id)}</b>\n"
+
+                for item in self.unpaid_kk_items(kk_id):
+                    student_name = item['student_name'] or f"ID:{item['student_id']}"
+                    text += (f"  ▫️ {student_name}: <b>{item['amount']:,.2f} руб. (с налогом: {item['amount'] * 1.06:,.2f})</b> "
+                             f"(Ост. лимит: {item['remaining_limit']:,.2f})\n")
+
+        text += "---"
+        text += f"\n💵 <b>ОБЩИЙ ИТОГ К ВЫПЛАТЕ: {total_to_pay_global:.2f} руб.</b>"
+        return text
+
+    def kk_history_text(self, kk_id):
+        """История всех начислений КК за период (экран детализации)."""
+        text = f"💼 <b>История операций КК: {self.kk_name(kk_id)}</b>\n\n"
+        items = self.kk_items.get(kk_id, [])
+
+        if not items:
+            return text + "<i>Записей за этот период не найдено.</i>"
+
+        for item in items:
+            st_name = item['student_name'] or "Студент"
+            status = "✅" if item['is_paid'] else "⏳"
+            date_str = item['date_calculated'].strftime('%d.%m') if item['date_calculated'] else "??"
+            text += (f"{status} <b>{date_str}</b> | {st_name}\n"
+                     f"   └ Платёж: {item['payment_amount']:,.2f}р. | Бонус: <b>+{item['amount']:,.2f}р.</b>\n")
+        return text
@@ -2,15 +2,17 @@
 Менеджер VPN-конфигурационных файлов.
 
 Оркестрирует полный цикл генерации VPN-конфига:
-SSH-подключение → выполнение скрипта → скачивание файла через SFTP → локальное хранение.
+SSH-соединение из пула → выполнение скрипта → скачивание файла через SFTP → локальное хранение.
 """
 
 import logging
 import os
 from typing import Optional
 
-from utils.ssh.ssh_client import SSHClient, SSHConnectionError, SSHCommandError
+from data_base.file_id_cache import VPN_CONFIG
+from utils.ssh.ssh_client import SSHConnectionError, SSHCommandError, get_connection_pool
 from utils.ssh.console import RemoteConsole, VPNConfigError
+from utils.telegram_files import forget_cached_documents
 
 logger = logging.getLogger(__name__)
 
@@ -19,9 +21,9 @@ class VPNConfigManager:
     """
     Управление жизненным циклом VPN-конфигурационных файлов.
 
-    Подключается к VPN-серверу по SSH, вызывает wrapper-скрипт
-    для выпуска .ovpn конфига и скачивает его в локальную
-    директорию ``doc/``.
+    Берёт SSH-соединение к VPN-серверу из общего пула процесса
+    (соединения переиспользуются между выпусками), вызывает wrapper-скрипт
+    для выпуска .ovpn конфига и скачивает его в локальную директорию ``doc/``.
 
     Args:
         host: Имя хоста или IP VPN-сервера.
@@ -30,6 +32,8 @@ class VPNConfigManager:
         port: SSH-порт (по умолчанию 22).
         local_config_dir: Локальная директория для хранения .ovpn файлов.
             Если не указано, используется ``doc/`` в корне проекта.
+        pool_size: Максимум одновременных SSH-соединений к серверу.
+        keepalive: Интервал keepalive-пакетов SSH в секундах.
     """
 
     def __init__(
@@ -39,22 +43,28 @@ class VPNConfigManager:
         key_path: str,
         port: int = 22,
         local_config_dir: Optional[str] = None,
+        pool_size: int = 2,
+        keepalive: int = 30,
     ) -> None:
         self._host: str = host
         self._username: str = username
         self._key_path: str = key_path
         self._port: int = port
         self._local_config_dir: str = local_config_dir or self._default_config_dir()
+        self._pool = get_connection_pool(
+            host, username, key_path, port=port, max_size=pool_size, keepalive=keepalive
+        )
 
     def issue_config(self, telegram_user_id: int) -> str:
         """
         Сгенерировать (или перегенерировать) VPN-конфиг для студента.
 
         Полный pipeline:
-            1. Подключение к VPN-серверу по SSH
+            1. SSH-соединение с VPN-сервером из пула
             2. Выполнение wrapper-скрипта (отзыв старого + создание нового)
             3. Скачивание .ovpn файла через SFTP
             4. Сохранение в локальную директорию ``doc/``
+            5. Сброс кэша file_id Telegram для старого конфига
 
         Args:
             telegram_user_id: Telegram user_id студента.
@@ -69,12 +79,7 @@ class VPNConfigManager:
         local_path: str = self.get_local_config_path(telegram_user_id)
 
         try:
-            with SSHClient(
-                host=self._host,
-                username=self._username,
-                key_path=self._key_path,
-                port=self._port,
-            ) as ssh:
+            with self._pool.connection() as ssh:
                 console = RemoteConsole(ssh)
                 remote_path: str = console.issue_vpn_config(telegram_user_id)
                 ssh.download_file(remote_path, local_path)
@@ -90,6 +95,9 @@ class VPNConfigManager:
                 f"Не удалось скачать конфиг с VPN-сервера: {e}"
             ) from e
 
+        # Старый конфиг отозван — его file_id больше нельзя отправлять
+        forget_cached_documents(VPN_CONFIG, telegram_user_id)
+
         logger.info("VPN: конфиг сохранён локально: %s", local_path)
         return local_path
 
@@ -0,0 +1,255 @@
+"""
+Асинхронная очередь выпуска VPN-конфигов.
+
+Выпуск (SSH-скрипт + SFTP) блокирующий и занимает секунды, поэтому хендлеры
+только ставят запрос в очередь, а небольшой пул воркеров выполняет
+``VPNConfigManager.issue_config`` в потоках и отправляет файл, когда он готов.
+"""
+
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from classes.vpn_config import VPNConfigManager, VPNConfigError
+from data_base.file_id_cache import VPN_CONFIG
+from utils.telegram_files import send_cached_document
+
+logger = logging.getLogger(__name__)
+
+
+class VPNQueueFullError(Exception):
+    """Очередь выпуска VPN-конфигов заполнена."""
+    pass
+
+
+class VPNIssueBatch:
+    """
+    Пакетный выпуск (например, для всего потока): считает результаты
+    и отправляет итог запросившему, когда обработаны все конфиги.
+
+    Args:
+        chat_id: Чат, куда отправить итог.
+        title: Заголовок итогового сообщения.
+    """
+
+    def __init__(self, chat_id: int, title: str) -> None:
+        self.chat_id: int = chat_id
+        self.title: str = title
+        self.total: int = 0
+        self.issued: int = 0
+        self.failed: List[str] = []
+
+    @property
+    def finished(self) -> bool:
+        return self.issued + len(self.failed) >= self.total
+
+    def summary(self) -> str:
+        lines: List[str] = [f"📦 {self.title}: выпущено {self.issued} из {self.total}"]
+        if self.failed:
+            lines.append(f"\n❌ Ошибки ({len(self.failed)}):")
+            lines.extend(f"  {error}" for error in self.failed[:30])
+            if len(self.failed) > 30:
+                lines.append(f"  ... и еще {len(self.failed) - 30}")
+        return "\n".join(lines)
+
+
+class VPNIssueRequest:
+    """
+    Запрос на выпуск конфига для одного ``telegram_user_id``.
+    Повторные запросы того же пользователя добавляют получателей в существующий запрос.
+    """
+
+    def __init__(self, user_id: int, label: str) -> None:
+        self.user_id: int = user_id
+        self.label: str = label
+        # [(chat_id, batch)] — кому отправить файл
+        self.recipients: List[Tuple[int, Optional[VPNIssueBatch]]] = []
+
+    def add_recipient(self, chat_id: int, batch: Optional[VPNIssueBatch]) -> bool:
+        if any(recipient_chat == chat_id and recipient_batch is batch
+               for recipient_chat, recipient_batch in self.recipients):
+            return False
+        self.recipients.append((chat_id, batch))
+        return True
+
+
+class VPNIssueQueue:
+    """
+    Очередь выпуска VPN-конфигов с дедупликацией по ``telegram_user_id``.
+
+    Одновременно выполняется не больше ``workers`` выпусков (по числу SSH-соединений
+    в пуле), остальные ждут в порядке поступления. Пока конфиг пользователя ждёт
+    или выпускается, повторный запрос не создаёт новую задачу — запросивший
+    получит тот же файл.
+
+    Args:
+        manager_factory: Функция, возвращающая ``VPNConfigManager``.
+        workers: Количество одновременно выпускаемых конфигов.
+        max_pending: Максимум запросов в очереди и в работе.
+    """
+
+    def __init__(
+        self,
+        manager_factory: Callable[[], VPNConfigManager],
+        workers: int = 2,
+        max_pending: int = 500,
+    ) -> None:
+        self._manager_factory = manager_factory
+        self._workers: int = workers
+        self._max_pending: int = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vpn")
+        self._bot = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        # {user_id: запрос} — ожидающие в порядке очереди
+        self._waiting: "OrderedDict[int, VPNIssueRequest]" = OrderedDict()
+        # {user_id: запрос} — выпускаются сейчас
+        self._in_progress: Dict[int, VPNIssueRequest] = {}
+
+    # ── public API ───────────────────────────────────────────────
+
+    def submit(
+        self,
+        bot,
+        chat_id: int,
+        user_id: int,
+        label: str,
+        batch: Optional[VPNIssueBatch] = None,
+    ) -> Tuple[int, bool]:
+        """
+        Поставить выпуск конфига в очередь. Вызывается из event loop бота.
+        Для пакета все submit нужно сделать подряд, без await между ними,
+        иначе итог может уйти до постановки последнего конфига.
+
+        Args:
+            bot: Экземпляр ``telegram.Bot`` для отправки результата.
+            chat_id: Чат, куда отправить .ovpn файл.
+            user_id: Telegram user_id студента.
+            label: Подпись студента для сообщений (ФИО и @telegram).
+            batch: Пакетный выпуск, в итог которого войдёт результат.
+
+        Returns:
+            ``(позиция, дубликат)``: позиция в очереди (0 — уже выпускается)
+            и признак того, что запрос присоединён к уже существующему.
+
+        Raises:
+            VPNQueueFullError: Если очередь заполнена.
+        """
+        self._bot = bot
+        self._ensure_workers()
+
+        request = self._in_progress.get(user_id) or self._waiting.get(user_id)
+        if request is not None:
+            added = request.add_recipient(chat_id, batch)
+            if batch is not None and added:
+                batch.total += 1
+            return self.position(user_id), True
+
+        if self.pending >= self._max_pending:
+            raise VPNQueueFullError(f"В очереди уже {self.pending} запросов")
+
+        request = VPNIssueRequest(user_id, label)
+        request.add_recipient(chat_id, batch)
+        if batch is not None:
+            batch.total += 1
+        self._waiting[user_id] = request
+        self._queue.put_nowait(user_id)
+        return self.position(user_id), False
+
+    def position(self, user_id: int) -> int:
+        """Позиция в очереди (1 — следующий), 0 — уже выпускается, -1 — запроса нет."""
+        if user_id in self._in_progress:
+            return 0
+        for index, waiting_user_id in enumerate(self._waiting, start=1):
+            if waiting_user_id == user_id:
+                return index
+        return -1
+
+    @property
+    def pending(self) -> int:
+        return len(self._waiting) + len(self._in_progress)
+
+    async def shutdown(self) -> None:
+        """Остановить воркеры и пул потоков (post_shutdown бота)."""
+        for task in self._worker_tasks:
+            task.cancel()
+        self._worker_tasks = []
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # ── private ──────────────────────────────────────────────────
+
+    def _ensure_workers(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        self._worker_tasks = [task for task in self._worker_tasks if not task.done()]
+        loop = asyncio.get_running_loop()
+        while len(self._worker_tasks) < self._workers:
+            self._worker_tasks.append(loop.create_task(self._worker()))
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            user_id: int = await self._queue.get()
+            request = self._waiting.pop(user_id, None)
+            if request is None:
+                self._queue.task_done()
+                continue
+            self._in_progress[user_id] = request
+
+            local_path: Optional[str] = None
+            error: Optional[str] = None
+            try:
+                logger.info("VPN: выпуск конфига для user_id=%d из очереди", user_id)
+                manager = self._manager_factory()
+                local_path = await loop.run_in_executor(self._executor, manager.issue_config, user_id)
+            except asyncio.CancelledError:
+                raise
+            except VPNConfigError as e:
+                logger.error("VPN config error: %s", e, exc_info=True)
+                error = str(e)
+            except Exception as e:
+                logger.error("Unexpected error in VPN queue: %s", e, exc_info=True)
+                error = f"непредвиденная ошибка: {e}"
+            finally:
+                self._in_progress.pop(user_id, None)
+                self._queue.task_done()
+
+            await self._deliver(request, local_path, error)
+
+    async def _deliver(self, request: VPNIssueRequest, local_path: Optional[str], error: Optional[str]) -> None:
+        # Один чат получает файл (или ошибку) один раз, даже если запрашивал и отдельно, и в пакете
+        notified_chats = set()
+        for chat_id, batch in request.recipients:
+            try:
+                if chat_id in notified_chats:
+                    pass
+                elif error is None:
+                    # Первый получатель загружает файл, остальные получают его по file_id
+                    await send_cached_document(
+                        self._bot, chat_id, VPN_CONFIG, request.user_id, local_path,
+                        os.path.basename(local_path), caption=f"✅ VPN конфиг для {request.label}",
+                    )
+                    notified_chats.add(chat_id)
+                elif batch is None:
+                    await self._bot.send_message(
+                        chat_id=chat_id,
+                        text=f"❌ Ошибка генерации VPN конфига для {request.label}:\n{error}\n\n"
+                             "Обратитесь к администратору сервера.",
+                    )
+                    notified_chats.add(chat_id)
+            except Exception as e:
+                logger.error("VPN: не удалось отправить результат в чат %s: %s", chat_id, e)
+
+            if batch is not None:
+                if error is None:
+                    batch.issued += 1
+                else:
+                    batch.failed.append(f"{request.label}: {error}")
+                if batch.finished:
+                    try:
+                        await self._bot.send_message(chat_id=batch.chat_id, text=batch.summary())
+                    except Exception as e:
+                        logger.error("VPN: не удалось отправить итог пакета в чат %s: %s", batch.chat_id, e)
@@ -3,7 +3,7 @@ from datetime import date
 from decimal import Decimal
 from sqlalchemy import func
 from data_base.db import session
-from data_base.models import Student, Payment, Salary, SalaryKK, CuratorCommission
+from data_base.models import Student, Payment, PaymentKind, Salary, SalaryKK, CuratorCommission
 # Импортируй свой класс здесь
 from classes.comission import AdminCommissionManager
 
@@ -30,7 +30,7 @@ def migrate_commissions_by_themes():
     payments = session.query(Payment).filter(
         Payment.payment_date >= start_period,
         Payment.payment_date <= end_period,
-        Payment.comment.ilike("%Комиссия%"),
+        Payment.payment_kind == PaymentKind.COMMISSION,
         Payment.status == "подтвержден"
     ).all()
 
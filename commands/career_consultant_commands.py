@@ -5,7 +5,7 @@ from data_base.models import CareerConsultant
 from commands.start_commands import exit_to_main_menu
 from datetime import datetime
 
-from utils.security import restrict_to
+from utils.security import restrict_to, invalidate_user_roles
 
 # Состояния для добавления карьерного консультанта
 AWAIT_CC_TELEGRAM = "AWAIT_CC_TELEGRAM"
@@ -74,6 +74,8 @@ async def handle_cc_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         session.add(new_consultant)
         session.commit()
+        # Новый КК должен получить доступ сразу, а не после истечения TTL кэша ролей
+        invalidate_user_roles(telegram)
         
         await update.message.reply_text(
             f"✅ Карьерный консультант {full_name} ({telegram}) успешно добавлен!"
@@ -3,7 +3,6 @@ import sys
 from pathlib import Path
 from typing import Optional
 
-from sqlalchemy import func
 
 # Добавляем корень проекта в sys.path, чтобы скрипт работал при прямом запуске
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
@@ -11,7 +10,7 @@ if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
 from data_base.db import session
-from data_base.models import Payment, Mentor, Student
+from data_base.models import Payment, PaymentKind, Mentor, Student
 
 # Жёстко фиксируем год для ноябрьских премий
 NOVEMBER_YEAR = 2025
@@ -27,16 +26,13 @@ def fetch_november_premiums(year: Optional[int] = None):
     start = date(target_year, 11, 1)
     end = date(target_year, 11, 30)
 
-    premium_comment = func.lower(func.coalesce(Payment.comment, ""))
-
     payments = (
         session.query(Payment)
         .filter(
             Payment.payment_date >= start,
             Payment.payment_date <= end,
             Payment.status == "подтвержден",
-            # привели к нижнему регистру, поэтому ищем по нижнему
-            premium_comment.like("%преми%"),
+            Payment.payment_kind == PaymentKind.BONUS,
         )
         .order_by(Payment.payment_date.asc())
         .all()
@@ -0,0 +1,347 @@
+"""
+Пакетное формирование договоров (для потоков онбординга).
+
+Администратор выбирает тип договора и присылает CSV (или просто список Telegram),
+договоры рендерятся параллельно в пуле процессов тем же generate_contract,
+результат приходит одним zip-архивом с отчётом report.csv: время рендера и ошибки по каждому договору.
+"""
+import csv
+import io
+import logging
+import multiprocessing
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from telegram import Update, ReplyKeyboardMarkup
+from telegram.ext import ContextTypes
+
+from commands.contract_commands import (
+    ADVANCE_AMOUNTS, CONTRACT_TEMPLATES, generate_contract, number_to_words_rubles,
+    preload_contract_templates
+)
+from commands.states import CONTRACT_BATCH_TYPE, CONTRACT_BATCH_FILE
+from data_base.db import session
+from data_base.models import Student
+from utils.background_jobs import submit_report
+
+logger = logging.getLogger(__name__)
+
+# Настройки пакетного режима (переопределяются переменными окружения)
+CONTRACT_BATCH_WORKERS = int(os.getenv("CONTRACT_BATCH_WORKERS", str(min(4, os.cpu_count() or 1))))
+CONTRACT_BATCH_MAX_ROWS = int(os.getenv("CONTRACT_BATCH_MAX_ROWS", "500"))
+CONTRACT_BATCH_MAX_FILE_SIZE = 1024 * 1024  # байт
+
+# Колонки CSV → ключи данных generate_contract (как в context.user_data диалога)
+BATCH_COLUMNS = {
+    "telegram": "contract_student_telegram",
+    "fio": "contract_fio",
+    "type": "contract_type",
+    "advance_amount": "advance_amount",
+    "advance_amount_text": "advance_amount_text",
+    "payment_type": "payment_type",
+    "payment_months": "payment_months",
+    "commission_months": "commission_months",
+    "commission_percent": "commission_percent",
+    "address": "contract_address",
+    "inn": "contract_inn",
+    "rs": "contract_rs",
+    "ks": "contract_ks",
+    "bank": "contract_bank",
+    "bik": "contract_bik",
+    "email": "contract_email",
+}
+INT_FIELDS = ("advance_amount", "payment_months", "commission_months", "commission_percent")
+PAYMENT_TYPES = {
+    "единоразовый": "Единоразовый платеж",
+    "единоразовый платеж": "Единоразовый платеж",
+    "ежемесячный": "Ежемесячный платеж",
+    "ежемесячный платеж": "Ежемесячный платеж",
+}
+REPORT_COLUMNS = ["row", "telegram", "file", "status", "render_ms", "error"]
+
+BATCH_HELP = (
+    "Отправьте CSV-файл (разделитель «,» или «;», UTF-8) или список Telegram — по одному в строке.\n\n"
+    "Колонки CSV: telegram (обязательно), fio, type, advance_amount, payment_type "
+    "(единоразовый/ежемесячный), payment_months, commission_months, commission_percent, "
+    "address, inn, rs, ks, bank, bik, email.\n\n"
+    "Пустые значения берутся из выбранного типа договора: первая шаблонная сумма аванса, "
+    "единоразовый платеж, стандартная комиссия. ФИО, если не указано, берется из базы."
+)
+
+
+def parse_batch_rows(text):
+    """
+    Разбирает CSV или список Telegram в список словарей {колонка: значение}.
+    Без заголовка telegram каждая строка считается списком Telegram (первая ячейка).
+    """
+    lines = [line for line in text.splitlines() if line.strip()]
+    if not lines:
+        return []
+
+    try:
+        dialect = csv.Sniffer().sniff(lines[0], delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+
+    rows = list(csv.reader(lines, dialect))
+    header = [cell.strip().lower() for cell in rows[0]]
+    if "telegram" not in header:
+        return [{"telegram": row[0].strip()} for row in rows if row and row[0].strip()]
+
+    unknown = [column for column in header if column and column not in BATCH_COLUMNS]
+    if unknown:
+        raise ValueError(f"Неизвестные колонки: {', '.join(unknown)}")
+
+    return [
+        {column: cell.strip() for column, cell in zip(header, row) if column and cell.strip()}
+        for row in rows[1:]
+        if any(cell.strip() for cell in row)
+    ]
+
+
+def build_batch_contract_data(row, contract_type, students):
+    """
+    Данные договора для generate_contract: значения строки CSV поверх стандартов типа договора.
+    students — {telegram без @: Student.fio}.
+    """
+    contract_type = row.get("type") or contract_type
+    if contract_type not in CONTRACT_TEMPLATES:
+        raise ValueError(f"неизвестный тип договора {contract_type}")
+
+    data = {
+        "advance_amount": ADVANCE_AMOUNTS[contract_type][0]["amount"],
+        "payment_type": "Единоразовый платеж",
+    }
+    for column, value in row.items():
+        data[BATCH_COLUMNS[column]] = value
+    data["contract_type"] = contract_type
+
+    for field in INT_FIELDS:
+        if field in data:
+            try:
+                data[field] = int(data[field])
+            except (TypeError, ValueError):
+                raise ValueError(f"{field} должно быть числом: {data[field]}")
+
+    payment_type = PAYMENT_TYPES.get(str(data["payment_type"]).lower())
+    if payment_type is None:
+        raise ValueError(f"неизвестный тип платежа {data['payment_type']}")
+    data["payment_type"] = payment_type
+    if payment_type == "Ежемесячный платеж" and not data.get("payment_months"):
+        raise ValueError("для ежемесячного платежа нужно payment_months")
+
+    telegram = data["contract_student_telegram"].lstrip("@")
+    data.setdefault("contract_fio", students.get(telegram, ""))
+    if not data["contract_fio"]:
+        raise ValueError("студент не найден в базе и fio не указано")
+    data.setdefault("advance_amount_text", number_to_words_rubles(data["advance_amount"]))
+    return data
+
+
+def _load_student_fios(telegrams):
+    """{telegram без @: ФИО} одним запросом (в базе telegram хранится и с @, и без)."""
+    clean = {telegram.lstrip("@") for telegram in telegrams if telegram}
+    if not clean:
+        return {}
+    variants = list(clean | {f"@{telegram}" for telegram in clean})
+    return {
+        telegram.lstrip("@"): fio
+        for telegram, fio in session.query(Student.telegram, Student.fio).filter(Student.telegram.in_(variants))
+    }
+
+
+def _render_batch_contract(data):
+    """Рендер одного договора в процессе пула. Возвращает (имя файла, содержимое, мс) или (None, ошибка, мс)."""
+    started = time.perf_counter()
+    try:
+        filename, buffer = generate_contract(data, in_memory=True)
+        return filename, buffer.getvalue(), (time.perf_counter() - started) * 1000
+    except Exception as e:
+        return None, str(e), (time.perf_counter() - started) * 1000
+
+
+def _unique_name(filename, used):
+    name, ext = os.path.splitext(filename)
+    candidate = filename
+    index = 2
+    while candidate in used:
+        candidate = f"{name}_{index}{ext}"
+        index += 1
+    used.add(candidate)
+    return candidate
+
+
+def generate_contracts_batch(rows, contract_type, workers=CONTRACT_BATCH_WORKERS):
+    """
+    Формирует договоры по строкам parse_batch_rows и возвращает (имя архива, zip-байты, отчёт).
+    Отчёт — список словарей с колонками REPORT_COLUMNS, он же кладётся в архив как report.csv.
+    Синхронная функция: вызывается из пула тяжёлых задач.
+    """
+    if len(rows) > CONTRACT_BATCH_MAX_ROWS:
+        raise ValueError(f"Слишком много строк: {len(rows)}, максимум {CONTRACT_BATCH_MAX_ROWS}")
+
+    students = _load_student_fios(row.get("telegram", "") for row in rows)
+    report = []
+    jobs = {}
+    for index, row in enumerate(rows, start=1):
+        entry = {"row": index, "telegram": row.get("telegram", ""), "file": "", "status": "error",
+                 "render_ms": "", "error": ""}
+        report.append(entry)
+        try:
+            if not entry["telegram"]:
+                raise ValueError("не указан telegram")
+            jobs[index] = build_batch_contract_data(row, contract_type, students)
+        except ValueError as e:
+            entry["error"] = str(e)
+
+    started = time.perf_counter()
+    used_names = set()
+    archive_buffer = io.BytesIO()
+    # Готовые docx уже сжаты — складываем в архив без повторного сжатия
+    with zipfile.ZipFile(archive_buffer, "w", zipfile.ZIP_STORED) as archive:
+        if jobs:
+            # spawn: процесс бота многопоточный, fork из него небезопасен
+            with ProcessPoolExecutor(
+                max_workers=min(workers, len(jobs)),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=preload_contract_templates,
+            ) as executor:
+                futures = {executor.submit(_render_batch_contract, data): index for index, data in jobs.items()}
+                for future in as_completed(futures):
+                    entry = report[futures[future] - 1]
+                    try:
+                        filename, content, elapsed_ms = future.result()
+                    except Exception as e:
+                        # Упал сам процесс пула (например, BrokenProcessPool)
+                        entry["error"] = str(e)
+                        continue
+                    entry["render_ms"] = f"{elapsed_ms:.1f}"
+                    if filename is None:
+                        entry["error"] = content
+                        continue
+                    entry["file"] = _unique_name(filename, used_names)
+                    entry["status"] = "ok"
+                    archive.writestr(entry["file"], content)
+
+        report_csv = io.StringIO()
+        writer = csv.DictWriter(report_csv, fieldnames=REPORT_COLUMNS)
+        writer.writeheader()
+        writer.writerows(report)
+        archive.writestr("report.csv", report_csv.getvalue().encode("utf-8-sig"))
+
+    ok = sum(1 for entry in report if entry["status"] == "ok")
+    logger.info(f"Пакет договоров ({contract_type}): {ok}/{len(report)} за {time.perf_counter() - started:.1f} с")
+    archive_name = f"Договоры {contract_type} {time.strftime('%Y-%m-%d %H-%M')}.zip"
+    return archive_name, archive_buffer.getvalue(), report
+
+
+def format_batch_report(report, limit=20):
+    ok = [entry for entry in report if entry["status"] == "ok"]
+    failed = [entry for entry in report if entry["status"] != "ok"]
+    timings = [float(entry["render_ms"]) for entry in ok]
+
+    lines = [f"📦 Сформировано договоров: {len(ok)} из {len(report)}"]
+    if timings:
+        lines.append(
+            f"⏱ Рендер: в среднем {sum(timings) / len(timings):.0f} мс, максимум {max(timings):.0f} мс"
+        )
+    if failed:
+        lines.append(f"\n❌ Ошибки ({len(failed)}):")
+        for entry in failed[:limit]:
+            lines.append(f"  строка {entry['row']} {entry['telegram'] or '—'}: {entry['error']}")
+        if len(failed) > limit:
+            lines.append(f"  ... и еще {len(failed) - limit}, полный список в report.csv")
+    return "\n".join(lines)
+
+
+async def send_batch_result(bot, chat_id, result):
+    archive_name, content, report = result
+    await bot.send_document(
+        chat_id=chat_id,
+        document=io.BytesIO(content),
+        filename=archive_name,
+        caption="✅ Пакет договоров сформирован (отчет — report.csv в архиве)"
+    )
+    await bot.send_message(
+        chat_id=chat_id,
+        text=format_batch_report(report),
+        reply_markup=ReplyKeyboardMarkup([["🔙 Главное меню"]], one_time_keyboard=True)
+    )
+
+
+async def start_contract_batch(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Пакетный режим: выбор типа договора."""
+    await update.message.reply_text(
+        "📦 Пакет договоров\n\nВыберите тип договора:",
+        reply_markup=ReplyKeyboardMarkup(
+            [["Ручное", "Авто"], ["Фуллстек", "Экспресс Авто"], ["🔙 Отмена"]],
+            one_time_keyboard=True
+        )
+    )
+    return CONTRACT_BATCH_TYPE
+
+
+async def handle_batch_contract_type(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    contract_type = update.message.text.strip()
+
+    if contract_type == "🔙 Отмена":
+        from commands.start_commands import exit_to_main_menu
+        return await exit_to_main_menu(update, context)
+
+    if contract_type not in CONTRACT_TEMPLATES:
+        await update.message.reply_text("❌ Неверный тип договора. Выберите из предложенных:")
+        return CONTRACT_BATCH_TYPE
+
+    context.user_data['contract_batch_type'] = contract_type
+    await update.message.reply_text(
+        f"📄 Тип договора: {contract_type}\n\n{BATCH_HELP}",
+        reply_markup=ReplyKeyboardMarkup([["🔙 Отмена"]], one_time_keyboard=True)
+    )
+    return CONTRACT_BATCH_FILE
+
+
+async def handle_batch_contract_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Принимает CSV-файл или текстовый список и ставит пакет в пул тяжёлых задач."""
+    message = update.message
+    if message.text and message.text.strip() == "🔙 Отмена":
+        from commands.start_commands import exit_to_main_menu
+        return await exit_to_main_menu(update, context)
+
+    if message.document:
+        if message.document.file_size and message.document.file_size > CONTRACT_BATCH_MAX_FILE_SIZE:
+            await message.reply_text("❌ Файл слишком большой (максимум 1 МБ).")
+            return CONTRACT_BATCH_FILE
+        telegram_file = await message.document.get_file()
+        raw = bytes(await telegram_file.download_as_bytearray())
+        try:
+            text = raw.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            text = raw.decode("cp1251")
+    else:
+        text = message.text or ""
+
+    try:
+        rows = parse_batch_rows(text)
+    except (ValueError, csv.Error) as e:
+        await message.reply_text(f"❌ Не удалось разобрать список: {e}\n\n{BATCH_HELP}")
+        return CONTRACT_BATCH_FILE
+
+    if not rows:
+        await message.reply_text(f"❌ Список пуст.\n\n{BATCH_HELP}")
+        return CONTRACT_BATCH_FILE
+    if len(rows) > CONTRACT_BATCH_MAX_ROWS:
+        await message.reply_text(f"❌ Слишком много строк: {len(rows)}, максимум {CONTRACT_BATCH_MAX_ROWS}.")
+        return CONTRACT_BATCH_FILE
+
+    contract_type = context.user_data['contract_batch_type']
+    await submit_report(
+        update, context, generate_contracts_batch, rows, contract_type,
+        title=f"Пакет договоров ({len(rows)} шт.)",
+        on_result=send_batch_result
+    )
+
+    context.user_data.clear()
+    from commands.start_commands import exit_to_main_menu
+    return await exit_to_main_menu(update, context)
@@ -1,9 +1,11 @@
 """
 Модуль для автоматизации формирования договоров для студентов.
 """
+import asyncio
+import io
 import os
+import time
 from datetime import datetime, date
-from docx import Document
 from num2words import num2words
 from telegram import Update, ReplyKeyboardMarkup
 from telegram.ext import ContextTypes
@@ -16,6 +18,10 @@ from commands.states import (
     CONTRACT_RS, CONTRACT_KS, CONTRACT_BANK, CONTRACT_BIK, CONTRACT_EMAIL
 )
 from utils.security import restrict_to
+from utils.background_jobs import submit_report
+from utils.docx_template import DocxTemplateCache
+from utils.telegram_files import send_cached_document
+from data_base.file_id_cache import CONTRACT
 
 
 def get_project_root():
@@ -58,6 +64,16 @@ CONTRACT_TEMPLATES = {
     "Экспресс Авто": "doc/шаблоны/Шаблон Экспресс Авто.docx"
 }
 
+# Скомпилированные шаблоны договоров (см. utils/docx_template.py)
+contract_templates = DocxTemplateCache()
+
+# Старые плейсхолдеры, которые нужно просто удалить из документа
+OBSOLETE_PLACEHOLDERS = ("{{one-time payment}}", "{{Monthly_payment}}")
+
+# Копии договоров в doc/ нужны для «Отправить существующий» (переопределяются переменными окружения)
+CONTRACT_COPIES_KEEP_DAYS = int(os.getenv("CONTRACT_COPIES_KEEP_DAYS", "90"))  # старше — удаляются
+CONTRACT_COPIES_MAX = int(os.getenv("CONTRACT_COPIES_MAX", "500"))  # 0 — копии не сохраняются
+
 # Шаблонные суммы авансового платежа
 ADVANCE_AMOUNTS = {
     "Ручное": [
@@ -128,7 +144,7 @@ async def start_contract_formation(update: Update, context: ContextTypes.DEFAULT
         "📄 Формирование договора\n\n"
         "Выберите действие:",
         reply_markup=ReplyKeyboardMarkup(
-            [["Создать новый договор"], ["Отправить существующий"], ["🔙 Отмена"]],
+            [["Создать новый договор"], ["Отправить существующий"], ["Пакет договоров"], ["🔙 Отмена"]],
             one_time_keyboard=True
         )
     )
@@ -165,11 +181,14 @@ async def handle_contract_menu(update: Update, context: ContextTypes.DEFAULT_TYP
         )
         context.user_data['resending_contract'] = True
         return CONTRACT_STUDENT_TG
+    elif choice == "Пакет договоров":
+        from commands.contract_batch_commands import start_contract_batch
+        return await start_contract_batch(update, context)
     else:
         await update.message.reply_text(
             "Выберите действие:",
             reply_markup=ReplyKeyboardMarkup(
-                [["Создать новый договор"], ["Отправить существующий"], ["🔙 Отмена"]],
+                [["Создать новый договор"], ["Отправить существующий"], ["Пакет договоров"], ["🔙 Отмена"]],
                 one_time_keyboard=True
             )
         )
@@ -207,12 +226,12 @@ async def handle_student_telegram(update: Update, context: ContextTypes.DEFAULT_
             file_path = file_path_clean
 
         if file_path:
-            with open(file_path, 'rb') as doc_file:
-                await update.message.reply_document(
-                    document=doc_file,
-                    filename=os.path.basename(file_path),
-                    caption="✅ Договор найден и отправлен!"
-                )
+            filename = os.path.basename(file_path)
+            # Повторная отправка того же договора идёт по file_id, без загрузки файла
+            await send_cached_document(
+                context.bot, update.effective_chat.id, CONTRACT, os.path.splitext(filename)[0],
+                file_path, filename, caption="✅ Договор найден и отправлен!"
+            )
             await update.message.reply_text(
                 "Договор отправлен.",
                 reply_markup=ReplyKeyboardMarkup(
@@ -778,25 +797,13 @@ async def handle_email(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     context.user_data['contract_email'] = email
 
-    # Формируем договор
+    # Формируем договор в пуле тяжёлых задач, файл придет отдельным сообщением
     try:
-        file_path = await generate_contract(context.user_data)
-
-        # Отправляем файл пользователю
-        with open(file_path, 'rb') as doc_file:
-            await update.message.reply_document(
-                document=doc_file,
-                filename=os.path.basename(file_path),
-                caption="✅ Договор успешно сформирован!"
-            )
-
-        await update.message.reply_text(
-            "Договор сохранен и отправлен.\n"
-            "Вы можете пересоздать договор или отправить его повторно.",
-            reply_markup=ReplyKeyboardMarkup(
-                [["🔙 Главное меню"]],
-                one_time_keyboard=True
-            )
+        await submit_report(
+            update, context, generate_contract, dict(context.user_data),
+            in_memory=True,
+            title="Договор",
+            on_result=send_generated_contract
         )
 
         # Очищаем данные
@@ -818,36 +825,75 @@ async def handle_email(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return await exit_to_main_menu(update, context)
 
 
-async def generate_contract(data: dict) -> str:
+async def send_generated_contract(bot, chat_id, result):
     """
-    Генерирует договор на основе данных и возвращает путь к файлу.
+    Отправляет сформированный договор в чат (доставка результата из пула задач).
+    result — путь к файлу или (имя файла, BytesIO) от generate_contract(in_memory=True);
+    во втором случае копия для повторной отправки пишется на диск уже после отправки.
     """
-    contract_type = data['contract_type']
-    template_path = CONTRACT_TEMPLATES[contract_type]
-    
-    # Получаем абсолютный путь относительно корня проекта
-    base_dir = get_project_root()
-    template_path = os.path.join(base_dir, template_path)
-    
-    # Логирование для отладки
-    import logging
-    logger = logging.getLogger(__name__)
-    logger.info(f"Поиск шаблона: тип={contract_type}, base_dir={base_dir}, template_path={template_path}")
-    logger.info(f"Проверка существования: {os.path.exists(template_path)}")
-    
-    # Проверяем, существует ли директория шаблонов
-    templates_dir = os.path.join(base_dir, "doc", "шаблоны")
-    logger.info(f"Директория шаблонов: {templates_dir}, существует: {os.path.exists(templates_dir)}")
-    if os.path.exists(templates_dir):
-        files = os.listdir(templates_dir)
-        logger.info(f"Файлы в директории шаблонов: {files}")
+    if isinstance(result, tuple):
+        filename, buffer = result
+        content = buffer.getvalue()
+    else:
+        filename, content = os.path.basename(result), result
+
+    # file_id запоминается, и «Отправить существующий» этого же договора уйдёт без загрузки
+    await send_cached_document(
+        bot, chat_id, CONTRACT, os.path.splitext(filename)[0], content, filename,
+        caption="✅ Договор успешно сформирован!"
+    )
+    if isinstance(result, tuple):
+        await asyncio.to_thread(save_contract_copy, filename, content)
+
+    await bot.send_message(
+        chat_id=chat_id,
+        text="Договор сохранен и отправлен.\n"
+             "Вы можете пересоздать договор или отправить его повторно.",
+        reply_markup=ReplyKeyboardMarkup(
+            [["🔙 Главное меню"]],
+            one_time_keyboard=True
+        )
+    )
+
+
+def get_contract_template(contract_type: str):
+    """
+    Возвращает скомпилированный шаблон договора (разбирается один раз на процесс,
+    перекомпилируется при изменении файла).
+    """
+    template_path = os.path.join(get_project_root(), CONTRACT_TEMPLATES[contract_type])
 
     if not os.path.exists(template_path):
+        import logging
+        logger = logging.getLogger(__name__)
+        templates_dir = os.path.dirname(template_path)
+        if os.path.exists(templates_dir):
+            logger.error(f"Файлы в директории шаблонов: {os.listdir(templates_dir)}")
         raise FileNotFoundError(f"Шаблон {template_path} не найден")
 
-    # Открываем шаблон
-    doc = Document(template_path)
+    return contract_templates.get(template_path)
 
+
+def preload_contract_templates():
+    """
+    Компилирует все шаблоны из CONTRACT_TEMPLATES при старте бота,
+    чтобы первый договор не ждал разбора docx.
+    """
+    import logging
+    logger = logging.getLogger(__name__)
+
+    for contract_type in CONTRACT_TEMPLATES:
+        try:
+            template = get_contract_template(contract_type)
+            logger.info(f"Шаблон договора '{contract_type}' скомпилирован: {sorted(template.placeholders)}")
+        except Exception as e:
+            logger.error(f"Не удалось скомпилировать шаблон договора '{contract_type}': {e}")
+
+
+def build_contract_replacements(data: dict) -> dict:
+    """
+    Собирает словарь замен плейсхолдеров шаблона по данным диалога.
+    """
     # Получаем данные для замены
     contract_date = get_contract_date_formatted()
     contract_number = get_contract_number()
@@ -1016,177 +1062,97 @@ async def generate_contract(data: dict) -> str:
         "{{EMAIL}}": email,
     }
 
-    # Заменяем плейсхолдеры в документе
-    # Важно: заменяем несколько раз, чтобы обработать все вхождения
-    # Сначала основные поля (дата, номер, ФИО)
-    priority_replacements = {
-        "{{date}}": contract_date,
-        "{{num_doc}}": contract_number,
-        "{{fio}}": fio,
-    }
+    return replacements
+
+
+def generate_contract(data: dict, in_memory: bool = False):
+    """
+    Генерирует договор на основе данных.
+    Синхронная функция: вызывается из пула тяжёлых задач (utils.background_jobs).
+
+    По умолчанию сохраняет файл в doc/ и возвращает путь к нему.
+    С in_memory=True рендерит в память и возвращает (имя файла, BytesIO) — без записи на диск.
+    """
+    template = get_contract_template(data['contract_type'])
+    replacements = build_contract_replacements(data)
+
+    # Пустые значения не подставляем (плейсхолдер остаётся в документе),
+    # старые плейсхолдеры для обратной совместимости удаляем
+    values = {placeholder: value for placeholder, value in replacements.items() if value}
+    values.update(dict.fromkeys(OBSOLETE_PLACEHOLDERS, ""))
 
-    # Первый проход - основные поля
-    for paragraph in doc.paragraphs:
-        for old_text, new_text in priority_replacements.items():
-            if new_text:
-                replace_text_in_paragraph(paragraph, old_text, new_text)
-
-    # Обрабатываем таблицы - основные поля
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for paragraph in cell.paragraphs:
-                    for old_text, new_text in priority_replacements.items():
-                        if new_text:
-                            replace_text_in_paragraph(paragraph, old_text, new_text)
-
-    # Второй проход - все остальные поля (делаем несколько проходов для надежности)
-    # Отслеживаем обработанные параграфы для payment_terms, чтобы избежать дублирования
-    processed_paragraphs_payment_terms = set()
-    
-    for _ in range(3):  # 3 прохода для обработки всех вхождений
-        for paragraph in doc.paragraphs:
-            paragraph_id = id(paragraph)
-            for old_text, new_text in replacements.items():
-                # Пропускаем пустые замены и уже обработанные
-                if new_text == "" or old_text in priority_replacements:
-                    continue
-                # Для payment_terms проверяем, не был ли уже обработан этот параграф
-                if old_text == "{{payment_terms}}":
-                    if paragraph_id in processed_paragraphs_payment_terms:
-                        continue
-                    if replace_text_in_paragraph(paragraph, old_text, new_text):
-                        processed_paragraphs_payment_terms.add(paragraph_id)
-                else:
-                    replace_text_in_paragraph(paragraph, old_text, new_text)
-
-        # Обрабатываем таблицы - все остальные поля
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for paragraph in cell.paragraphs:
-                        paragraph_id = id(paragraph)
-                        for old_text, new_text in replacements.items():
-                            # Пропускаем пустые замены и уже обработанные
-                            if new_text == "" or old_text in priority_replacements:
-                                continue
-                            # Для payment_terms проверяем, не был ли уже обработан этот параграф
-                            if old_text == "{{payment_terms}}":
-                                if paragraph_id in processed_paragraphs_payment_terms:
-                                    continue
-                                if replace_text_in_paragraph(paragraph, old_text, new_text):
-                                    processed_paragraphs_payment_terms.add(paragraph_id)
-                            else:
-                                replace_text_in_paragraph(paragraph, old_text, new_text)
-
-    # Обрабатываем заголовки и футеры
-    for section in doc.sections:
-        # Заголовки
-        for header in section.header.paragraphs:
-            header_id = id(header)
-            for old_text, new_text in replacements.items():
-                if new_text:
-                    # Для payment_terms проверяем, не был ли уже обработан этот параграф
-                    if old_text == "{{payment_terms}}":
-                        if header_id not in processed_paragraphs_payment_terms:
-                            if replace_text_in_paragraph(header, old_text, new_text):
-                                processed_paragraphs_payment_terms.add(header_id)
-                    else:
-                        replace_text_in_paragraph(header, old_text, new_text)
-
-        # Футеры
-        for footer in section.footer.paragraphs:
-            footer_id = id(footer)
-            for old_text, new_text in replacements.items():
-                if new_text:
-                    # Для payment_terms проверяем, не был ли уже обработан этот параграф
-                    if old_text == "{{payment_terms}}":
-                        if footer_id not in processed_paragraphs_payment_terms:
-                            if replace_text_in_paragraph(footer, old_text, new_text):
-                                processed_paragraphs_payment_terms.add(footer_id)
-                    else:
-                        replace_text_in_paragraph(footer, old_text, new_text)
-
-    # Обработка универсального плейсхолдера {{payment_terms}} уже выполнена через словарь replacements выше
-    # Также обрабатываем старые плейсхолдеры для обратной совместимости (если они остались в шаблоне)
-    old_placeholders_to_remove = ["{{one-time payment}}", "{{Monthly_payment}}"]
-
-    for paragraph in doc.paragraphs:
-        full_text = ''.join([run.text for run in paragraph.runs])
-        # Удаляем старые плейсхолдеры, если они остались
-        for old_ph in old_placeholders_to_remove:
-            if old_ph in full_text:
-                new_text = full_text.replace(old_ph, "")
-                for run in paragraph.runs:
-                    run.text = ""
-                if paragraph.runs:
-                    paragraph.runs[0].text = new_text
-
-    # То же для таблиц
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for paragraph in cell.paragraphs:
-                    full_text = ''.join([run.text for run in paragraph.runs])
-                    for old_ph in old_placeholders_to_remove:
-                        if old_ph in full_text:
-                            new_text = full_text.replace(old_ph, "")
-                            for run in paragraph.runs:
-                                run.text = ""
-                            if paragraph.runs:
-                                paragraph.runs[0].text = new_text
-
-    # Сохраняем файл
     student_telegram = data.get('contract_student_telegram', 'unknown')
     filename = f"{student_telegram}.docx"
-    
-    # Получаем абсолютный путь относительно корня проекта
-    base_dir = get_project_root()
-    doc_dir = os.path.join(base_dir, "doc")
-    file_path = os.path.join(doc_dir, filename)
 
-    # Создаем папку если не существует
-    os.makedirs(doc_dir, exist_ok=True)
+    if in_memory:
+        buffer = io.BytesIO()
+        template.render(values, buffer)
+        buffer.seek(0)
+        return filename, buffer
 
-    doc.save(file_path)
+    file_path = os.path.join(get_contract_copies_dir(), filename)
+    template.render(values, file_path)
+    cleanup_contract_copies(keep=file_path)
     return file_path
 
 
-def replace_text_in_paragraph(paragraph, old_text, new_text):
+def get_contract_copies_dir():
+    """Папка с копиями сформированных договоров (doc/ в корне проекта)."""
+    doc_dir = os.path.join(get_project_root(), "doc")
+    os.makedirs(doc_dir, exist_ok=True)
+    return doc_dir
+
+
+def save_contract_copy(filename: str, content: bytes):
     """
-    Заменяет текст в параграфе, сохраняя форматирование.
-    Обрабатывает случаи, когда плейсхолдер может быть разбит на несколько runs.
+    Сохраняет копию договора в doc/ для повторной отправки и чистит старые копии.
+    Возвращает путь или None, если хранение копий отключено (CONTRACT_COPIES_MAX=0).
     """
-    if not old_text or not new_text:
-        return False
-
-    # Собираем весь текст из всех runs
-    runs = paragraph.runs
-    if not runs:
-        return False
+    if CONTRACT_COPIES_MAX <= 0:
+        return None
 
-    full_text = ''.join([run.text for run in runs])
+    file_path = os.path.join(get_contract_copies_dir(), filename)
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "wb") as copy_file:
+        copy_file.write(content)
+    os.replace(tmp_path, file_path)
 
-    # Проверяем, есть ли плейсхолдер в тексте
-    if old_text not in full_text:
-        return False
+    cleanup_contract_copies(keep=file_path)
+    return file_path
 
-    # Заменяем все вхождения
-    new_full_text = full_text.replace(old_text, new_text)
 
-    # Если текст не изменился, выходим
-    if new_full_text == full_text:
-        return False
+def cleanup_contract_copies(keep=None):
+    """
+    Ограничивает doc/: удаляет копии договоров старше CONTRACT_COPIES_KEEP_DAYS дней,
+    а затем самые старые сверх CONTRACT_COPIES_MAX. Шаблоны в подпапках не трогаются.
+    Возвращает количество удалённых файлов.
+    """
+    import logging
+    logger = logging.getLogger(__name__)
 
-    # Очищаем все runs
-    for run in runs:
-        run.text = ""
+    doc_dir = get_contract_copies_dir()
+    expire_before = time.time() - CONTRACT_COPIES_KEEP_DAYS * 86400
 
-    # Добавляем новый текст в первый run (сохраняем форматирование первого run)
-    if runs:
-        runs[0].text = new_full_text
-    else:
-        paragraph.add_run(new_full_text)
+    copies = []
+    with os.scandir(doc_dir) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith(".docx"):
+                copies.append((entry.stat().st_mtime, entry.path))
+    copies.sort(reverse=True)
 
-    return True
+    to_delete = [
+        path for index, (mtime, path) in enumerate(copies)
+        if path != keep and (mtime < expire_before or index >= max(CONTRACT_COPIES_MAX, 1))
+    ]
 
+    removed = 0
+    for path in to_delete:
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+
+    if removed:
+        logger.info(f"Удалено старых копий договоров: {removed}")
+    return removed
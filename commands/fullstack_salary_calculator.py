@@ -2,400 +2,278 @@
 Модуль для расчета ЗП директоров направления фуллстек курса по новой системе.
 """
 from datetime import datetime, date
-from sqlalchemy import func
+from sqlalchemy import and_, case, func
 from data_base.db import session
-from data_base.models import Student, FullstackTopicAssign, Mentor
+from data_base.models import Student, FullstackTopicAssign
 from commands.fullstack_constants import TOPIC_FIELD_MAPPING, AUTO_MODULE_FIELD_MAPPING
 from commands.logger import custom_logger
 from config import Config
 
 logger = custom_logger
 
-def calculate_fullstack_salary(start_date: date, end_date: date):
+# Директора направления: ручной и авто
+MANUAL_DIRECTOR_ID = 1
+AUTO_DIRECTOR_ID = 3
+# Дата начала учета фуллстек студентов (с сентября 2025)
+FULLSTACK_START_DATE = date(2025, 9, 1)
+
+
+def fullstack_assignment_stats_query(db_session, start_date: date, end_date: date):
     """
-    Рассчитывает ЗП всех участников фуллстек системы: директоров, кураторов + 10% бонусы за первые модули.
-    
-    ВАЖНО: 10% бонусы начисляются только за модули, сданные В ПЕРИОДЕ РАСЧЕТА (start_date - end_date).
-    
-    Бонусы директорам:
-    - Ручной директор (ID=1): за сдачу "1 модуль" (ручное тестирование)
-    - Авто директор (ID=3): за сдачу "Сдача 2 модуля" (автоматизация, начинаем со 2-го)
-    - ВАЖНО: Бонус НЕ начисляется, если студент на самом директоре (избегаем дублирования)
-    
-    Args:
-        start_date: Начальная дата периода расчета
-        end_date: Конечная дата периода расчета
-        
-    Returns:
-        dict: Словарь с ЗП для директоров и кураторов, логами и статистикой
+    Один агрегированный запрос по принятым темам фуллстека за период.
+
+    Строка на пару (студент, ментор): данные студента, число ручных и авто тем,
+    время первой ручной/авто темы (для направления куратора) и флаги сдачи
+    "1 модуль" / "Сдача 2 модуля" в периоде. Дубли одинаковых записей (одна тема
+    у одного ментора в один день) схлопываются во внутреннем GROUP BY.
     """
-    logger.info(f"📊 Начинаем расчет ЗП директоров направления за фуллстек за период {start_date} - {end_date}")
-    
-    # Дата начала учета фуллстек студентов (с сентября 2025)
-    september_start = date(2025, 9, 1)
-    logger.info(f"📅 Учитываем только студентов, пришедших с {september_start}")
-    
-    # Получаем ВСЕ записи принятых тем за период (и от директоров, и от кураторов)
-    # ВАЖНО: учитываем только студентов, которые пришли с сентября 2025
-    topic_assignments = session.query(FullstackTopicAssign).join(Student).filter(
+    assigned_day = func.date(FullstackTopicAssign.assigned_at)
+    unique_assignments = db_session.query(
+        FullstackTopicAssign.student_id.label("student_id"),
+        FullstackTopicAssign.mentor_id.label("mentor_id"),
+        FullstackTopicAssign.topic_manual.label("topic_manual"),
+        FullstackTopicAssign.topic_auto.label("topic_auto"),
+        func.min(FullstackTopicAssign.assigned_at).label("first_at"),
+        func.count().label("raw_rows"),
+        # Флаги бонусов сравнивают assigned_at с границами периода напрямую, как и раньше
+        func.max(case((and_(FullstackTopicAssign.assigned_at >= start_date,
+                            FullstackTopicAssign.assigned_at <= end_date), 1), else_=0)).label("in_bonus_period"),
+    ).join(Student, Student.id == FullstackTopicAssign.student_id).filter(
         Student.training_type == "Фуллстек",
-        Student.start_date >= september_start,  # 🔥 НОВЫЙ ФИЛЬТР: только студенты с сентября
-        func.date(FullstackTopicAssign.assigned_at) >= start_date,
-        func.date(FullstackTopicAssign.assigned_at) <= end_date
-    ).all()
-
-    # Из-за повторных прогонов бота в БД иногда появляются дубли одинаковых записей.
-    # Дедуплируем их, чтобы одна и та же сдача темы не считалась несколько раз.
-    unique_assignments = {}
-    for assignment in topic_assignments:
-        key = (
-            assignment.student_id,
-            assignment.mentor_id,
-            assignment.topic_manual,
-            assignment.topic_auto,
-            assignment.assigned_at.date(),
-        )
-        if key not in unique_assignments:
-            unique_assignments[key] = assignment
-    if len(unique_assignments) != len(topic_assignments):
-        logger.warning(
-            f"⚠️ Обнаружены дубликаты записей принятых тем: было {len(topic_assignments)}, "
-            f"после дедупликации {len(unique_assignments)}"
-        )
-    topic_assignments = list(unique_assignments.values())
-    
-    logger.info(f"📊 Найдено записей принятых тем за период: {len(topic_assignments)}")
-    
-    # Дополнительная статистика по фильтрации студентов
-    all_fullstack_students = session.query(Student).filter(Student.training_type == "Фуллстек").count()
-    september_fullstack_students = session.query(Student).filter(
-        Student.training_type == "Фуллстек",
-        Student.start_date >= september_start
-    ).count()
-    
-    logger.info(f"📊 Всего фуллстек студентов в БД: {all_fullstack_students}")
-    logger.info(f"📊 Фуллстек студентов с сентября: {september_fullstack_students}")
-    logger.info(f"📊 Исключено студентов (до сентября): {all_fullstack_students - september_fullstack_students}")
-    
-    # Отладочная информация - показываем все найденные записи
-    logger.info("🔍 DEBUG: Найденные записи принятых тем:")
-    for assignment in topic_assignments:
-        topic_info = f"Ручная: {assignment.topic_manual}" if assignment.topic_manual else f"Авто: {assignment.topic_auto}"
-        logger.info(f"  • ID {assignment.id}: Студент {assignment.student_id}, Ментор {assignment.mentor_id} | {topic_info} | {assignment.assigned_at}")
-    
-    # Инициализируем результаты
-    director_salaries = {
-        1: 0.0,  # Ручной директор
-        3: 0.0   # Авто директор
-    }
-    detailed_logs = {
-        1: [],
-        3: []
-    }
-    
-    # Группируем по студентам и разделяем директоров/кураторов
-    students_data = {}
-    curator_students = {}  # Студенты, которых взяли кураторы
-    
-    for assignment in topic_assignments:
-        student_id = assignment.student_id
-        if student_id not in students_data:
-            student = session.query(Student).filter(Student.id == student_id).first()
-            students_data[student_id] = {
-                'student': student,
+        Student.start_date >= FULLSTACK_START_DATE,
+        assigned_day >= start_date,
+        assigned_day <= end_date
+    ).group_by(
+        FullstackTopicAssign.student_id,
+        FullstackTopicAssign.mentor_id,
+        FullstackTopicAssign.topic_manual,
+        FullstackTopicAssign.topic_auto,
+        assigned_day
+    ).subquery()
+
+    is_manual = unique_assignments.c.topic_manual.isnot(None)
+    is_auto = and_(unique_assignments.c.topic_manual.is_(None), unique_assignments.c.topic_auto.isnot(None))
+    return db_session.query(
+        Student.id.label("student_id"),
+        Student.fio,
+        Student.telegram,
+        Student.total_cost,
+        Student.mentor_id.label("student_mentor_id"),
+        Student.auto_mentor_id,
+        unique_assignments.c.mentor_id,
+        func.count().label("topics"),
+        func.sum(unique_assignments.c.raw_rows).label("raw_rows"),
+        func.count(unique_assignments.c.topic_manual).label("manual_topics"),
+        func.count(unique_assignments.c.topic_auto).label("auto_topics"),
+        func.min(case((is_manual, unique_assignments.c.first_at))).label("first_manual_at"),
+        func.min(case((is_auto, unique_assignments.c.first_at))).label("first_auto_at"),
+        func.max(case((and_(unique_assignments.c.topic_manual == "1 модуль",
+                            unique_assignments.c.in_bonus_period == 1), 1), else_=0)).label("manual_module_1"),
+        func.max(case((and_(unique_assignments.c.topic_auto == "Сдача 2 модуля",
+                            unique_assignments.c.in_bonus_period == 1), 1), else_=0)).label("auto_module_2"),
+    ).join(unique_assignments, unique_assignments.c.student_id == Student.id).group_by(
+        Student.id, unique_assignments.c.mentor_id
+    )
+
+
+def group_fullstack_stats(rows):
+    """
+    Раскладывает строки fullstack_assignment_stats_query по студентам:
+    {student_id: {'student', 'manual_topics', 'auto_topics', 'curators', 'manual_module_1', 'auto_module_2'}}.
+    'curators' — {curator_id: {'direction', 'manual_topics', 'auto_topics'}}; направление куратора —
+    вид первой принятой им темы у студента.
+    """
+    students = {}
+    for row in rows:
+        data = students.get(row.student_id)
+        if data is None:
+            data = students[row.student_id] = {
+                'student': row,
                 'manual_topics': 0,
                 'auto_topics': 0,
-                'is_curator_student': False,
-                'curator_id': None,
-                'curator_direction': None,
-                'curators': {}  # Словарь всех кураторов: {curator_id: {'direction': 'auto/manual', 'assignments': [...]}}
+                'curators': {},
+                'manual_module_1': False,
+                'auto_module_2': False,
+                'topics': 0,
+                'raw_rows': 0,
             }
-        
-        # Определяем директор это или куратор
-        if assignment.mentor_id in [1, 3]:  # Директор направления
-            # Считаем темы по типам от директоров направления
-            if assignment.mentor_id == 1 and assignment.topic_manual is not None:
-                students_data[student_id]['manual_topics'] += 1
-            if assignment.mentor_id == 3 and assignment.topic_auto is not None:
-                students_data[student_id]['auto_topics'] += 1
-        else:  # Куратор
-            students_data[student_id]['is_curator_student'] = True
-            
-            # ВАЖНО: не перезаписываем curator_id, а собираем всех кураторов
-            curator_id = assignment.mentor_id
-            if curator_id not in students_data[student_id]['curators']:
-                students_data[student_id]['curators'][curator_id] = {
-                    'direction': None,
-                    'assignments': []
-                }
-            
-            # Определяем направление куратора
-            if assignment.topic_manual is not None:
-                if students_data[student_id]['curators'][curator_id]['direction'] is None:
-                    students_data[student_id]['curators'][curator_id]['direction'] = 'manual'
-            elif assignment.topic_auto is not None:
-                if students_data[student_id]['curators'][curator_id]['direction'] is None:
-                    students_data[student_id]['curators'][curator_id]['direction'] = 'auto'
-            
-            students_data[student_id]['curators'][curator_id]['assignments'].append(assignment)
-            
-            # Для обратной совместимости устанавливаем первого найденного куратора
-            if students_data[student_id]['curator_id'] is None:
-                students_data[student_id]['curator_id'] = curator_id
-                students_data[student_id]['curator_direction'] = students_data[student_id]['curators'][curator_id]['direction']
-            
-            # Сохраняем информацию о кураторе для расчета ЗП
-            if curator_id not in curator_students:
-                curator_students[curator_id] = []
-            if student_id not in [s['student_id'] for s in curator_students[curator_id]]:
-                curator_students[curator_id].append({
-                    'student_id': student_id,
-                    'student': students_data[student_id]['student'],
-                    'direction': students_data[student_id]['curators'][curator_id]['direction']
-                })
-    
-    logger.info(f"📊 Найдено уникальных студентов с принятыми темами: {len(students_data)}")
-    
-    # Инициализируем ЗП кураторов и их логи
+        data['manual_module_1'] = data['manual_module_1'] or bool(row.manual_module_1)
+        data['auto_module_2'] = data['auto_module_2'] or bool(row.auto_module_2)
+        data['topics'] += row.topics
+        data['raw_rows'] += int(row.raw_rows or 0)
+
+        if row.mentor_id == MANUAL_DIRECTOR_ID:
+            data['manual_topics'] += row.manual_topics
+        elif row.mentor_id == AUTO_DIRECTOR_ID:
+            data['auto_topics'] += row.auto_topics
+        else:
+            if row.first_manual_at is not None and (row.first_auto_at is None or row.first_manual_at <= row.first_auto_at):
+                direction = 'manual'
+            elif row.first_auto_at is not None:
+                direction = 'auto'
+            else:
+                direction = None
+            data['curators'][row.mentor_id] = {
+                'direction': direction,
+                'manual_topics': row.manual_topics,
+                'auto_topics': row.auto_topics,
+            }
+    return students
+
+
+def compute_fullstack_salary(students):
+    """
+    Расчет ЗП директоров и кураторов по сгруппированной статистике (без запросов к БД).
+    Возвращает (director_salaries, curator_salaries, detailed_logs, curator_detailed_logs, module_bonuses_applied).
+    """
+    director_salaries = {MANUAL_DIRECTOR_ID: 0.0, AUTO_DIRECTOR_ID: 0.0}
+    detailed_logs = {MANUAL_DIRECTOR_ID: [], AUTO_DIRECTOR_ID: []}
     curator_salaries = {}
-    curator_detailed_logs = {}  # Детальные логи для кураторов
-    
-    for student_id, data in students_data.items():
+    curator_detailed_logs = {}
+
+    # Стоимость темы у кураторов не зависит от студента
+    manual_curator_price = Config.FULLSTACK_MANUAL_COURSE_COST * 0.20 / 8  # 20% ручного курса на 8 тем
+    auto_curator_price = Config.FULLSTACK_AUTO_COURSE_COST * 0.20 / 6  # 20% авто курса на 6 модулей
+    manual_topics_count = len(TOPIC_FIELD_MAPPING)
+    auto_modules_count = len(AUTO_MODULE_FIELD_MAPPING)
+
+    for data in students.values():
         student = data['student']
-        logger.info(f"📊 Обрабатываем студента: {student.fio} (ID {student.id})")
-        
-        # Получаем total_cost студента
         total_cost = float(student.total_cost) if student.total_cost else 0
         if total_cost == 0:
             logger.warning(f"⚠️ У студента {student.fio} total_cost = 0, пропускаем")
             continue
-        
-        if data['is_curator_student']:
-            # === ОБРАБОТКА СТУДЕНТОВ КУРАТОРОВ ===
-            # ВАЖНО: обрабатываем ВСЕХ кураторов для этого студента, а не только первого
-            for curator_id, curator_info in data.get('curators', {}).items():
-                curator_direction = curator_info['direction']
-                
-                if not curator_direction:
+
+        if data['curators']:
+            # === СТУДЕНТЫ КУРАТОРОВ: начисляем всем кураторам студента ===
+            for curator_id, curator_info in data['curators'].items():
+                if curator_info['direction'] == 'manual':
+                    accepted, price, label, unit = curator_info['manual_topics'], manual_curator_price, "Ручной", "тем"
+                elif curator_info['direction'] == 'auto':
+                    accepted, price, label, unit = curator_info['auto_topics'], auto_curator_price, "Авто", "модулей"
+                else:
                     continue
-                
-                # Инициализируем ЗП куратора и его логи
-                if curator_id not in curator_salaries:
-                    curator_salaries[curator_id] = 0
-                if curator_id not in curator_detailed_logs:
-                    curator_detailed_logs[curator_id] = []
-                
-                if curator_direction == 'manual':
-                    # === РУЧНОЙ КУРАТОР: 20% от стоимости ручного курса, делим на 8 тем ===
-                    # Рассчитываем стоимость одного созвона (20% от стоимости ручного курса)
-                    manual_course_cost = Config.FULLSTACK_MANUAL_COURSE_COST
-                    call_cost = manual_course_cost * 0.20
-                    
-                    # Делим на 8 тем
-                    manual_topics_count = 8
-                    manual_call_price = call_cost / manual_topics_count if manual_topics_count > 0 else 0
-                    
-                    # Подсчитываем принятые темы куратором для этого студента (из его assignments)
-                    curator_manual_topics = sum(1 for a in curator_info['assignments'] if a.topic_manual is not None)
-                    
-                    curator_salary = curator_manual_topics * manual_call_price
-                    curator_salaries[curator_id] += curator_salary
-                    
-                    # Добавляем детальный лог для куратора
-                    curator_detailed_logs[curator_id].append(
-                        f"💼 Ручной куратор за фуллстек студента {student.fio} {student.telegram} {student.id} | "
-                        f"Принял {curator_manual_topics} тем по {round(manual_call_price, 2)} руб. | +{round(curator_salary, 2)} руб."
-                    )
-                    
-                    # 10% ручному директору направления (только если студент НЕ на ручном директоре)
-                    # if student.mentor_id != 1:  # Студент НЕ на ручном директоре
-                    #     director_salaries[1] += total_cost * 0.10
-                    #     logger.info(f"📊 Ручной директор (ID 1): бонус +{round(total_cost * 0.10, 2)} руб. за студента {student.fio} (куратор {curator_id})")
-                    # else:
-                    #     logger.debug(f"🚫 Ручному директору НЕ начислен бонус: студент {student.fio} на ручном директоре")
-                    #
-                    # logger.info(f"📊 Ручной куратор {curator_id}: принял {curator_manual_topics} тем у студента {student.fio}, ЗП +{round(curator_salary, 2)} руб. (расчет: {manual_course_cost} × 0.20 / 8 = {round(manual_call_price, 2)} за тему)")
-                    #
-                else:  # auto
-                    # === АВТО КУРАТОР: 20% от стоимости авто курса, делим на 6 модулей ===
-                    # Рассчитываем стоимость одного созвона (20% от стоимости авто курса)
-                    auto_course_cost = Config.FULLSTACK_AUTO_COURSE_COST
-                    call_cost = auto_course_cost * 0.20
-                    
-                    # Делим на 6 модулей
-                    auto_modules_count = 6
-                    auto_call_price = call_cost / auto_modules_count if auto_modules_count > 0 else 0
-                    
-                    # Подсчитываем принятые модули куратором для этого студента (из его assignments)
-                    curator_auto_topics = sum(1 for a in curator_info['assignments'] if a.topic_auto is not None)
-                    
-                    curator_salary = curator_auto_topics * auto_call_price
-                    curator_salaries[curator_id] += curator_salary
-                    
-                    # Добавляем детальный лог для авто куратора
-                    curator_detailed_logs[curator_id].append(
-                        f"💼 Авто куратор за фуллстек студента {student.fio} {student.telegram} {student.id} | "
-                        f"Принял {curator_auto_topics} модулей по {round(auto_call_price, 2)} руб. | +{round(curator_salary, 2)} руб."
-                    )
-                    
-                    # # 10% авто директору направления (только если студент НЕ на авто директоре)
-                    # if student.auto_mentor_id != 3:  # Студент НЕ на авто директоре
-                    #     director_salaries[3] += total_cost * 0.10
-                    #     logger.info(f"📊 Авто директор (ID 3): бонус +{round(total_cost * 0.10, 2)} руб. за студента {student.fio} (куратор {curator_id})")
-                    # else:
-                    #     logger.debug(f"🚫 Авто директору НЕ начислен бонус: студент {student.fio} на авто директоре")
-                    #
-                    # logger.info(f"📊 Авто куратор {curator_id}: принял {curator_auto_topics} модулей у студента {student.fio}, ЗП +{round(curator_salary, 2)} руб. (расчет: {auto_course_cost} × 0.20 / 6 = {round(auto_call_price, 2)} за модуль)")
-                    #
+
+                curator_salary = accepted * price
+                curator_salaries[curator_id] = curator_salaries.get(curator_id, 0) + curator_salary
+                curator_detailed_logs.setdefault(curator_id, []).append(
+                    f"💼 {label} куратор за фуллстек студента {student.fio} {student.telegram} {student.student_id} | "
+                    f"Принял {accepted} {unit} по {round(price, 2)} руб. | +{round(curator_salary, 2)} руб."
+                )
         else:
-            # === ОБРАБОТКА СТУДЕНТОВ ДИРЕКТОРОВ НАПРАВЛЕНИЯ ===
-            # Рассчитываем стоимость одного созвона (30% от total_cost)
+            # === СТУДЕНТЫ ДИРЕКТОРОВ НАПРАВЛЕНИЯ: созвон = 30% от total_cost ===
             call_cost = total_cost * 0.3
-            
-            # === РАСЧЕТ ДЛЯ РУЧНОГО ДИРЕКТОРА (ID = 1) ===
-            manual_topics_count = len(TOPIC_FIELD_MAPPING)
+
             manual_call_price = call_cost / manual_topics_count if manual_topics_count > 0 else 0
-            
-            # Используем уже подсчитанные ручные темы
-            manual_accepted_topics = data['manual_topics']
-            
-            # Отладочная информация
-            logger.info(f"🔍 DEBUG: Студент {student.fio} (ID {student.id})")
-            logger.info(f"🔍 DEBUG: Ручных тем для этого студента: {manual_accepted_topics}")
-            logger.info(f"🔍 DEBUG: Авто тем для этого студента: {data['auto_topics']}")
-            
-            manual_salary = manual_accepted_topics * manual_call_price
-            director_salaries[1] += manual_salary
-            
-            # Логируем для ручного директора
-            if manual_accepted_topics > 0:
-                detailed_logs[1].append(
-                    f"💼 Ручной директор принял {manual_accepted_topics} тем у студента {student.fio} (ID {student.id}) | "
+            manual_salary = data['manual_topics'] * manual_call_price
+            director_salaries[MANUAL_DIRECTOR_ID] += manual_salary
+            if data['manual_topics'] > 0:
+                detailed_logs[MANUAL_DIRECTOR_ID].append(
+                    f"💼 Ручной директор принял {data['manual_topics']} тем у студента {student.fio} (ID {student.student_id}) | "
                     f"Стоимость созвона: {round(manual_call_price, 2)} руб. | "
                     f"ЗП: +{round(manual_salary, 2)} руб."
                 )
-                logger.info(f"📊 Ручной директор: {manual_accepted_topics} тем, ЗП +{round(manual_salary, 2)} руб.")
-            
-            # === РАСЧЕТ ДЛЯ АВТО ДИРЕКТОРА (ID = 3) ===
-            auto_modules_count = len(AUTO_MODULE_FIELD_MAPPING)
+
             auto_call_price = call_cost / auto_modules_count if auto_modules_count > 0 else 0
-            
-            # Используем уже подсчитанные авто темы
-            auto_accepted_topics = data['auto_topics']
-            
-            auto_salary = auto_accepted_topics * auto_call_price
-            director_salaries[3] += auto_salary
-            
-            # Логируем для авто директора
-            if auto_accepted_topics > 0:
-                detailed_logs[3].append(
-                    f"💼 Авто директор принял {auto_accepted_topics} модулей у студента {student.fio} (ID {student.id}) | "
+            auto_salary = data['auto_topics'] * auto_call_price
+            director_salaries[AUTO_DIRECTOR_ID] += auto_salary
+            if data['auto_topics'] > 0:
+                detailed_logs[AUTO_DIRECTOR_ID].append(
+                    f"💼 Авто директор принял {data['auto_topics']} модулей у студента {student.fio} (ID {student.student_id}) | "
                     f"Стоимость созвона: {round(auto_call_price, 2)} руб. | "
                     f"ЗП: +{round(auto_salary, 2)} руб."
                 )
-                logger.info(f"📊 Авто директор: {auto_accepted_topics} модулей, ЗП +{round(auto_salary, 2)} руб.")
-    
-    # Итоговое логирование
-    logger.info(f"📊 Итоговые ЗП директоров направления:")
-    logger.info(f"📊 Ручной директор (ID 1): {round(director_salaries[1], 2)} руб.")
-    logger.info(f"📊 Авто директор (ID 3): {round(director_salaries[3], 2)} руб.")
-    
-    logger.info(f"📊 Итоговые ЗП кураторов:")
-    for curator_id, salary in curator_salaries.items():
-        logger.info(f"📊 Куратор (ID {curator_id}): {round(salary, 2)} руб.")
-    
-    # 🔹 НОВАЯ УПРОЩЕННАЯ ЛОГИКА: 10% ОТ СТОИМОСТИ КУРСА ПРИ СДАЧЕ ПЕРВОГО МОДУЛЯ
-    logger.info("🔹 Обрабатываем 10% бонусы директорам за сдачу первых модулей")
-    
-    # Получаем всех фуллстек студентов, пришедших с сентября
-    fullstack_students = session.query(Student).filter(
-        Student.training_type == "Фуллстек",
-        Student.start_date >= september_start
-    ).all()
-    
+
+    # 🔹 10% ОТ СТОИМОСТИ КУРСА ПРИ СДАЧЕ ПЕРВОГО МОДУЛЯ В ПЕРИОДЕ (если студент не на самом директоре)
     module_bonuses_applied = 0
-    
-    for student in fullstack_students:
+    for data in students.values():
+        student = data['student']
         if not student.total_cost:
-            logger.debug(f"🚫 Пропускаем студента {student.fio}: нет данных о стоимости курса")
             continue
-            
-        # Проверяем, что студент НЕ на директоре (иначе не даем 10% бонус)
-        is_on_manual_director = student.mentor_id == 1  # Ручной директор
-        is_on_auto_director = student.auto_mentor_id == 3  # Авто директор
-        
-        logger.debug(f"🎯 Студент {student.fio}: mentor_id={student.mentor_id}, auto_mentor_id={student.auto_mentor_id}")
-        logger.debug(f"🎯 На ручном директоре: {is_on_manual_director}, на авто директоре: {is_on_auto_director}")
-        
         bonus_amount = float(student.total_cost) * 0.1
-        bonuses_applied = []
-        
-        # Проверяем, сдал ли студент 1 модуль по ручному направлению В ПЕРИОДЕ РАСЧЕТА
-        has_manual_module_1 = session.query(FullstackTopicAssign).filter(
-            FullstackTopicAssign.student_id == student.id,
-            FullstackTopicAssign.topic_manual == "1 модуль",
-            FullstackTopicAssign.assigned_at >= start_date,
-            FullstackTopicAssign.assigned_at <= end_date
-        ).first() is not None
-        
-        # Проверяем, сдал ли студент 2 модуль по авто направлению В ПЕРИОДЕ РАСЧЕТА (начинаем со 2-го модуля)
-        has_auto_module_2 = session.query(FullstackTopicAssign).filter(
-            FullstackTopicAssign.student_id == student.id,
-            FullstackTopicAssign.topic_auto == "Сдача 2 модуля",
-            FullstackTopicAssign.assigned_at >= start_date,
-            FullstackTopicAssign.assigned_at <= end_date
-        ).first() is not None
-        
-        logger.debug(f"🎯 Студент {student.fio}: ручной модуль 1 = {has_manual_module_1}, авто модуль 2 = {has_auto_module_2}, стоимость курса = {student.total_cost}")
-        
-        # Бонус ручному директору (ID=1) только если сдан ручной 1 модуль И студент НЕ на ручном директоре
-        if has_manual_module_1 and not is_on_manual_director:
-            director_salaries[1] += bonus_amount
-            detailed_logs[1].append(
-                f"🎯 10% бонус за сдачу 1 модуля ручного В ПЕРИОДЕ: студент {student.fio} {student.telegram} (ID {student.id}) | "
+
+        if data['manual_module_1'] and student.student_mentor_id != MANUAL_DIRECTOR_ID:
+            director_salaries[MANUAL_DIRECTOR_ID] += bonus_amount
+            detailed_logs[MANUAL_DIRECTOR_ID].append(
+                f"🎯 10% бонус за сдачу 1 модуля ручного В ПЕРИОДЕ: студент {student.fio} {student.telegram} (ID {student.student_id}) | "
                 f"Стоимость курса: {student.total_cost} руб. | +{round(bonus_amount, 2)} руб."
             )
-            bonuses_applied.append("ручной")
-        elif has_manual_module_1 and is_on_manual_director:
-            logger.debug(f"🚫 Ручному директору НЕ начислен бонус: студент {student.fio} на ручном директоре")
-        
-        # Бонус авто директору (ID=3) только если сдан авто 2 модуль И студент НЕ на авто директоре
-        if has_auto_module_2 and not is_on_auto_director:
-            director_salaries[3] += bonus_amount
-            detailed_logs[3].append(
-                f"🎯 10% бонус за сдачу 2 модуля авто В ПЕРИОДЕ: студент {student.fio} {student.telegram} (ID {student.id}) | "
+            module_bonuses_applied += 1
+
+        if data['auto_module_2'] and student.auto_mentor_id != AUTO_DIRECTOR_ID:
+            director_salaries[AUTO_DIRECTOR_ID] += bonus_amount
+            detailed_logs[AUTO_DIRECTOR_ID].append(
+                f"🎯 10% бонус за сдачу 2 модуля авто В ПЕРИОДЕ: студент {student.fio} {student.telegram} (ID {student.student_id}) | "
                 f"Стоимость курса: {student.total_cost} руб. | +{round(bonus_amount, 2)} руб."
             )
-            bonuses_applied.append("авто")
-        elif has_auto_module_2 and is_on_auto_director:
-            logger.debug(f"🚫 Авто директору НЕ начислен бонус: студент {student.fio} на авто директоре")
-        
-        if bonuses_applied:
-            logger.info(f"🔹 Фуллстек студент {student.fio} (ID {student.id}): сдал модули по направлениям {', '.join(bonuses_applied)}, бонус {round(bonus_amount, 2)} руб. каждому директору")
-            module_bonuses_applied += len(bonuses_applied)
+            module_bonuses_applied += 1
+
+    return director_salaries, curator_salaries, detailed_logs, curator_detailed_logs, module_bonuses_applied
+
+
+def calculate_fullstack_salary(start_date: date, end_date: date):
+    """
+    Рассчитывает ЗП всех участников фуллстек системы: директоров, кураторов + 10% бонусы за первые модули.
+    
+    ВАЖНО: 10% бонусы начисляются только за модули, сданные В ПЕРИОДЕ РАСЧЕТА (start_date - end_date).
     
-    # Статистика по новой упрощенной системе
-    logger.info(f"📊 Статистика 10% бонусов директорам (упрощенная система, только студенты с {september_start}):")
-    logger.info(f"📊 Всего фуллстек студентов с сентября: {len(fullstack_students)}")
-    logger.info(f"📊 Всего бонусов начислено: {module_bonuses_applied}")
-    logger.info(f"📊 Бонусы применены: {'✅ ДА' if module_bonuses_applied > 0 else '❌ НЕТ'}")
-    logger.info(f"📅 ВАЖНО: Учитываются только студенты, пришедшие с {september_start} и позже")
-    logger.info(f"🎯 НОВОЕ: 10% от стоимости курса при сдаче первого модуля В ПЕРИОДЕ РАСЧЕТА")
-    logger.info(f"   • Ручной директор: бонус при сдаче 'ручной 1 модуль' в периоде {start_date} - {end_date}")
-    logger.info(f"   • Авто директор: бонус при сдаче 'авто 2 модуль' (Сдача 2 модуля) в периоде {start_date} - {end_date}")
-    logger.info(f"   • ВАЖНО: Бонус НЕ начисляется, если студент на самом директоре")
-    logger.info(f"   • Каждый директор получает бонус за каждую сдачу первого модуля в периоде")
+    Бонусы директорам:
+    - Ручной директор (ID=1): за сдачу "1 модуль" (ручное тестирование)
+    - Авто директор (ID=3): за сдачу "Сдача 2 модуля" (автоматизация, начинаем со 2-го)
+    - ВАЖНО: Бонус НЕ начисляется, если студент на самом директоре (избегаем дублирования)
+
+    Вся статистика по темам берется одним агрегированным запросом (fullstack_assignment_stats_query),
+    сам расчет идет по словарям в памяти (compute_fullstack_salary).
     
+    Args:
+        start_date: Начальная дата периода расчета
+        end_date: Конечная дата периода расчета
+        
+    Returns:
+        dict: Словарь с ЗП для директоров и кураторов, логами и статистикой
+    """
+    logger.info(f"📊 Начинаем расчет ЗП директоров направления за фуллстек за период {start_date} - {end_date}")
+    logger.info(f"📅 Учитываем только студентов, пришедших с {FULLSTACK_START_DATE}")
+
+    students = group_fullstack_stats(fullstack_assignment_stats_query(session, start_date, end_date).all())
+
+    topics_processed = sum(data['topics'] for data in students.values())
+    raw_rows = sum(data['raw_rows'] for data in students.values())
+    if raw_rows != topics_processed:
+        logger.warning(
+            f"⚠️ Обнаружены дубликаты записей принятых тем: было {raw_rows}, "
+            f"после дедупликации {topics_processed}"
+        )
+    logger.info(f"📊 Найдено записей принятых тем за период: {topics_processed}")
+    logger.info(f"📊 Найдено уникальных студентов с принятыми темами: {len(students)}")
+
+    all_fullstack_students, september_fullstack_students = session.query(
+        func.count(Student.id),
+        func.count(case((Student.start_date >= FULLSTACK_START_DATE, Student.id)))
+    ).filter(Student.training_type == "Фуллстек").one()
+    logger.info(f"📊 Всего фуллстек студентов в БД: {all_fullstack_students}")
+    logger.info(f"📊 Фуллстек студентов с сентября: {september_fullstack_students}")
+    logger.info(f"📊 Исключено студентов (до сентября): {all_fullstack_students - september_fullstack_students}")
+
+    director_salaries, curator_salaries, detailed_logs, curator_detailed_logs, module_bonuses_applied = \
+        compute_fullstack_salary(students)
+
+    logger.info(f"📊 Ручной директор (ID 1): {round(director_salaries[MANUAL_DIRECTOR_ID], 2)} руб.")
+    logger.info(f"📊 Авто директор (ID 3): {round(director_salaries[AUTO_DIRECTOR_ID], 2)} руб.")
+    for curator_id, salary in curator_salaries.items():
+        logger.info(f"📊 Куратор (ID {curator_id}): {round(salary, 2)} руб.")
+    logger.info(f"📊 10% бонусов директорам начислено: {module_bonuses_applied}")
+
     return {
         'director_salaries': director_salaries,
         'curator_salaries': curator_salaries,
         'logs': detailed_logs,
         'curator_logs': curator_detailed_logs,  # Детальные логи кураторов
-        'students_processed': len(students_data),
-        'topics_processed': len(topic_assignments),
+        'students_processed': len(students),
+        'topics_processed': topics_processed,
         'module_bonuses_applied': module_bonuses_applied,
         'fullstack_students_stats': {
-            'total_students': len(fullstack_students),
+            'total_students': september_fullstack_students,
             'bonuses_applied': module_bonuses_applied
         }
     }
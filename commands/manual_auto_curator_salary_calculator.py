@@ -1,6 +1,7 @@
 """
 Модуль для расчета ЗП ручных и авто кураторов по системе принятых тем/модулей.
 """
+from array import array
 from datetime import date
 from data_base.db import session
 from data_base.models import Student, ManualProgress, AutoProgress, Mentor
@@ -32,6 +33,105 @@ AUTO_MODULE_FIELDS = [
 ]
 
 
+class ProgressColumns:
+    """
+    Прогресс студентов одного направления в колоночном виде: индекс i во всех массивах — один студент.
+
+    Даты полей прогресса хранятся как array('l') порядковых номеров дней (date.toordinal(), 0 — даты нет),
+    поэтому маска "сдано в периоде" считается сравнением чисел по всей колонке сразу.
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.student_ids = array('l')
+        self.curator_ids = array('l')  # 0 — куратор не назначен
+        self.total_costs = array('d')
+        self.has_progress = array('b')
+        self.fios = []
+        self.telegrams = []
+        self.dates = {field: array('l') for field in fields}
+
+    def __len__(self):
+        return len(self.student_ids)
+
+    def append(self, row):
+        self.student_ids.append(row.id)
+        self.curator_ids.append(row.curator_id or 0)
+        self.total_costs.append(float(row.total_cost) if row.total_cost else 0.0)
+        self.has_progress.append(row.progress_student_id is not None)
+        self.fios.append(row.fio)
+        self.telegrams.append(row.telegram)
+        for field in self.fields:
+            value = getattr(row, field)
+            self.dates[field].append(value.toordinal() if value else 0)
+
+    def accepted_in_period(self, start_date: date, end_date: date):
+        """Количество тем/модулей каждого студента, сданных в периоде (array('l') по индексам студентов)."""
+        start, end = start_date.toordinal(), end_date.toordinal()
+        counts = array('l', [0]) * len(self)
+        for field in self.fields:
+            counts = array('l', [count + (start <= day <= end) for count, day in zip(counts, self.dates[field])])
+        return counts
+
+    def eligible(self):
+        """Маска студентов, за которых начисляется ЗП: есть куратор, total_cost > 0 и запись прогресса."""
+        return [curator_id != 0 and cost > 0 and has_progress
+                for curator_id, cost, has_progress in zip(self.curator_ids, self.total_costs, self.has_progress)]
+
+
+def load_progress_columns(db_session, training_type, progress_model, fields, curator_column, start_from: date):
+    """
+    Один запрос: все студенты направления с start_date >= start_from и их прогресс (LEFT JOIN),
+    разложенные в ProgressColumns.
+    """
+    rows = db_session.query(
+        Student.id,
+        Student.fio,
+        Student.telegram,
+        Student.total_cost,
+        curator_column.label("curator_id"),
+        progress_model.student_id.label("progress_student_id"),
+        *[getattr(progress_model, field) for field in fields]
+    ).outerjoin(progress_model, progress_model.student_id == Student.id).filter(
+        Student.training_type == training_type,
+        Student.start_date >= start_from
+    ).order_by(Student.id)
+
+    columns = ProgressColumns(fields)
+    for row in rows:
+        columns.append(row)
+    return columns
+
+
+def accumulate_curator_salary(columns, start_date: date, end_date: date, curator_salaries, curator_detailed_logs,
+                              direction_label: str, unit_label: str):
+    """
+    Начисляет кураторам 20% от total_cost студента, деленные на число тем/модулей, за каждую сданную в периоде.
+    Кураторы всех подходящих студентов попадают в curator_salaries, даже если в периоде ничего не сдано.
+    """
+    units_count = len(columns.fields)
+    counts = columns.accepted_in_period(start_date, end_date)
+
+    for i, is_eligible in enumerate(columns.eligible()):
+        if not is_eligible:
+            continue
+        curator_id = columns.curator_ids[i]
+        curator_salaries.setdefault(curator_id, 0)
+        curator_detailed_logs.setdefault(curator_id, [])
+
+        completed = counts[i]
+        if completed == 0:
+            continue
+        student_total_cost = columns.total_costs[i]
+        unit_price = student_total_cost * 0.20 / units_count if units_count > 0 else 0
+        curator_salary = completed * unit_price
+        curator_salaries[curator_id] += curator_salary
+        curator_detailed_logs[curator_id].append(
+            f"💼 За студента {direction_label} {columns.fios[i]} {columns.telegrams[i]} (ID {columns.student_ids[i]}) | "
+            f"Стоимость курса: {student_total_cost} руб. | Сдано {completed} {unit_label} в периоде по {round(unit_price, 2)} руб. | +{round(curator_salary, 2)} руб."
+        )
+
+
 def calculate_manual_auto_curator_salary(start_date: date, end_date: date):
     """
     Рассчитывает ЗП ручных и авто кураторов по системе принятых тем/модулей.
@@ -51,6 +151,9 @@ def calculate_manual_auto_curator_salary(start_date: date, end_date: date):
     - Учитываем только модули, сданные в периоде расчета
     
     ВАЖНО: Стоимость рассчитывается индивидуально для каждого студента на основе его total_cost.
+
+    Прогресс каждого направления загружается одним запросом (load_progress_columns), сданные в периоде
+    темы считаются по колонкам дат, имена кураторов — одним IN-запросом.
     
     Args:
         start_date: Начальная дата периода расчета
@@ -62,7 +165,6 @@ def calculate_manual_auto_curator_salary(start_date: date, end_date: date):
     logger.info(f"📊 Начинаем расчет ЗП ручных и авто кураторов за период {start_date} - {end_date}")
     
     # Дата начала учета студентов (из конфига)
-    from config import Config
     december_start = Config.NEW_PAYMENT_SYSTEM_START_DATE
     logger.info(f"📅 Учитываем только студентов, пришедших с {december_start}")
     
@@ -71,163 +173,37 @@ def calculate_manual_auto_curator_salary(start_date: date, end_date: date):
     curator_detailed_logs = {}
     
     # === РАСЧЕТ ДЛЯ РУЧНЫХ КУРАТОРОВ ===
-    logger.info("📊 Обрабатываем ручных кураторов...")
-    
-    # Получаем студентов с типом "Ручное тестирование", пришедших с декабря 2025
-    manual_students = session.query(Student).filter(
-        Student.training_type == "Ручное тестирование",
-        Student.start_date >= december_start
-    ).all()
-    
-    logger.info(f"📊 Найдено ручных студентов с {december_start}: {len(manual_students)}")
-    
-    # Логируем всех найденных студентов для отладки
-    for s in manual_students:
-        logger.info(f"🔍 Ручной студент: {s.fio} (ID {s.id}), start_date={s.start_date}, mentor_id={s.mentor_id}, total_cost={s.total_cost}")
-    
-    manual_topics_count = len(MANUAL_TOPIC_FIELDS)  # 8 тем
-    
-    for student in manual_students:
-        if not student.mentor_id:
-            logger.debug(f"🚫 Студент {student.fio} (ID {student.id}) не имеет назначенного куратора (mentor_id)")
-            continue
-        
-        # Проверяем наличие total_cost
-        if not student.total_cost or float(student.total_cost) == 0:
-            logger.debug(f"🚫 У студента {student.fio} (ID {student.id}) нет total_cost или он равен 0")
-            continue
-        
-        # Получаем прогресс студента
-        progress = session.query(ManualProgress).filter(
-            ManualProgress.student_id == student.id
-        ).first()
-        
-        if not progress:
-            logger.debug(f"🚫 У студента {student.fio} (ID {student.id}) нет записи в ManualProgress")
-            continue
-        
-        curator_id = student.mentor_id
-        
-        # Инициализируем ЗП куратора и его логи
-        if curator_id not in curator_salaries:
-            curator_salaries[curator_id] = 0
-        if curator_id not in curator_detailed_logs:
-            curator_detailed_logs[curator_id] = []
-        
-        # Рассчитываем стоимость одной темы для этого студента (20% от total_cost / 8 тем)
-        student_total_cost = float(student.total_cost)
-        manual_call_cost = student_total_cost * 0.20  # 20% от стоимости курса студента
-        manual_topic_price = manual_call_cost / manual_topics_count if manual_topics_count > 0 else 0
-        
-        # Подсчитываем сданные темы в периоде
-        completed_topics = 0
-        topic_details = []
-        
-        logger.info(f"🔍 Проверяем темы для студента {student.fio} (ID {student.id}), период: {start_date} - {end_date}")
-        for field_name in MANUAL_TOPIC_FIELDS:
-            field_value = getattr(progress, field_name, None)
-            if field_value:
-                logger.info(f"  • {field_name}: {field_value} (в периоде: {start_date <= field_value <= end_date})")
-            if field_value and start_date <= field_value <= end_date:
-                completed_topics += 1
-                topic_details.append(f"{field_name}: {field_value}")
-        
-        if completed_topics > 0:
-            curator_salary = completed_topics * manual_topic_price
-            curator_salaries[curator_id] += curator_salary
-            
-            # Добавляем детальный лог для куратора
-            curator_detailed_logs[curator_id].append(
-                f"💼 За студента ручное направление {student.fio} {student.telegram} (ID {student.id}) | "
-                f"Стоимость курса: {student_total_cost} руб. | Сдано {completed_topics} тем в периоде по {round(manual_topic_price, 2)} руб. | +{round(curator_salary, 2)} руб."
-            )
-            
-            logger.info(f"📊 Ручной куратор {curator_id}: студент ручник {student.fio}, стоимость курса {student_total_cost} руб., сдано {completed_topics} тем, ЗП +{round(curator_salary, 2)} руб.")
+    manual_columns = load_progress_columns(
+        session, "Ручное тестирование", ManualProgress, MANUAL_TOPIC_FIELDS, Student.mentor_id, december_start
+    )
+    logger.info(f"📊 Найдено ручных студентов с {december_start}: {len(manual_columns)}")
+    accumulate_curator_salary(
+        manual_columns, start_date, end_date, curator_salaries, curator_detailed_logs,
+        "ручное направление", "тем"
+    )
     
     # === РАСЧЕТ ДЛЯ АВТО КУРАТОРОВ ===
-    logger.info("📊 Обрабатываем авто кураторов...")
-    
-    # Получаем студентов с типом "Автотестирование", пришедших с декабря 2025
-    auto_students = session.query(Student).filter(
-        Student.training_type == "Автотестирование",
-        Student.start_date >= december_start
-    ).all()
-    
-    logger.info(f"📊 Найдено авто студентов с {december_start}: {len(auto_students)}")
-    
-    # Логируем всех найденных студентов для отладки
-    for s in auto_students:
-        logger.info(f"🔍 Авто студент: {s.fio} (ID {s.id}), start_date={s.start_date}, auto_mentor_id={s.auto_mentor_id}, total_cost={s.total_cost}")
-    
-    auto_modules_count = len(AUTO_MODULE_FIELDS)  # 6 модулей
-    
-    for student in auto_students:
-        if not student.auto_mentor_id:
-            logger.debug(f"🚫 Студент {student.fio} (ID {student.id}) не имеет назначенного авто куратора (auto_mentor_id)")
-            continue
-        
-        # Проверяем наличие total_cost
-        if not student.total_cost or float(student.total_cost) == 0:
-            logger.debug(f"🚫 У студента {student.fio} (ID {student.id}) нет total_cost или он равен 0")
-            continue
-        
-        # Получаем прогресс студента
-        progress = session.query(AutoProgress).filter(
-            AutoProgress.student_id == student.id
-        ).first()
-        
-        if not progress:
-            logger.debug(f"🚫 У студента {student.fio} (ID {student.id}) нет записи в AutoProgress")
-            continue
-        
-        curator_id = student.auto_mentor_id
-        
-        # Инициализируем ЗП куратора и его логи
-        if curator_id not in curator_salaries:
-            curator_salaries[curator_id] = 0
-        if curator_id not in curator_detailed_logs:
-            curator_detailed_logs[curator_id] = []
-        
-        # Рассчитываем стоимость одного модуля для этого студента (20% от total_cost / 6 модулей)
-        student_total_cost = float(student.total_cost)
-        auto_call_cost = student_total_cost * 0.20  # 20% от стоимости курса студента
-        auto_module_price = auto_call_cost / auto_modules_count if auto_modules_count > 0 else 0
-        
-        # Подсчитываем сданные модули в периоде
-        completed_modules = 0
-        module_details = []
-        
-        logger.info(f"🔍 Проверяем модули для студента {student.fio} (ID {student.id}), период: {start_date} - {end_date}")
-        for field_name in AUTO_MODULE_FIELDS:
-            field_value = getattr(progress, field_name, None)
-            if field_value:
-                logger.info(f"  • {field_name}: {field_value} (в периоде: {start_date <= field_value <= end_date})")
-            if field_value and start_date <= field_value <= end_date:
-                completed_modules += 1
-                module_details.append(f"{field_name}: {field_value}")
-        
-        if completed_modules > 0:
-            curator_salary = completed_modules * auto_module_price
-            curator_salaries[curator_id] += curator_salary
-            
-            # Добавляем детальный лог для куратора
-            curator_detailed_logs[curator_id].append(
-                f"💼 За студента авто направление {student.fio} {student.telegram} (ID {student.id}) | "
-                f"Стоимость курса: {student_total_cost} руб. | Сдано {completed_modules} модулей в периоде по {round(auto_module_price, 2)} руб. | +{round(curator_salary, 2)} руб."
-            )
-            
-            logger.info(f"📊 Авто куратор {curator_id}: студент {student.fio}, стоимость курса {student_total_cost} руб., сдано {completed_modules} модулей, ЗП +{round(curator_salary, 2)} руб.")
+    auto_columns = load_progress_columns(
+        session, "Автотестирование", AutoProgress, AUTO_MODULE_FIELDS, Student.auto_mentor_id, december_start
+    )
+    logger.info(f"📊 Найдено авто студентов с {december_start}: {len(auto_columns)}")
+    accumulate_curator_salary(
+        auto_columns, start_date, end_date, curator_salaries, curator_detailed_logs,
+        "авто направление", "модулей"
+    )
     
     # Итоговое логирование
     logger.info(f"📊 Итоговые ЗП кураторов:")
+    curator_names = dict(
+        session.query(Mentor.id, Mentor.full_name).filter(Mentor.id.in_(list(curator_salaries))).all()
+    ) if curator_salaries else {}
     for curator_id, salary in curator_salaries.items():
-        curator = session.query(Mentor).filter(Mentor.id == curator_id).first()
-        curator_name = curator.full_name if curator else f"ID {curator_id}"
+        curator_name = curator_names.get(curator_id, f"ID {curator_id}")
         logger.info(f"📊 Куратор {curator_name} (ID {curator_id}): {round(salary, 2)} руб.")
     
     # Статистика
-    total_manual_students = len(manual_students)
-    total_auto_students = len(auto_students)
+    total_manual_students = len(manual_columns)
+    total_auto_students = len(auto_columns)
     total_curators = len(curator_salaries)
     
     logger.info(f"📊 Статистика расчета:")
@@ -250,4 +226,3 @@ def calculate_manual_auto_curator_salary(start_date: date, end_date: date):
         },
         'curators_count': total_curators
     }
-
@@ -1,6 +1,6 @@
 from check_postpayment_job import logger
 from data_base.db import session
-from data_base.models import Mentor, Payment, Salary, SalaryKK
+from data_base.models import Mentor, Payment, PaymentKind, Salary, SalaryKK
 from commands.start_commands import exit_to_main_menu
 from commands.states import AWAIT_MENTOR_TG, AWAIT_BONUS_AMOUNT
 from telegram import Update, ReplyKeyboardMarkup
@@ -50,7 +50,8 @@ async def handle_bonus_amount(update: Update, context: ContextTypes.DEFAULT_TYPE
             amount=amount,
             payment_date=datetime.now().date(),
             comment=f"Премия: {staff_name}",
-            status="подтвержден"
+            status="подтвержден",
+            payment_kind=PaymentKind.BONUS
         )
         session.add(new_payment)
 
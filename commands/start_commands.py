@@ -62,9 +62,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 mentor.chat_id = str(user_id)
                 session.commit()
         except Exception as e:
+            session.rollback()
             print(f"Ошибка при сохранении chat_id: {e}")
-        finally:
-            session.close()
 
 
     if role == "cc":
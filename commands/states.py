@@ -40,6 +40,8 @@ CONTRACT_KS = "CONTRACT_KS"
 CONTRACT_BANK = "CONTRACT_BANK"
 CONTRACT_BIK = "CONTRACT_BIK"
 CONTRACT_EMAIL = "CONTRACT_EMAIL"
+CONTRACT_BATCH_TYPE = "CONTRACT_BATCH_TYPE"
+CONTRACT_BATCH_FILE = "CONTRACT_BATCH_FILE"
 
 # Unit economics
 # UE_MENU = "UE_MENU"
@@ -49,3 +51,4 @@ UE_PRODUCT_CODE = "UE_PRODUCT_CODE"
 
 # VPN config generation
 VPN_AWAITING_TELEGRAM = "VPN_AWAITING_TELEGRAM"
+VPN_AWAITING_COHORT = "VPN_AWAITING_COHORT"
@@ -10,8 +10,10 @@ from commands.start_commands import exit_to_main_menu
 from commands.states import FIELD_TO_EDIT, WAIT_FOR_NEW_VALUE, FIO_OR_TELEGRAM, WAIT_FOR_PAYMENT_DATE, SIGN_CONTRACT, SELECT_CURATOR_TYPE, SELECT_CURATOR_MENTOR
 from commands.student_info_commands import calculate_commission
 from data_base.db import session
-from data_base.models import Student, Payment, CuratorInsuranceBalance, Mentor, ManualProgress, CuratorCommission, \
+from data_base.models import Student, Payment, PaymentKind, CuratorInsuranceBalance, Mentor, CuratorCommission, \
     Salary, StudentMeta
+from data_base.held_amounts import sync_student_held_amounts
+from data_base.module_submissions import get_submission_date, MANUAL
 from data_base.operations import get_all_students, update_student, get_student_by_fio_or_telegram, delete_student
 from telegram import ReplyKeyboardMarkup, KeyboardButton
 
@@ -86,7 +88,8 @@ async def confirm_refund_callback(update: Update, context: ContextTypes.DEFAULT_
             amount=-refund_amount,
             payment_date=datetime.now().date(),
             comment=f"Возврат (вычет за звонки)",
-            status="подтвержден"
+            status="подтвержден",
+            payment_kind=PaymentKind.REFUND
         )
         session.add(new_payment)
         session.commit()
@@ -573,48 +576,9 @@ async def handle_new_value(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 else:
                     print("🛡️ Страховочные выплаты для кураторов отключены")
         
-        # 💰 ОСВОБОЖДЕНИЕ ХОЛДИРОВАНИЯ ПРИ ОТЧИСЛЕНИИ СТУДЕНТА
-        if field_to_edit == "Статус обучения" and new_value == "Отчислен":
-            from config import Config
-            if Config.HELD_AMOUNTS_ENABLED:
-                from data_base.models import HeldAmount
-                from datetime import date
-                import logging
-                
-                # Настраиваем логгер для холдирования
-                held_logger = logging.getLogger('held_amounts')
-                held_logger.setLevel(logging.INFO)
-                # Проверяем, есть ли уже обработчик
-                if not held_logger.handlers:
-                    held_file_handler = logging.FileHandler('held_amounts.log', encoding='utf-8')
-                    held_file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-                    held_logger.addHandler(held_file_handler)
-                
-                try:
-                    # Освобождаем все активные холдирования для этого студента
-                    held_amounts = session.query(HeldAmount).filter(
-                        HeldAmount.student_id == student.id,
-                        HeldAmount.status == "active"
-                    ).all()
-                    
-                    if held_amounts:
-                        total_released = 0.0
-                        for held in held_amounts:
-                            released_amount = float(held.held_amount)  # Текущее холдирование
-                            held.status = "released"
-                            held.held_amount = 0.0
-                            held.updated_at = date.today()
-                            total_released += released_amount
-                            
-                            held_logger.info(f"🔓 Освобождено холдирование: Студент {student.fio} (ID {student.id}) | "
-                                            f"Направление: {held.direction} | "
-                                            f"Освобождено: {released_amount} руб.")
-                        
-                        session.commit()
-                        print(f"💰 Освобождено холдирование для студента {student.fio}: {round(total_released, 2)} руб.")
-                except Exception as e:
-                    print(f"❌ Ошибка при освобождении холдирования: {e}")
-                    session.rollback()
+        # 💰 ХОЛДИРОВАНИЕ: при смене статуса обучения записи пересчитываются или освобождаются
+        if field_to_edit == "Статус обучения":
+            sync_student_held_amounts(student.id)
 
         # Отправляем сообщение об успехе
         await update.message.reply_text(
@@ -672,7 +636,8 @@ async def handle_payment_date(update: Update, context: ContextTypes.DEFAULT_TYPE
             amount=new_payment,
             payment_date=payment_date,
             comment="Дополнительный платёж через редактирование",
-            status="подтвержден"
+            status="подтвержден",
+            payment_kind=PaymentKind.ADDITIONAL
         )
 
         session.add(new_payment_entry)
@@ -799,18 +764,11 @@ async def award_insurance_for_module_5(student_id: int, curator_id: int):
         if existing_insurance:
             return  # Страховка уже начислена
 
-        # 🔍 ПРОВЕРЯЕМ ДАТУ ПОЛУЧЕНИЯ 5 МОДУЛЯ ИЗ ТАБЛИЦЫ MANUAL_PROGRESS
-        module_5_date = None
+        # 🔍 ПРОВЕРЯЕМ ДАТУ ПОЛУЧЕНИЯ 5 МОДУЛЯ ИЗ ЖУРНАЛА СДАЧ (module_submissions, пишется из manual_progress)
+        module_5_date = get_submission_date(session, student_id, MANUAL, "m5")
 
-        # Получаем прогресс студента из таблицы manual_progress
-        progress = session.query(ManualProgress).filter(
-            ManualProgress.student_id == student_id
-        ).first()
-
-        if progress and progress.m5_start_date:
-            module_5_date = progress.m5_start_date
-        else:
-            # Если дата не найдена в manual_progress, используем текущую дату
+        if not module_5_date:
+            # Если дата не найдена, используем текущую дату
             module_5_date = date.today()
 
         # Создаем новую страховку
@@ -967,6 +925,7 @@ async def handle_curator_mentor_selection(update: Update, context: ContextTypes.
 
         # 4. Фиксируем изменения
         session.commit()
+        sync_student_held_amounts(student.id)
 
         mentor_name = selected if selected != "Не назначен" else "Не назначен"
         await update.message.reply_text(
@@ -4,9 +4,7 @@ from commands.states import FIO_OR_TELEGRAM
 from telegram import Update, ReplyKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 
-from data_base.db import session
-from data_base.models import Mentor
-from data_base.operations import get_all_students, get_student_by_fio_or_telegram
+from data_base import async_operations
 from utils.security import restrict_to
 
 
@@ -68,20 +66,31 @@ async def display_student_info(update: Update, context: ContextTypes.DEFAULT_TYP
         return await exit_to_main_menu(update, context)
 
     # Получаем студента
-    student = get_student_by_fio_or_telegram(search_query)
+    student = await async_operations.get_student_by_fio_or_telegram(search_query)
     if not student:
-        await update.message.reply_text("Ученик не найден. Попробуйте ещё раз.")
-        return FIO_OR_TELEGRAM
+        # Точного совпадения нет — ищем по части ФИО или Telegram
+        matches = await async_operations.search_students(search_query, limit=11)
+        if not matches:
+            await update.message.reply_text("Ученик не найден. Попробуйте ещё раз.")
+            return FIO_OR_TELEGRAM
+        if len(matches) > 1:
+            response = "Найдено несколько учеников, уточните запрос:\n"
+            for found in matches[:10]:
+                response += f"• {found.fio} - {found.telegram}\n"
+            if len(matches) > 10:
+                response += "...\n"
+            await update.message.reply_text(response)
+            return FIO_OR_TELEGRAM
+        student = matches[0]
     mentor_id = getattr(student, 'mentor_id', None)
     auto_mentor_id = getattr(student, 'auto_mentor_id', None)
     mentor_name = None
     auto_mentor_name = None
+    mentor_names = await async_operations.get_mentor_names([mentor_id, auto_mentor_id])
     if mentor_id:
-        mentor = session.query(Mentor).filter(Mentor.id == mentor_id).first()
-        mentor_name = mentor.full_name if mentor else f"ID {mentor_id}"
+        mentor_name = mentor_names.get(mentor_id, f"ID {mentor_id}")
     if auto_mentor_id:
-        auto_mentor = session.query(Mentor).filter(Mentor.id == auto_mentor_id).first()
-        auto_mentor_name = auto_mentor.full_name if auto_mentor else f"ID {auto_mentor_id}"
+        auto_mentor_name = mentor_names.get(auto_mentor_id, f"ID {auto_mentor_id}")
 
     if student.training_type == "Фуллстек":
         mentor_info = f"Ручной ментор: {mentor_name or 'не выбран'}\nАвто-ментор: {auto_mentor_name or 'не выбран'}"
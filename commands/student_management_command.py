@@ -9,13 +9,15 @@ from telegram import Update, ReplyKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 
 from classes.salary import SalaryManager
+from classes.salary_report import SalaryReport
 from commands.start_commands import exit_to_main_menu
 from commands.states import FIO, TELEGRAM, START_DATE, COURSE_TYPE, TOTAL_PAYMENT, PAID_AMOUNT, \
     SELECT_MENTOR, IS_REFERRAL, REFERRER_TELEGRAM, STUDENT_SOURCE, PAYMENT_CHANNEL
 from data_base.db import session
-from data_base.models import Payment, Student, CareerConsultant, SalaryKK
+from data_base.models import Payment, PaymentKind, Student, SalaryKK
 from data_base.models import Payout, Salary, Mentor
 from data_base.models import StudentMeta
+from data_base.held_amounts import sync_student_held_amounts
 from data_base.operations import get_student_by_fio_or_telegram
 from student_management.student_management import add_student
 
@@ -539,6 +541,10 @@ async def create_student_with_meta(update: Update, context: ContextTypes.DEFAULT
         session.add(student_meta)
         session.commit()
 
+        # 💰 Записи холдирования для нового фуллстек студента
+        if context.user_data["course_type"] == "Фуллстек":
+            sync_student_held_amounts(student_id)
+
         # Записываем платёж
         course_type = context.user_data.get("course_type")
         mentor_id = context.user_data.get("mentor_id")
@@ -613,7 +619,8 @@ def record_initial_payment(student_id, paid_amount, mentor_id=None):
                 amount=paid_amount,
                 payment_date=datetime.now().date(),
                 comment="Первоначальный платёж при регистрации",
-                status="подтвержден"
+                status="подтвержден",
+                payment_kind=PaymentKind.INITIAL
             )
 
             session.add(new_payment)
@@ -665,7 +672,7 @@ async def calculate_salary(update: Update, context: ContextTypes.DEFAULT_TYPE):
     Рассчитывает зарплату и сразу выводит список сотрудников с суммами.
     """
     try:
-        from datetime import datetime, time
+        from datetime import datetime
         # 1. Парсинг дат
         date_range = update.message.text.strip()
         if " - " not in date_range:
@@ -680,120 +687,19 @@ async def calculate_salary(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("❌ Ошибка в дате.")
             return "WAIT_FOR_SALARY_DATES"
 
-        # Фильтр по времени (весь день до 23:59:59)
-        start_dt = datetime.combine(start_date, time.min)
-        end_dt = datetime.combine(end_date, time.max)
-        kk_report_data = {}  # {kk_id: amount_to_pay}
+        period_str = f"{start_date_str} - {end_date_str}"
         context.user_data['salary_period'] = {'start': start_date, 'end': end_date}
-        context.user_data['salary_period_str'] = f"{start_date_str} - {end_date_str}"
-
-        # 2. Сбор данных из Salary
-        salary_records = session.query(Salary).filter(
-            Salary.date_calculated >= start_dt,
-            Salary.date_calculated <= end_dt
-        ).all()
-
-        report_data = {}
-        # Загружаем карту менторов {ID: Имя}
-        mentors_query = session.query(Mentor).all()
-        mentors_map = {m.id: m.full_name for m in mentors_query}
-        context.user_data['mentors_map'] = mentors_map
-
-        # Агрегация данных
-        for record in salary_records:
-            m_id = record.mentor_id
-            if not m_id: continue
-
-            amount = float(record.calculated_amount)
-
-            if m_id not in report_data:
-                report_data[m_id] = {'total': 0.0, 'paid': 0.0, 'to_pay': 0.0, 'logs': []}
-
-            report_data[m_id]['total'] += amount
+        context.user_data['salary_period_str'] = period_str
 
-            if record.is_paid:
-                report_data[m_id]['paid'] += amount
-            else:
-                report_data[m_id]['to_pay'] += amount
-
-            # Логи
-            status_icon = "✅" if record.is_paid else "⏳"
-            date_log = record.date_calculated.strftime("%d.%m") if record.date_calculated else "??"
-            report_data[m_id]['logs'].append(f"{status_icon} {date_log}: {record.comment} | {amount:,.2f}р.")
-
-        context.user_data['salary_report_data'] = report_data
+        # 2. Один снимок отчета на все экраны (детализация, выбор сотрудника, выплата)
+        report = SalaryReport.build(session, start_date, end_date)
+        context.user_data['salary_report'] = report
+        context.user_data['salary_report_data'] = report.mentor_data
+        context.user_data['mentors_map'] = report.mentor_names
+        context.user_data['kk_report_data'] = report.kk_to_pay
 
         # 3. Формирование текста отчета
-        text = f"📊 <b>ОТЧЕТ ПО ЗАРПЛАТЕ ({start_date_str} - {end_date_str})</b>\n"
-        text += "Использована таблица транзакций (Salary)\n\n"
-        text += "👨‍🏫 <b>Менторы:</b>\n"
-
-        total_to_pay_global = 0.0
-        found_any = False
-
-        for m_id, data in report_data.items():
-            to_pay = data['to_pay']
-            paid = data['paid']
-
-            if to_pay == 0 and paid == 0: continue
-
-            found_any = True
-            name = mentors_map.get(m_id, f"ID {m_id}")
-
-            with_tax = to_pay * 1.06
-            total_to_pay_global += to_pay
-
-            line = f"• {name}: <b>{to_pay:,.2f} руб.</b> (с налогом: {with_tax:,.2f})"
-            if paid > 0:
-                line += f" | <i>выплачено: {paid:,.2f} руб.</i>"
-            text += line + "\n"
-
-        if not found_any:
-            text += "Нет начислений за этот период.\n"
-
-        # --- БЛОК КАРЬЕРНЫХ КОНСУЛЬТАНТОВ ---
-        text += "\n💼 <b>Карьерные Консультанты:</b>\n"
-        kk_total_to_pay = 0.0
-
-        # 1. Используем start_dt и end_dt для TIMESTAMP
-        active_kks = session.query(CareerConsultant).join(SalaryKK).filter(
-            SalaryKK.date_calculated >= start_dt,  # Было start_date
-            SalaryKK.date_calculated <= end_dt,  # Было end_date
-            SalaryKK.is_paid == False  # Добавляем, если ищем только долги
-        ).distinct().all()
-
-        if not active_kks:
-            text += "<i>Начислений по КК не найдено</i>\n"
-        else:
-            for kk in active_kks:
-                # 2. Здесь тоже используем dt с временем
-                kk_items = session.query(SalaryKK).filter(
-                    SalaryKK.kk_id == kk.id,
-                    SalaryKK.date_calculated >= start_dt,
-                    SalaryKK.date_calculated <= end_dt,
-                    SalaryKK.is_paid == False
-                ).all()
-
-                kk_sum = sum(float(item.calculated_amount) for item in kk_items)
-                kk_report_data[kk.id] = kk_sum
-
-                kk_total_to_pay += kk_sum
-                text += f"👤 <b>{kk.full_name}</b>\n"
-
-                for item in kk_items:
-                    student = session.query(Student).filter(Student.id == item.student_id).first()
-                    student_name = student.fio if student else f"ID:{item.student_id}"
-
-                    text += (f"  ▫️ {student_name}: <b>{float(item.calculated_amount):,.2f} руб. (с налогом: {float(item.calculated_amount)*1.06:,.2f})</b> "
-                             f"(Ост. лимит: {float(item.remaining_limit):,.2f})\n")
-
-                # text += f"  💰 <b>Итого по консультанту: {kk_sum:,.2f} руб.</b>\n\n"
-
-        # 5. Итоговая сумма по всему отчету
-        total_to_pay_global += kk_total_to_pay  # Добавляем КК в общий итог
-
-        text += "---"
-        text += f"\n💵 <b>ОБЩИЙ ИТОГ К ВЫПЛАТЕ: {total_to_pay_global:.2f} руб.</b>"
+        text = report.summary_text(period_str)
         text += "Выберите действие:"
 
         keyboard = [
@@ -807,7 +713,6 @@ async def calculate_salary(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup=ReplyKeyboardMarkup(keyboard, one_time_keyboard=True),
             parse_mode="HTML"
         )
-        context.user_data['kk_report_data'] = kk_report_data
         return "SALARY_MAIN_MENU"
 
     except Exception as e:
@@ -854,6 +759,7 @@ async def handle_salary_main_menu(update: Update, context: ContextTypes.DEFAULT_
 
 async def handle_detail_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
     choice = update.message.text
+    report = context.user_data.get('salary_report') or SalaryReport(None, None)
     report_data = context.user_data.get('salary_report_data', {})
     mentors_map = context.user_data.get('mentors_map', {})
 
@@ -898,9 +804,8 @@ async def handle_detail_selection(update: Update, context: ContextTypes.DEFAULT_
         # 2. 🔥 ДОБАВЛЯЕМ КК ИЗ kk_report_data
         kk_report = context.user_data.get('kk_report_data', {})
         for kk_id in kk_report.keys():
-            kk_obj = session.query(CareerConsultant).filter_by(id=kk_id).first()
-            if kk_obj:
-                btn_text = f"💼 {kk_obj.full_name}"
+            if kk_id in report.kk_names:
+                btn_text = f"💼 {report.kk_name(kk_id)}"
                 buttons.append([btn_text])
                 button_map[btn_text] = ("kk", kk_id)  # Запоминаем, что это КК
 
@@ -931,55 +836,8 @@ async def handle_detail_selection(update: Update, context: ContextTypes.DEFAULT_
                         await update.message.reply_text(part, parse_mode="HTML")
 
             elif res_type == "kk":
-
-             # Логика для Карьерного Консультанта
-
-                kk_obj = session.query(CareerConsultant).filter_by(id=res_id).first()
-
-                name = kk_obj.full_name if kk_obj else "КК"
-
-                # Собираем историю начислений КК (используем func.date для точности)
-
-                kk_items = session.query(SalaryKK).filter(
-
-                    SalaryKK.kk_id == res_id,
-
-                    func.date(SalaryKK.date_calculated) >= context.user_data['salary_period']['start'],
-
-                    func.date(SalaryKK.date_calculated) <= context.user_data['salary_period']['end']
-
-                ).order_by(SalaryKK.date_calculated.desc()).all()
-
-                text = f"💼 <b>История операций КК: {name}</b>\n\n"
-
-                if not kk_items:
-
-                    text += "<i>Записей за этот период не найдено.</i>"
-
-                else:
-
-                    for item in kk_items:
-                        # Получаем данные студента
-
-                        student = session.query(Student).filter(Student.id == item.student_id).first()
-
-                        st_name = student.fio if student else "Студент"
-
-                        # 🔥 ПОЛУЧАЕМ ДАННЫЕ ОРИГИНАЛЬНОГО ПЛАТЕЖА
-
-                        payment = session.query(Payment).filter(Payment.id == item.payment_id).first()
-
-                        p_amount = float(payment.amount) if payment else 0.0
-
-                        status = "✅" if item.is_paid else "⏳"
-
-                        date_str = item.date_calculated.strftime('%d.%m')
-
-                        # Формируем красивую строку
-
-                        text += (f"{status} <b>{date_str}</b> | {st_name}\n"
-                
-                                 f"   └ Платёж: {p_amount:,.2f}р. | Бонус: <b>+{float(item.calculated_amount):,.2f}р.</b>\n")
+                # Логика для Карьерного Консультанта: история берется из снимка отчета
+                text = report.kk_history_text(res_id)
 
                 for part in split_long_message(text):
                     await update.message.reply_text(part, parse_mode="HTML")
@@ -992,6 +850,7 @@ async def handle_detail_selection(update: Update, context: ContextTypes.DEFAULT_
 
 async def handle_payment_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
     choice = update.message.text
+    report = context.user_data.get('salary_report') or SalaryReport(None, None)
     report_data = context.user_data.get('salary_report_data', {})
     mentors_map = context.user_data.get('mentors_map', {})
 
@@ -1047,12 +906,10 @@ async def handle_payment_selection(update: Update, context: ContextTypes.DEFAULT
         # 2. 🔥 КК
         kk_report = context.user_data.get('kk_report_data', {})
         for kk_id, amount in kk_report.items():
-            if amount > 0:
-                kk_obj = session.query(CareerConsultant).filter_by(id=kk_id).first()
-                if kk_obj:
-                    btn_text = f"💼 {kk_obj.full_name} ({amount:,.0f}р)"
-                    buttons.append([btn_text])
-                    button_map[btn_text] = ("kk", kk_id)
+            if amount > 0 and kk_id in report.kk_names:
+                btn_text = f"💼 {report.kk_name(kk_id)} ({amount:,.0f}р)"
+                buttons.append([btn_text])
+                button_map[btn_text] = ("kk", kk_id)
 
         context.user_data['salary_payment_button_map'] = button_map
         buttons.append(["🔙 Возврат в меню"])
@@ -1081,8 +938,7 @@ async def handle_payment_selection(update: Update, context: ContextTypes.DEFAULT
                 target_kk_ids = [res_id]
                 kk_report = context.user_data.get('kk_report_data', {})
                 total_amount = kk_report.get(res_id, 0.0)
-                kk_obj = session.query(CareerConsultant).filter_by(id=res_id).first()
-                name = kk_obj.full_name if kk_obj else "КК"
+                name = report.kk_name(res_id)
 
             confirm_msg = f"Выплачиваем: <b>{name}</b>\nСумма: <b>{total_amount:,.2f} руб.</b>\n\nПодтверждаете?"
         else:
@@ -1122,14 +978,20 @@ async def confirm_payout(update: Update, context: ContextTypes.DEFAULT_TYPE):
         processed_count = 0
         total_recorded = 0.0
 
-        # ВЫПЛАТА МЕНТОРАМ
-        for m_id in target_ids:
+        # ВЫПЛАТА МЕНТОРАМ (все невыплаченные начисления выбранных менторов одним запросом)
+        unpaid_by_mentor = {}
+        if target_ids:
             unpaid = session.query(Salary).filter(
-                Salary.mentor_id == m_id,
+                Salary.mentor_id.in_(target_ids),
                 func.date(Salary.date_calculated) >= period_start,
                 func.date(Salary.date_calculated) <= period_end,
                 Salary.is_paid == False
             ).all()
+            for s in unpaid:
+                unpaid_by_mentor.setdefault(s.mentor_id, []).append(s)
+
+        for m_id in target_ids:
+            unpaid = unpaid_by_mentor.get(m_id)
             if unpaid:
                 amount = sum(float(s.calculated_amount) for s in unpaid)
                 new_payout = Payout(mentor_id=m_id, total_amount=amount, period_start=period_start,kk_id=None,
@@ -1140,14 +1002,19 @@ async def confirm_payout(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 processed_count += 1
 
         # ВЫПЛАТА КАРЬЕРНЫМ КОНСУЛЬТАНТАМ
-        for k_id in target_kk_ids:
+        unpaid_by_kk = {}
+        if target_kk_ids:
             unpaid_kk = session.query(SalaryKK).filter(
-                SalaryKK.kk_id == k_id,
+                SalaryKK.kk_id.in_(target_kk_ids),
                 func.date(SalaryKK.date_calculated) >= period_start,
                 func.date(SalaryKK.date_calculated) <= period_end,
                 SalaryKK.is_paid == False
             ).all()
+            for s in unpaid_kk:
+                unpaid_by_kk.setdefault(s.kk_id, []).append(s)
 
+        for k_id in target_kk_ids:
+            unpaid_kk = unpaid_by_kk.get(k_id)
             if unpaid_kk:
                 amount = sum(float(s.calculated_amount) for s in unpaid_kk)
                 # 🔥 Добавляем kk_id=k_id в конструктор
@@ -1459,15 +1326,15 @@ async def generate_mentor_detailed_report(mentor, salary, logs, start_date, end_
             ).all()
 
             for payment, student in payments_q:
-                comment_lower = (payment.comment or "").lower()
+                kind = payment.payment_kind
                 amount = float(payment.amount)
 
                 # Брутто агрегаты (все платежи)
-                if "первонач" in comment_lower:
+                if kind == PaymentKind.INITIAL:
                     total_initial += amount
-                elif "доплат" in comment_lower:
+                elif kind == PaymentKind.EXTRA:
                     total_additional += amount
-                elif "комисси" in comment_lower:
+                elif kind == PaymentKind.COMMISSION:
                     total_commission += amount
 
                 # Исключаем Fullstack из расчётной базы
@@ -1480,11 +1347,11 @@ async def generate_mentor_detailed_report(mentor, salary, logs, start_date, end_
                         continue  # Пропускаем - эти студенты рассчитываются по новой системе
 
                 # Платёж попадает в расчёт — накапливаем расчётную базу
-                if "первонач" in comment_lower:
+                if kind == PaymentKind.INITIAL:
                     counted_initial += amount
-                elif "доплат" in comment_lower:
+                elif kind == PaymentKind.EXTRA:
                     counted_additional += amount
-                elif "комисси" in comment_lower:
+                elif kind == PaymentKind.COMMISSION:
                     counted_commission += amount
 
                 # Применяем те же правила процентов, что и в calculate_salary
@@ -1497,7 +1364,7 @@ async def generate_mentor_detailed_report(mentor, salary, logs, start_date, end_
 
                 # Комиссия канала (Лава/ИП) уже учтена при создании записей в Salary — здесь только пересчёт для сводки
                 # Для комиссионных платежей используем новую формулу расчета от базового дохода
-                if "комисси" in comment_lower and student.commission:
+                if kind == PaymentKind.COMMISSION and student.commission:
                     from data_base.operations import calculate_base_income_and_salary
                     base_income, curator_salary = calculate_base_income_and_salary(
                         amount,
@@ -1514,9 +1381,9 @@ async def generate_mentor_detailed_report(mentor, salary, logs, start_date, end_
                     # Для остальных платежей используем старую формулу
                     payout = amount * percent
 
-                if "первонач" in comment_lower or "доплат" in comment_lower:
+                if kind in (PaymentKind.INITIAL, PaymentKind.EXTRA):
                     from_students_payout += payout
-                elif "комисси" in comment_lower:
+                elif kind == PaymentKind.COMMISSION:
                     from_offers_payout += payout
 
         total_prepayment = round(total_initial + total_additional, 2)
@@ -1628,7 +1495,7 @@ async def generate_consultant_detailed_report(consultant, salary, start_date, en
     logger.info(f"Базовая информация для КК {consultant.full_name} добавлена")
     
     # Получаем детали по комиссиям
-    from data_base.models import Payment, Student
+    from data_base.models import Payment, PaymentKind, Student
     
     commission_payments = session.query(Payment).filter(
         Payment.student_id.in_(
@@ -1637,7 +1504,7 @@ async def generate_consultant_detailed_report(consultant, salary, start_date, en
         Payment.payment_date >= datetime.strptime(start_date, "%d.%m.%Y").date(),
         Payment.payment_date <= datetime.strptime(end_date, "%d.%m.%Y").date(),
         Payment.status == "подтвержден",
-        Payment.comment.ilike("%комисси%")
+        Payment.payment_kind == PaymentKind.COMMISSION
     ).order_by(Payment.payment_date.asc()).all()
     
     # Подсчёт предоплаты и постоплаты за период (для справки)
@@ -1664,13 +1531,13 @@ async def generate_consultant_detailed_report(consultant, salary, start_date, en
         ).order_by(Payment.payment_date.asc()).all()
 
         for payment in payments_q:
-            comment_lower = (payment.comment or "").lower()
+            kind = payment.payment_kind
             amount = float(payment.amount)
-            if "первонач" in comment_lower:
+            if kind == PaymentKind.INITIAL:
                 total_initial += amount
-            elif "доплат" in comment_lower:
+            elif kind == PaymentKind.EXTRA:
                 total_additional += amount
-            elif "комисси" in comment_lower:
+            elif kind == PaymentKind.COMMISSION:
                 total_commission += amount
                 commission_details_fallback.append(payment)
 
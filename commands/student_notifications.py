@@ -82,7 +82,7 @@ async def check_prepayment_notifications(update: Update, context: ContextTypes.D
 
 async def check_postpayment_notifications(update: Update, context: ContextTypes.DEFAULT_TYPE):
     from data_base.db import session
-    from data_base.models import Student, Payment
+    from data_base.models import Student, Payment, PaymentKind
     from datetime import date, timedelta, datetime
     from sqlalchemy import or_
 
@@ -132,7 +132,7 @@ async def check_postpayment_notifications(update: Update, context: ContextTypes.
             # Поиск последнего платежа
             last_p = session.query(Payment).filter(
                 Payment.student_id == s.id,
-                Payment.comment.ilike("%Комисс%"),
+                Payment.payment_kind == PaymentKind.COMMISSION,
                 Payment.status == "подтвержден"
             ).order_by(Payment.payment_date.desc()).first()
 
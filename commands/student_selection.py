@@ -3,7 +3,7 @@ from commands.states import FIO_OR_TELEGRAM, SELECT_STUDENT, FIELD_TO_EDIT
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
 from telegram.ext import ContextTypes, ConversationHandler
 
-from data_base.operations import get_all_students, get_student_by_fio_or_telegram
+from data_base.operations import search_students, get_student_by_fio_or_telegram
 from utils.security import get_user_role
 
 
@@ -34,6 +34,10 @@ def get_edit_menu_keyboard(role: str):
         ]
     return ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
 
+# Максимум студентов в списке выбора
+STUDENT_SEARCH_LIMIT = 20
+
+
 # Поиск студента
 async def find_student(update: Update, context: ContextTypes.DEFAULT_TYPE):
     search_query = update.message.text.strip()
@@ -41,12 +45,7 @@ async def find_student(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if search_query == "Главное меню":
         return await exit_to_main_menu(update, context)
 
-    students = get_all_students()
-
-    matching_students = [
-        student for student in students
-        if search_query.lower() in student.fio.lower() or search_query.lower() in student.telegram.lower()
-    ]
+    matching_students = search_students(search_query, limit=STUDENT_SEARCH_LIMIT)
 
     if not matching_students:
         await update.message.reply_text(
@@ -57,6 +56,9 @@ async def find_student(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if len(matching_students) > 1:
         response = "Найдено несколько студентов. Укажите номер:\n"
+        if len(matching_students) == STUDENT_SEARCH_LIMIT:
+            response = (f"Показаны первые {STUDENT_SEARCH_LIMIT} совпадений, уточните запрос при необходимости.\n"
+                        + response)
         for i, student in enumerate(matching_students, start=1):
             response += f"{i}. {student.fio} - {student.telegram}\n"
 
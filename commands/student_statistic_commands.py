@@ -7,10 +7,11 @@ from telegram import Update, ReplyKeyboardMarkup
 from telegram.ext import ContextTypes
 from commands.states import STATISTICS_MENU, COURSE_TYPE_MENU, START_PERIOD, END_PERIOD, UE_MENU
 from data_base.db import session
-from data_base.models import Student, Payment
+from data_base.models import Student, Payment, PaymentKind
 from data_base.operations import get_general_statistics, get_students_by_period, get_students_by_training_type
 from commands.additional_expenses_commands import get_additional_expenses_for_period
 from utils.security import restrict_to
+from utils.background_jobs import submit_report
 
 logger = logging.getLogger(__name__)
 
@@ -215,142 +216,129 @@ async def handle_period_end(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # Вспомогательная функция, принимающая объекты date
 def calc_total_salaries_for_dates(start_date, end_date, session) -> tuple:
-    from data_base.models import Payment, Student, CareerConsultant
+    """
+    Считает зарплаты менторов и карьерных консультантов за период.
 
-    mentor_salaries = {}
+    Все подтвержденные платежи периода загружаются одним запросом вместе со студентом
+    и его активным карьерным консультантом, после чего кураторские, фуллстек, премиальные
+    и КК начисления считаются за один проход по строкам.
+    """
+    from datetime import date
+    from sqlalchemy import and_
+    from data_base.models import Payment, Student, CareerConsultant
 
-    detailed_payments = session.query(Payment).filter(
-        Payment.payment_date >= start_date,
-        Payment.payment_date <= end_date,
-        Payment.status == "подтвержден",
-        ~Payment.comment.ilike("%преми%")
-    ).all()
+    # Рассчитываем комиссию КК: 20% если КК с ID=1 взял студента после 18.11.2025, иначе 10%
+    COMMISSION_CHANGE_DATE = date(2025, 11, 18)
+
+    rows = (
+        session.query(
+            Payment.mentor_id,
+            Payment.amount,
+            Payment.payment_date,
+            Payment.payment_kind,
+            Student.id.label("student_id"),
+            Student.fio,
+            Student.telegram,
+            Student.training_type,
+            Student.consultant_start_date,
+            Student.career_consultant_id,
+            CareerConsultant.id.label("consultant_id"),
+            CareerConsultant.full_name.label("consultant_name"),
+            CareerConsultant.telegram.label("consultant_telegram"),
+        )
+        .outerjoin(Student, Student.id == Payment.student_id)
+        .outerjoin(
+            CareerConsultant,
+            and_(CareerConsultant.id == Student.career_consultant_id, CareerConsultant.is_active == True)
+        )
+        .filter(
+            Payment.payment_date >= start_date,
+            Payment.payment_date <= end_date,
+            Payment.status == "подтвержден",
+            # Как и раньше (~comment.ilike), платежи без комментария в расчет не входят
+            Payment.comment.isnot(None)
+        )
+        .all()
+    )
 
-    for p in detailed_payments:
-        student = session.query(Student).get(p.student_id)
-        if not student or not p.mentor_id:
-            continue
+    mentor_salaries = {}
+    career_consultant_salaries = {}
+    # {consultant_id: {'name', 'telegram', 'total_commission', 'payments'}}
+    consultant_logs = {}
 
-        m_id = p.mentor_id
-        mentor_salaries.setdefault(m_id, 0)
+    for row in rows:
+        amt = float(row.amount)
+        m_id = row.mentor_id
 
-        if student.training_type == "Фуллстек":
+        # Премии идут ментору целиком
+        if row.payment_kind == PaymentKind.BONUS:
+            mentor_salaries.setdefault(m_id, 0)
+            mentor_salaries[m_id] += amt
             continue
 
-        if m_id == 1 and student.training_type == "Ручное тестирование":
-            pct = 0.3
-        elif m_id == 3 and student.training_type == "Автотестирование":
-            pct = 0.3
-        else:
-            pct = 0.2
-        mentor_salaries[m_id] += float(p.amount) * pct
-
-    for p in detailed_payments:
-        student = session.query(Student).get(p.student_id)
-        if not student or student.training_type == "Фуллстек":
+        if row.student_id is None:
             continue
 
-        if p.mentor_id != 1 and student.training_type.lower().strip() == "ручное тестирование":
-            mentor_salaries.setdefault(1, 0)
-            mentor_salaries[1] += float(p.amount) * 0.1
+        training_type = row.training_type or ""
 
-        if p.mentor_id != 3 and student.training_type == "Автотестирование":
+        if training_type == "Фуллстек":
+            # Фуллстек: 30% директору авто, если он куратор, иначе 10% директору и 20% куратору
+            mentor_salaries.setdefault(m_id, 0)
             mentor_salaries.setdefault(3, 0)
-            mentor_salaries[3] += float(p.amount) * 0.1
-
-    # fs_students = session.query(Student).filter(
-    #     Student.training_type == "Фуллстек",
-    #     Student.total_cost >= 50000,
-    #     Student.start_date >= start_date,
-    #     Student.start_date <= end_date
-    # ).all()
-    # if fs_students:
-    #     mentor_salaries.setdefault(1, 0)
-    #     mentor_salaries[1] += len(fs_students) * 5000
-
-    for p in detailed_payments:
-        student = session.query(Student).get(p.student_id)
-        if not student or student.training_type != "Фуллстек":
-            continue
-
-        amt = float(p.amount)
-        m_id = p.mentor_id
-
-        mentor_salaries.setdefault(m_id, 0)
-        mentor_salaries.setdefault(3, 0)
-
-        if m_id == 3:
-            mentor_salaries[3] += amt * 0.3
+            if m_id == 3:
+                mentor_salaries[3] += amt * 0.3
+            else:
+                mentor_salaries[3] += amt * 0.1
+                mentor_salaries[m_id] += amt * 0.2
         else:
-            mentor_salaries[3] += amt * 0.1
-            mentor_salaries[m_id] += amt * 0.2
-
-    premium_payments = session.query(Payment).filter(
-        Payment.payment_date >= start_date,
-        Payment.payment_date <= end_date,
-        Payment.status == "подтвержден",
-        Payment.comment.ilike("%преми%")
-    ).all()
-
-    for p in premium_payments:
-        m_id = p.mentor_id
-        mentor_salaries.setdefault(m_id, 0)
-        mentor_salaries[m_id] += float(p.amount)
-
-    # Расчет зарплат карьерных консультантов
-    career_consultant_salaries = {}
-    all_consultants = session.query(CareerConsultant).filter(CareerConsultant.is_active == True).all()
-    
-    for consultant in all_consultants:
-        # Получаем всех студентов, закрепленных за консультантом
-        students = session.query(Student).filter(Student.career_consultant_id == consultant.id).all()
-        student_ids = [student.id for student in students]
-        
-        if not student_ids:
-            continue
-        
-        # Получаем все подтвержденные платежи с комментарием "Комиссия" за период
-        commission_payments = session.query(Payment).filter(
-            Payment.student_id.in_(student_ids),
-            Payment.payment_date >= start_date,
-            Payment.payment_date <= end_date,
-            Payment.status == "подтвержден",
-            Payment.comment.ilike("%комисси%")
-        ).all()
-        
-        # Рассчитываем комиссию: 20% если КК с ID=1 взял студента после 18.11.2025, иначе 10%
-        from datetime import date
-        COMMISSION_CHANGE_DATE = date(2025, 11, 18)
-        
-        total_commission = 0
-        salary = 0
-        for payment in commission_payments:
-            student = session.query(Student).filter(Student.id == payment.student_id).first()
-            if student and student.consultant_start_date:
-                # Если КК взял студента после 18.11.2025 и КК с ID=1, то 20%, иначе 10%
-                if student.consultant_start_date >= COMMISSION_CHANGE_DATE and student.career_consultant_id == 1:
-                    salary += float(payment.amount) * 0.2
+            # Кураторская доля
+            if m_id:
+                mentor_salaries.setdefault(m_id, 0)
+                if m_id == 1 and training_type == "Ручное тестирование":
+                    pct = 0.3
+                elif m_id == 3 and training_type == "Автотестирование":
+                    pct = 0.3
                 else:
-                    salary += float(payment.amount) * 0.1
+                    pct = 0.2
+                mentor_salaries[m_id] += amt * pct
+
+            # Пассивная доля директоров направлений
+            if m_id != 1 and training_type.lower().strip() == "ручное тестирование":
+                mentor_salaries.setdefault(1, 0)
+                mentor_salaries[1] += amt * 0.1
+
+            if m_id != 3 and training_type == "Автотестирование":
+                mentor_salaries.setdefault(3, 0)
+                mentor_salaries[3] += amt * 0.1
+
+        # Начисления карьерных консультантов с комиссионных платежей
+        if row.consultant_id is not None and row.payment_kind == PaymentKind.COMMISSION:
+            if (row.consultant_start_date and row.consultant_start_date >= COMMISSION_CHANGE_DATE
+                    and row.career_consultant_id == 1):
+                kk_salary = amt * 0.2
             else:
-                # Если дата не установлена, используем старую ставку 10%
-                salary += float(payment.amount) * 0.1
-            total_commission += float(payment.amount)
-        career_consultant_salaries[consultant.id] = round(salary, 2)
-        
-        # Подробное логирование для карьерных консультантов
-        if commission_payments:
-            logger.info(f"📘 Карьерный консультант: {consultant.full_name} ({consultant.telegram})")
-            # Расчет с учетом НДФЛ 6%
-            salary_with_tax = round(salary * 1.06, 2)
-            logger.info(f"💼 Карьерный консультант {consultant.full_name} | Комиссии: {total_commission} руб. | Итого: {salary} руб. (с НДФЛ {salary_with_tax})")
-            
-            # Логируем каждый платеж комиссии отдельно
-            for payment in commission_payments:
-                student = session.query(Student).filter(Student.id == payment.student_id).first()
-                if student:
-                    logger.info(f"  📄 Студент {student.fio} ({student.telegram}) | Платеж: {payment.amount} руб. | Дата: {payment.payment_date} | Комментарий: {payment.comment}")
-            logger.info(f"Итог: {salary} руб. (с НДФЛ {salary_with_tax})")
+                kk_salary = amt * 0.1
+            career_consultant_salaries[row.consultant_id] = career_consultant_salaries.get(row.consultant_id, 0) + kk_salary
+
+            log = consultant_logs.setdefault(row.consultant_id, {
+                'name': row.consultant_name,
+                'telegram': row.consultant_telegram,
+                'total_commission': 0.0,
+                'payments': [],
+            })
+            log['total_commission'] += amt
+            log['payments'].append(row)
+
+    # Подробное логирование для карьерных консультантов
+    for consultant_id, log in consultant_logs.items():
+        salary = round(career_consultant_salaries[consultant_id], 2)
+        career_consultant_salaries[consultant_id] = salary
+        salary_with_tax = round(salary * 1.06, 2)
+        logger.info(f"📘 Карьерный консультант: {log['name']} ({log['telegram']})")
+        logger.info(f"💼 Карьерный консультант {log['name']} | Комиссии: {log['total_commission']} руб. | Итого: {salary} руб. (с НДФЛ {salary_with_tax})")
+        for payment in log['payments']:
+            logger.info(f"  📄 Студент {payment.fio} ({payment.telegram}) | Платеж: {payment.amount} руб. | Дата: {payment.payment_date} | Вид: {payment.payment_kind}")
+        logger.info(f"Итог: {salary} руб. (с НДФЛ {salary_with_tax})")
 
     # Вычисляем общую зарплату менторов (исключая карьерных консультантов)
     total_mentor_salary = sum(mentor_salaries.values())
@@ -374,6 +362,16 @@ async def show_period_statistics(update: Update, context: ContextTypes.DEFAULT_T
         await update.message.reply_text("⚠ Конечная дата не может быть раньше начальной. Введите корректную дату.")
         return END_PERIOD
 
+    await submit_report(update, context, build_period_statistics_text, start_date, end_date,
+                        title="Статистика за период")
+    return STATISTICS_MENU
+
+
+def build_period_statistics_text(start_date, end_date):
+    """
+    Формирует текст статистики по периоду (студенты, оборот, зарплаты, прибыль).
+    Выполняется в пуле тяжёлых задач.
+    """
     # Получаем студентов, начавших обучение в период
     students = session.query(Student).filter(
         Student.start_date.between(start_date, end_date)
@@ -385,21 +383,20 @@ async def show_period_statistics(update: Update, context: ContextTypes.DEFAULT_T
     total_paid = session.query(func.sum(Payment.amount)).filter(
         Payment.payment_date.between(start_date, end_date),
         Payment.status == "подтвержден",
-        ~Payment.comment.ilike("%Системное восстановление%"),  # Исключаем доп расходы из оборота
-        ~Payment.comment.ilike("%Доп расход%")  # Исключаем доп расходы из оборота
+        Payment.payment_kind != PaymentKind.EXPENSE  # Исключаем доп расходы из оборота
     ).scalar() or 0
 
-    # Получаем сумму доплат (где comment = "Доплата")
+    # Получаем сумму доплат
     additional_payments = session.query(func.sum(Payment.amount)).filter(
         Payment.payment_date.between(start_date, end_date),
         Payment.status == "подтвержден",
-        Payment.comment == "Доплата"
+        Payment.payment_kind == PaymentKind.EXTRA
     ).scalar() or 0
 
     additional_commission = session.query(func.sum(Payment.amount)).filter(
         Payment.payment_date.between(start_date, end_date),
         Payment.status == "подтвержден",
-        Payment.comment == "Комиссия"
+        Payment.payment_kind == PaymentKind.COMMISSION
     ).scalar() or 0
 
     # Общая стоимость обучения для найденных студентов
@@ -407,7 +404,7 @@ async def show_period_statistics(update: Update, context: ContextTypes.DEFAULT_T
     payment_amount = session.query(func.sum(Payment.amount)).filter(
         Payment.payment_date.between(start_date, end_date),
         Payment.status == "подтвержден",
-        Payment.comment == "Первоначальный платёж при регистрации"
+        Payment.payment_kind == PaymentKind.INITIAL
     ).scalar() or 0
 
     # Остаток к оплате
@@ -465,8 +462,280 @@ async def show_period_statistics(update: Update, context: ContextTypes.DEFAULT_T
             f"🧾 Осталось оплатить: {int(remaining_payment):,} руб."
         )
 
-    await update.message.reply_text(response)
-    return STATISTICS_MENU
+    return response
+
+
+def build_held_amounts_report():
+    """
+    Формирует текст отчета по активным записям холдирования.
+    Записи поддерживаются по событиям (data_base/held_amounts.py), здесь — только чтение одним запросом.
+    """
+    from config import Config
+    from data_base.models import HeldAmount, Mentor
+    from data_base.held_amounts import get_held_logger
+    from datetime import date as date_class
+
+    held_logger = get_held_logger()
+
+    held_logger.info("=" * 80)
+    held_logger.info("💰 НАЧАЛО ОБРАБОТКИ ЗАПРОСА ХОЛДИРОВАНИЯ")
+    logger.info("💰 Начинаем обработку запроса холдирования")
+    
+    # Дата начала действия системы холдирования
+    held_amounts_start_date = date_class(2025, 9, 1)
+    current_date = date_class.today()
+    
+    # 📝 ДЕТАЛЬНОЕ ЛОГИРОВАНИЕ
+    held_logger.info("=" * 80)
+    held_logger.info(f"💰 ЗАПРОС ХОЛДИРОВАНИЯ - {current_date.strftime('%d.%m.%Y %H:%M:%S')}")
+    held_logger.info(f"Период: с 01.09.2025 по {current_date.strftime('%d.%m.%Y')}")
+    held_logger.info("=" * 80)
+    
+    # Получаем все активные холдирования для студентов, начавших обучение с 1 сентября 2025
+    active_held_amounts = session.query(
+        HeldAmount.student_id,
+        HeldAmount.direction,
+        HeldAmount.mentor_id,
+        HeldAmount.held_amount,
+        HeldAmount.paid_amount,
+        HeldAmount.modules_completed,
+        HeldAmount.total_modules,
+        HeldAmount.status,
+        Student.fio,
+        Student.start_date,
+        Student.total_cost,
+        Mentor.full_name.label("mentor_name")
+    ).join(
+        Student, HeldAmount.student_id == Student.id
+    ).outerjoin(
+        Mentor, Mentor.id == HeldAmount.mentor_id
+    ).filter(
+        HeldAmount.status == "active",
+        Student.start_date >= held_amounts_start_date
+    ).order_by(HeldAmount.id).all()
+
+    # Логируем количество найденных записей
+    held_logger.info(f"🔍 Найдено активных холдирований: {len(active_held_amounts)}")
+
+    total_held_amount = sum(float(held.held_amount) for held in active_held_amounts)
+
+    # Подсчитываем количество студентов с холдированием
+    student_ids_with_held = set(held.student_id for held in active_held_amounts)
+    students_count = len(student_ids_with_held)
+
+    # Группируем по типам получателей
+    manual_curators = {}  # {mentor_id: {'name': str, 'total': float, 'students': []}}
+    auto_curators = {}
+    director_manual_info = {'total': 0.0, 'students': []}
+    director_auto_info = {'total': 0.0, 'students': []}
+
+    # Логируем каждую найденную запись для отладки
+    if active_held_amounts:
+        held_logger.info("")
+        held_logger.info("📋 НАЙДЕННЫЕ ЗАПИСИ ХОЛДИРОВАНИЯ:")
+        for idx, held in enumerate(active_held_amounts, 1):
+            student_name = held.fio
+            student_date = held.start_date.strftime('%d.%m.%Y') if held.start_date else "нет даты"
+            held_logger.info(
+                f"  {idx}. Студент: {student_name} (ID {held.student_id}, дата начала: {student_date}) | "
+                f"Направление: {held.direction} | "
+                f"Ментор ID: {held.mentor_id} | "
+                f"Холдировано: {float(held.held_amount):.2f} руб. | "
+                f"Статус: {held.status}"
+            )
+        held_logger.info("")
+    
+    for held in active_held_amounts:
+        mentor_name = held.mentor_name or "не назначен"
+        is_director_manual = False
+        is_director_auto = False
+        
+        if held.mentor_id:
+            # Проверяем, является ли директором
+            if held.mentor_id == Config.DIRECTOR_MANUAL_ID and held.direction == "manual":
+                is_director_manual = True
+            elif held.mentor_id == Config.DIRECTOR_AUTO_ID and held.direction == "auto":
+                is_director_auto = True
+        
+        held_amount = float(held.held_amount)
+        
+        if held.direction == "manual":
+            if is_director_manual:
+                # Это директор ручного направления
+                director_manual_info['total'] += held_amount
+                director_manual_info['students'].append({
+                    'student': held.fio,
+                    'student_id': held.student_id,
+                    'amount': held_amount,
+                    'total_cost': float(held.total_cost or 0)
+                })
+                
+                held_logger.info(
+                    f"💼 РУЧНОЕ (ДИРЕКТОР): Студент {held.fio} (ID {held.student_id}) | "
+                    f"Директор: {mentor_name} (ID {held.mentor_id}) | "
+                    f"30% от total_cost {float(held.total_cost or 0):.2f} руб. | "
+                    f"Холдировано: {held_amount:.2f} руб."
+                )
+            else:
+                # Это обычный куратор ручного направления
+                if held.mentor_id not in manual_curators:
+                    manual_curators[held.mentor_id] = {
+                        'name': mentor_name,
+                        'total': 0.0,
+                        'students': []
+                    }
+                manual_curators[held.mentor_id]['total'] += held_amount
+                manual_curators[held.mentor_id]['students'].append({
+                    'student': held.fio,
+                    'student_id': held.student_id,
+                    'amount': held_amount,
+                    'modules': f"{held.modules_completed}/{held.total_modules}",
+                    'paid': float(held.paid_amount)
+                })
+                
+                held_logger.info(
+                    f"📋 РУЧНОЕ (КУРАТОР): Студент {held.fio} (ID {held.student_id}) | "
+                    f"Куратор: {mentor_name} (ID {held.mentor_id or 'не назначен'}) | "
+                    f"Модулей: {held.modules_completed}/{held.total_modules} | "
+                    f"Выплачено: {float(held.paid_amount):.2f} руб. | "
+                    f"Холдировано: {held_amount:.2f} руб."
+                )
+        
+        elif held.direction == "auto":
+            if is_director_auto:
+                # Это директор авто направления
+                director_auto_info['total'] += held_amount
+                director_auto_info['students'].append({
+                    'student': held.fio,
+                    'student_id': held.student_id,
+                    'amount': held_amount,
+                    'total_cost': float(held.total_cost or 0)
+                })
+                
+                held_logger.info(
+                    f"💼 АВТО (ДИРЕКТОР): Студент {held.fio} (ID {held.student_id}) | "
+                    f"Директор: {mentor_name} (ID {held.mentor_id}) | "
+                    f"30% от total_cost {float(held.total_cost or 0):.2f} руб. | "
+                    f"Холдировано: {held_amount:.2f} руб."
+                )
+            else:
+                # Это обычный куратор авто направления
+                if held.mentor_id not in auto_curators:
+                    auto_curators[held.mentor_id] = {
+                        'name': mentor_name,
+                        'total': 0.0,
+                        'students': []
+                    }
+                auto_curators[held.mentor_id]['total'] += held_amount
+                auto_curators[held.mentor_id]['students'].append({
+                    'student': held.fio,
+                    'student_id': held.student_id,
+                    'amount': held_amount,
+                    'modules': f"{held.modules_completed}/{held.total_modules}",
+                    'paid': float(held.paid_amount)
+                })
+                
+                held_logger.info(
+                    f"📋 АВТО (КУРАТОР): Студент {held.fio} (ID {held.student_id}) | "
+                    f"Куратор: {mentor_name} (ID {held.mentor_id or 'не назначен'}) | "
+                    f"Модулей: {held.modules_completed}/{held.total_modules} | "
+                    f"Выплачено: {float(held.paid_amount):.2f} руб. | "
+                    f"Холдировано: {held_amount:.2f} руб."
+                )
+    
+    # Подсчитываем по направлениям и типам
+    manual_held = sum(info['total'] for info in manual_curators.values())
+    auto_held = sum(info['total'] for info in auto_curators.values())
+    director_manual_held = director_manual_info['total']
+    director_auto_held = director_auto_info['total']
+    
+    # Проверка суммы
+    calculated_total = manual_held + auto_held + director_manual_held + director_auto_held
+    
+    # Логируем итоги по кураторам
+    held_logger.info("")
+    held_logger.info("📊 ИТОГИ ПО КУРАТОРАМ РУЧНОГО НАПРАВЛЕНИЯ:")
+    for mentor_id, info in sorted(manual_curators.items(), key=lambda x: x[1]['total'], reverse=True):
+        held_logger.info(
+            f"  👤 {info['name']} (ID {mentor_id or 'не назначен'}): "
+            f"{len(info['students'])} студентов, "
+            f"Итого холдировано: {info['total']:.2f} руб."
+        )
+        for stud_info in info['students']:
+            held_logger.info(
+                f"    └─ {stud_info['student']} (ID {stud_info['student_id']}): "
+                f"{stud_info['amount']:.2f} руб. (модулей {stud_info['modules']}, выплачено {stud_info['paid']:.2f})"
+            )
+    
+    held_logger.info("")
+    held_logger.info("📊 ИТОГИ ПО КУРАТОРАМ АВТО НАПРАВЛЕНИЯ:")
+    for mentor_id, info in sorted(auto_curators.items(), key=lambda x: x[1]['total'], reverse=True):
+        held_logger.info(
+            f"  👤 {info['name']} (ID {mentor_id or 'не назначен'}): "
+            f"{len(info['students'])} студентов, "
+            f"Итого холдировано: {info['total']:.2f} руб."
+        )
+        for stud_info in info['students']:
+            held_logger.info(
+                f"    └─ {stud_info['student']} (ID {stud_info['student_id']}): "
+                f"{stud_info['amount']:.2f} руб. (модулей {stud_info['modules']}, выплачено {stud_info['paid']:.2f})"
+            )
+    
+    # Логируем итоги по директорам
+    if director_manual_info['total'] > 0:
+        held_logger.info("")
+        held_logger.info(f"💼 ИТОГИ ПО ДИРЕКТОРАМ РУЧНОГО НАПРАВЛЕНИЯ:")
+        held_logger.info(f"  Итого холдировано: {director_manual_info['total']:.2f} руб. за {len(director_manual_info['students'])} студентов")
+        for stud_info in director_manual_info['students']:
+            held_logger.info(
+                f"    └─ {stud_info['student']} (ID {stud_info['student_id']}): "
+                f"{stud_info['amount']:.2f} руб. (30% от {stud_info['total_cost']:.2f} руб.)"
+            )
+    
+    if director_auto_info['total'] > 0:
+        held_logger.info("")
+        held_logger.info(f"💼 ИТОГИ ПО ДИРЕКТОРАМ АВТО НАПРАВЛЕНИЯ:")
+        held_logger.info(f"  Итого холдировано: {director_auto_info['total']:.2f} руб. за {len(director_auto_info['students'])} студентов")
+        for stud_info in director_auto_info['students']:
+            held_logger.info(
+                f"    └─ {stud_info['student']} (ID {stud_info['student_id']}): "
+                f"{stud_info['amount']:.2f} руб. (30% от {stud_info['total_cost']:.2f} руб.)"
+            )
+    
+    held_logger.info("")
+    held_logger.info(f"💰 ОБЩАЯ СУММА ХОЛДИРОВАНИЯ: {total_held_amount:.2f} руб.")
+    held_logger.info(f"👥 КОЛИЧЕСТВО СТУДЕНТОВ: {students_count}")
+    held_logger.info("=" * 80)
+    
+    response = (
+        f"💰 Холдирование (резерв)\n\n"
+        f"📅 Период: с 01.09.2025 по {current_date.strftime('%d.%m.%Y')}\n\n"
+        f"📊 Общая сумма холдирования: {int(total_held_amount):,} руб.\n"
+        f"👥 Количество студентов: {students_count}\n\n"
+        f"📋 По направлениям:\n"
+        f"  • Ручное направление (кураторы): {int(manual_held):,} руб.\n"
+        f"  • Авто направление (кураторы): {int(auto_held):,} руб.\n"
+    )
+    
+    # Добавляем директоров, если есть
+    if director_manual_held > 0 or director_auto_held > 0:
+        response += (
+            f"  • Ручное направление (директора): {int(director_manual_held):,} руб.\n"
+            f"  • Авто направление (директора): {int(director_auto_held):,} руб.\n"
+        )
+    
+    # Проверка на расхождение
+    if abs(calculated_total - total_held_amount) > 0.01:
+        response += f"\n⚠️ Внимание: обнаружено расхождение!\n"
+        response += f"   Сумма по направлениям: {int(calculated_total):,} руб.\n"
+        response += f"   Общая сумма: {int(total_held_amount):,} руб.\n"
+        response += f"   Разница: {int(abs(calculated_total - total_held_amount)):,} руб.\n"
+    
+    response += f"\n📝 Подробная информация записана в лог-файл held_amounts.log"
+
+    held_logger.info("✅ Запрос холдирования успешно обработан")
+    return response
+
 
 @restrict_to(['admin', 'mentor']) # Разрешаем доступ обеим ролям
 async def show_held_amounts(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -485,8 +754,6 @@ async def show_held_amounts(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         
         from config import Config
-        from data_base.models import HeldAmount, Mentor
-        from datetime import date as date_class
         
         logger.info(f"💰 HELD_AMOUNTS_ENABLED = {Config.HELD_AMOUNTS_ENABLED}")
         
@@ -520,425 +787,15 @@ async def show_held_amounts(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 )
                 return STATISTICS_MENU
         
-        held_logger.info("=" * 80)
-        held_logger.info("💰 НАЧАЛО ОБРАБОТКИ ЗАПРОСА ХОЛДИРОВАНИЯ")
-        logger.info("💰 Начинаем обработку запроса холдирования")
-        
-        # Дата начала действия системы холдирования
-        held_amounts_start_date = date_class(2025, 9, 1)
-        current_date = date_class.today()
-        
-        # 📝 ДЕТАЛЬНОЕ ЛОГИРОВАНИЕ
-        held_logger.info("=" * 80)
-        held_logger.info(f"💰 ЗАПРОС ХОЛДИРОВАНИЯ - {current_date.strftime('%d.%m.%Y %H:%M:%S')}")
-        held_logger.info(f"Период: с 01.09.2025 по {current_date.strftime('%d.%m.%Y')}")
-        held_logger.info("=" * 80)
-        
-        # 🔄 СОЗДАНИЕ/ОБНОВЛЕНИЕ ЗАПИСЕЙ ХОЛДИРОВАНИЯ
-        from data_base.operations import calculate_held_amount
-        from datetime import date
-        
-        held_logger.info("🔄 Начинаем создание/обновление записей холдирования...")
-        
-        # 🔄 ПРОВЕРЯЕМ И ОБНОВЛЯЕМ СТАТУСЫ ЗАПИСЕЙ В held_amounts
-        # Если у студента training_status = "Не учится" или "Отчислен", 
-        # помечаем все его записи как released
-        held_logger.info("🔄 Проверяем статусы студентов в held_amounts...")
-        all_held_records = session.query(HeldAmount).all()
-        students_to_deactivate = set()
-        
-        for held_record in all_held_records:
-            student = session.query(Student).filter(Student.id == held_record.student_id).first()
-            if student and student.training_status in ["Не учится", "Отчислен"]:
-                students_to_deactivate.add(student.id)
-                if held_record.status == "active":
-                    held_record.status = "released"
-                    held_logger.info(f"🔴 Помечено как released: студент ID {student.id} ({student.fio}), training_status={student.training_status}")
-        
-        if students_to_deactivate:
-            session.commit()
-            held_logger.info(f"✅ Обновлено записей для {len(students_to_deactivate)} студентов со статусом 'Не учится' или 'Отчислен'")
-        
-        # Получаем активных студентов фуллстек, которые начали обучение с 1 сентября 2025
-        # Исключаем студентов с training_status = "Не учится" или "Отчислен"
-        from sqlalchemy import and_, not_
-        
-        fullstack_students = session.query(Student).filter(
-            Student.training_type == "Фуллстек",
-            Student.start_date >= held_amounts_start_date,
-            Student.training_status != "Отчислен",
-            Student.training_status != "Не учится"
-        ).all()
-        
-        # Дополнительная фильтрация в Python для надежности
-        fullstack_students = [
-            s for s in fullstack_students 
-            if s.training_status not in ["Отчислен", "Не учится"]
-        ]
-        
-        held_logger.info(f"💰 Найдено активных студентов фуллстек для обработки: {len(fullstack_students)}")
-        
-        total_created_updated = 0.0
-        
-        for student in fullstack_students:
-            try:
-                # 🔍 РУЧНОЕ НАПРАВЛЕНИЕ: проверяем, кто назначен куратором
-                if student.mentor_id == Config.DIRECTOR_MANUAL_ID:
-                    manual_result = calculate_held_amount(student.id, "manual", Config.DIRECTOR_MANUAL_ID, is_director=True)
-                    is_director_manual = True
-                elif student.mentor_id:
-                    manual_result = calculate_held_amount(student.id, "manual", student.mentor_id, is_director=False)
-                    is_director_manual = False
-                else:
-                    manual_result = calculate_held_amount(student.id, "manual", None, is_director=False)
-                    is_director_manual = False
-                
-                if manual_result:
-                    held_amount = manual_result['held_amount']
-                    potential_amount = manual_result['potential_amount']
-                    paid_amount = manual_result['paid_amount']
-                    modules_completed = manual_result['modules_completed']
-                    total_modules = manual_result['total_modules']
-                    mentor_id_for_db = student.mentor_id if student.mentor_id else Config.DIRECTOR_MANUAL_ID if is_director_manual else None
-                    
-                    held_record = session.query(HeldAmount).filter(
-                        HeldAmount.student_id == student.id,
-                        HeldAmount.direction == "manual"
-                    ).first()
-                    
-                    if held_record:
-                        held_record.mentor_id = mentor_id_for_db
-                        held_record.held_amount = held_amount
-                        held_record.potential_amount = potential_amount
-                        held_record.paid_amount = paid_amount
-                        held_record.modules_completed = modules_completed
-                        held_record.total_modules = total_modules
-                        held_record.updated_at = date.today()
-                        if held_record.status == "released":
-                            held_record.status = "active"
-                        total_created_updated += held_amount
-                    else:
-                        held_record = HeldAmount(
-                            student_id=student.id,
-                            mentor_id=mentor_id_for_db,
-                            direction="manual",
-                            held_amount=held_amount,
-                            potential_amount=potential_amount,
-                            paid_amount=paid_amount,
-                            modules_completed=modules_completed,
-                            total_modules=total_modules,
-                            status="active",
-                            created_at=date.today(),
-                            updated_at=date.today()
-                        )
-                        session.add(held_record)
-                        total_created_updated += held_amount
-                
-                # 🔍 АВТО НАПРАВЛЕНИЕ: проверяем, кто назначен куратором
-                if student.auto_mentor_id == Config.DIRECTOR_AUTO_ID:
-                    auto_result = calculate_held_amount(student.id, "auto", Config.DIRECTOR_AUTO_ID, is_director=True)
-                    is_director_auto = True
-                elif student.auto_mentor_id:
-                    auto_result = calculate_held_amount(student.id, "auto", student.auto_mentor_id, is_director=False)
-                    is_director_auto = False
-                else:
-                    auto_result = calculate_held_amount(student.id, "auto", None, is_director=False)
-                    is_director_auto = False
-                
-                if auto_result:
-                    held_amount = auto_result['held_amount']
-                    potential_amount = auto_result['potential_amount']
-                    paid_amount = auto_result['paid_amount']
-                    modules_completed = auto_result['modules_completed']
-                    total_modules = auto_result['total_modules']
-                    mentor_id_for_db = student.auto_mentor_id if student.auto_mentor_id else Config.DIRECTOR_AUTO_ID if is_director_auto else None
-                    
-                    held_record = session.query(HeldAmount).filter(
-                        HeldAmount.student_id == student.id,
-                        HeldAmount.direction == "auto"
-                    ).first()
-                    
-                    if held_record:
-                        held_record.mentor_id = mentor_id_for_db
-                        held_record.held_amount = held_amount
-                        held_record.potential_amount = potential_amount
-                        held_record.paid_amount = paid_amount
-                        held_record.modules_completed = modules_completed
-                        held_record.total_modules = total_modules
-                        held_record.updated_at = date.today()
-                        if held_record.status == "released":
-                            held_record.status = "active"
-                        total_created_updated += held_amount
-                    else:
-                        held_record = HeldAmount(
-                            student_id=student.id,
-                            mentor_id=mentor_id_for_db,
-                            direction="auto",
-                            held_amount=held_amount,
-                            potential_amount=potential_amount,
-                            paid_amount=paid_amount,
-                            modules_completed=modules_completed,
-                            total_modules=total_modules,
-                            status="active",
-                            created_at=date.today(),
-                            updated_at=date.today()
-                        )
-                        session.add(held_record)
-                        total_created_updated += held_amount
-                
-                session.commit()
-                
-            except Exception as e:
-                held_logger.error(f"❌ Ошибка при обработке студента {student.fio} (ID {student.id}): {e}")
-                session.rollback()
-    
-        held_logger.info(f"✅ Создано/обновлено записей холдирования. Итого: {round(total_created_updated, 2)} руб.")
-    
-        # Получаем все активные холдирования для студентов, начавших обучение с 1 сентября 2025
-        active_held_amounts = session.query(HeldAmount).join(
-            Student, HeldAmount.student_id == Student.id
-        ).filter(
-            HeldAmount.status == "active",
-            Student.start_date >= held_amounts_start_date
-        ).all()
-    
-        # Логируем количество найденных записей
-        held_logger.info(f"🔍 Найдено активных холдирований после обновления: {len(active_held_amounts)}")
-    
-        total_held_amount = sum(float(held.held_amount) for held in active_held_amounts)
-    
-        # Подсчитываем количество студентов с холдированием
-        student_ids_with_held = set(held.student_id for held in active_held_amounts)
-        students_count = len(student_ids_with_held)
-    
-        # Группируем по типам получателей
-        manual_curators = {}  # {mentor_id: {'name': str, 'total': float, 'students': []}}
-        auto_curators = {}
-        director_manual_info = {'total': 0.0, 'students': []}
-        director_auto_info = {'total': 0.0, 'students': []}
-    
-        # Логируем каждую найденную запись для отладки
-        if active_held_amounts:
-            held_logger.info("")
-            held_logger.info("📋 НАЙДЕННЫЕ ЗАПИСИ ХОЛДИРОВАНИЯ:")
-            for idx, held in enumerate(active_held_amounts, 1):
-                student = session.query(Student).filter(Student.id == held.student_id).first()
-                student_name = student.fio if student else f"ID {held.student_id} (не найден)"
-                student_date = student.start_date.strftime('%d.%m.%Y') if student and student.start_date else "нет даты"
-                held_logger.info(
-                    f"  {idx}. Студент: {student_name} (ID {held.student_id}, дата начала: {student_date}) | "
-                    f"Направление: {held.direction} | "
-                    f"Ментор ID: {held.mentor_id} | "
-                    f"Холдировано: {float(held.held_amount):.2f} руб. | "
-                    f"Статус: {held.status}"
-                )
-            held_logger.info("")
-        
-        for held in active_held_amounts:
-            student = session.query(Student).filter(Student.id == held.student_id).first()
-            if not student:
-                continue
-            
-            mentor_name = "не назначен"
-            is_director_manual = False
-            is_director_auto = False
-            
-            if held.mentor_id:
-                mentor = session.query(Mentor).filter(Mentor.id == held.mentor_id).first()
-                if mentor:
-                    mentor_name = mentor.full_name
-                
-                # Проверяем, является ли директором
-                if held.mentor_id == Config.DIRECTOR_MANUAL_ID and held.direction == "manual":
-                    is_director_manual = True
-                elif held.mentor_id == Config.DIRECTOR_AUTO_ID and held.direction == "auto":
-                    is_director_auto = True
-            
-            held_amount = float(held.held_amount)
-            
-            if held.direction == "manual":
-                if is_director_manual:
-                    # Это директор ручного направления
-                    director_manual_info['total'] += held_amount
-                    director_manual_info['students'].append({
-                        'student': student.fio,
-                        'student_id': student.id,
-                        'amount': held_amount,
-                        'total_cost': float(student.total_cost)
-                    })
-                    
-                    held_logger.info(
-                        f"💼 РУЧНОЕ (ДИРЕКТОР): Студент {student.fio} (ID {student.id}) | "
-                        f"Директор: {mentor_name} (ID {held.mentor_id}) | "
-                        f"30% от total_cost {float(student.total_cost):.2f} руб. | "
-                        f"Холдировано: {held_amount:.2f} руб."
-                    )
-                else:
-                    # Это обычный куратор ручного направления
-                    if held.mentor_id not in manual_curators:
-                        manual_curators[held.mentor_id] = {
-                            'name': mentor_name,
-                            'total': 0.0,
-                            'students': []
-                        }
-                    manual_curators[held.mentor_id]['total'] += held_amount
-                    manual_curators[held.mentor_id]['students'].append({
-                        'student': student.fio,
-                        'student_id': student.id,
-                        'amount': held_amount,
-                        'modules': f"{held.modules_completed}/{held.total_modules}",
-                        'paid': float(held.paid_amount)
-                    })
-                    
-                    held_logger.info(
-                        f"📋 РУЧНОЕ (КУРАТОР): Студент {student.fio} (ID {student.id}) | "
-                        f"Куратор: {mentor_name} (ID {held.mentor_id or 'не назначен'}) | "
-                        f"Модулей: {held.modules_completed}/{held.total_modules} | "
-                        f"Выплачено: {float(held.paid_amount):.2f} руб. | "
-                        f"Холдировано: {held_amount:.2f} руб."
-                    )
-            
-            elif held.direction == "auto":
-                if is_director_auto:
-                    # Это директор авто направления
-                    director_auto_info['total'] += held_amount
-                    director_auto_info['students'].append({
-                        'student': student.fio,
-                        'student_id': student.id,
-                        'amount': held_amount,
-                        'total_cost': float(student.total_cost)
-                    })
-                    
-                    held_logger.info(
-                        f"💼 АВТО (ДИРЕКТОР): Студент {student.fio} (ID {student.id}) | "
-                        f"Директор: {mentor_name} (ID {held.mentor_id}) | "
-                        f"30% от total_cost {float(student.total_cost):.2f} руб. | "
-                        f"Холдировано: {held_amount:.2f} руб."
-                    )
-                else:
-                    # Это обычный куратор авто направления
-                    if held.mentor_id not in auto_curators:
-                        auto_curators[held.mentor_id] = {
-                            'name': mentor_name,
-                            'total': 0.0,
-                            'students': []
-                        }
-                    auto_curators[held.mentor_id]['total'] += held_amount
-                    auto_curators[held.mentor_id]['students'].append({
-                        'student': student.fio,
-                        'student_id': student.id,
-                        'amount': held_amount,
-                        'modules': f"{held.modules_completed}/{held.total_modules}",
-                        'paid': float(held.paid_amount)
-                    })
-                    
-                    held_logger.info(
-                        f"📋 АВТО (КУРАТОР): Студент {student.fio} (ID {student.id}) | "
-                        f"Куратор: {mentor_name} (ID {held.mentor_id or 'не назначен'}) | "
-                        f"Модулей: {held.modules_completed}/{held.total_modules} | "
-                        f"Выплачено: {float(held.paid_amount):.2f} руб. | "
-                        f"Холдировано: {held_amount:.2f} руб."
-                    )
-        
-        # Подсчитываем по направлениям и типам
-        manual_held = sum(info['total'] for info in manual_curators.values())
-        auto_held = sum(info['total'] for info in auto_curators.values())
-        director_manual_held = director_manual_info['total']
-        director_auto_held = director_auto_info['total']
-        
-        # Проверка суммы
-        calculated_total = manual_held + auto_held + director_manual_held + director_auto_held
-        
-        # Логируем итоги по кураторам
-        held_logger.info("")
-        held_logger.info("📊 ИТОГИ ПО КУРАТОРАМ РУЧНОГО НАПРАВЛЕНИЯ:")
-        for mentor_id, info in sorted(manual_curators.items(), key=lambda x: x[1]['total'], reverse=True):
-            held_logger.info(
-                f"  👤 {info['name']} (ID {mentor_id or 'не назначен'}): "
-                f"{len(info['students'])} студентов, "
-                f"Итого холдировано: {info['total']:.2f} руб."
-            )
-            for stud_info in info['students']:
-                held_logger.info(
-                    f"    └─ {stud_info['student']} (ID {stud_info['student_id']}): "
-                    f"{stud_info['amount']:.2f} руб. (модулей {stud_info['modules']}, выплачено {stud_info['paid']:.2f})"
-                )
-        
-        held_logger.info("")
-        held_logger.info("📊 ИТОГИ ПО КУРАТОРАМ АВТО НАПРАВЛЕНИЯ:")
-        for mentor_id, info in sorted(auto_curators.items(), key=lambda x: x[1]['total'], reverse=True):
-            held_logger.info(
-                f"  👤 {info['name']} (ID {mentor_id or 'не назначен'}): "
-                f"{len(info['students'])} студентов, "
-                f"Итого холдировано: {info['total']:.2f} руб."
-            )
-            for stud_info in info['students']:
-                held_logger.info(
-                    f"    └─ {stud_info['student']} (ID {stud_info['student_id']}): "
-                    f"{stud_info['amount']:.2f} руб. (модулей {stud_info['modules']}, выплачено {stud_info['paid']:.2f})"
-                )
-        
-        # Логируем итоги по директорам
-        if director_manual_info['total'] > 0:
-            held_logger.info("")
-            held_logger.info(f"💼 ИТОГИ ПО ДИРЕКТОРАМ РУЧНОГО НАПРАВЛЕНИЯ:")
-            held_logger.info(f"  Итого холдировано: {director_manual_info['total']:.2f} руб. за {len(director_manual_info['students'])} студентов")
-            for stud_info in director_manual_info['students']:
-                held_logger.info(
-                    f"    └─ {stud_info['student']} (ID {stud_info['student_id']}): "
-                    f"{stud_info['amount']:.2f} руб. (30% от {stud_info['total_cost']:.2f} руб.)"
-                )
-        
-        if director_auto_info['total'] > 0:
-            held_logger.info("")
-            held_logger.info(f"💼 ИТОГИ ПО ДИРЕКТОРАМ АВТО НАПРАВЛЕНИЯ:")
-            held_logger.info(f"  Итого холдировано: {director_auto_info['total']:.2f} руб. за {len(director_auto_info['students'])} студентов")
-            for stud_info in director_auto_info['students']:
-                held_logger.info(
-                    f"    └─ {stud_info['student']} (ID {stud_info['student_id']}): "
-                    f"{stud_info['amount']:.2f} руб. (30% от {stud_info['total_cost']:.2f} руб.)"
-                )
-        
-        held_logger.info("")
-        held_logger.info(f"💰 ОБЩАЯ СУММА ХОЛДИРОВАНИЯ: {total_held_amount:.2f} руб.")
-        held_logger.info(f"👥 КОЛИЧЕСТВО СТУДЕНТОВ: {students_count}")
-        held_logger.info("=" * 80)
-        
-        response = (
-            f"💰 Холдирование (резерв)\n\n"
-            f"📅 Период: с 01.09.2025 по {current_date.strftime('%d.%m.%Y')}\n\n"
-            f"📊 Общая сумма холдирования: {int(total_held_amount):,} руб.\n"
-            f"👥 Количество студентов: {students_count}\n\n"
-            f"📋 По направлениям:\n"
-            f"  • Ручное направление (кураторы): {int(manual_held):,} руб.\n"
-            f"  • Авто направление (кураторы): {int(auto_held):,} руб.\n"
-        )
-        
-        # Добавляем директоров, если есть
-        if director_manual_held > 0 or director_auto_held > 0:
-            response += (
-                f"  • Ручное направление (директора): {int(director_manual_held):,} руб.\n"
-                f"  • Авто направление (директора): {int(director_auto_held):,} руб.\n"
-            )
-        
-        # Проверка на расхождение
-        if abs(calculated_total - total_held_amount) > 0.01:
-            response += f"\n⚠️ Внимание: обнаружено расхождение!\n"
-            response += f"   Сумма по направлениям: {int(calculated_total):,} руб.\n"
-            response += f"   Общая сумма: {int(total_held_amount):,} руб.\n"
-            response += f"   Разница: {int(abs(calculated_total - total_held_amount)):,} руб.\n"
-        
-        response += f"\n📝 Подробная информация записана в лог-файл held_amounts.log"
-        
-        await update.message.reply_text(
-            response,
+        await submit_report(
+            update, context, build_held_amounts_report,
+            title="Отчет по холдированию",
             reply_markup=ReplyKeyboardMarkup(
                 [["🔙 Вернуться в меню"]],
                 one_time_keyboard=True
             )
         )
-        held_logger.info("✅ Запрос холдирования успешно обработан")
-        logger.info("✅ Запрос холдирования успешно обработан")
+        logger.info("✅ Запрос холдирования поставлен в очередь")
         return STATISTICS_MENU
     
     except Exception as e:
@@ -12,7 +12,7 @@ from sqlalchemy import func
 from commands.states import UE_MENU, UE_START_PERIOD, UE_END_PERIOD, STATISTICS_MENU
 from commands.student_statistic_commands import show_statistics_menu
 from data_base.db import session
-from data_base.models import StudentMeta, Payment, MarketingSpend, FixedExpense, Student
+from data_base.models import StudentMeta, Payment, PaymentKind, MarketingSpend, FixedExpense, Student
 
 from datetime import datetime
 from sqlalchemy import func
@@ -35,8 +35,7 @@ def calculate_ue_data(start_date, end_date):
     revenue_total = session.query(func.sum(Payment.amount)).filter(
         Payment.payment_date.between(start_date, end_date),
         Payment.status == "подтвержден",
-        ~Payment.comment.ilike("%Системное восстановление%"),
-        ~Payment.comment.ilike("%Доп расход%")
+        Payment.payment_kind != PaymentKind.EXPENSE
     ).scalar() or 0
 
     # 2. НОВЫЕ ОМ-ЩИКИ
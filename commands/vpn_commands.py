@@ -5,26 +5,36 @@
     1. Админ/ментор нажимает «Создать OVPN конфиг»
     2. Бот просит ввести @telegram студента
     3. Бот проверяет наличие студента в БД
-    4. Бот генерирует/перегенерирует .ovpn конфиг через SSH
-    5. Бот отправляет .ovpn файл обратно запросившему
+    4. Бот ставит выпуск .ovpn конфига в очередь и сообщает позицию
+    5. Когда конфиг готов, бот отправляет .ovpn файл запросившему
+
+Пакетный выпуск: «Выпустить для потока» → месяц старта потока (ММ.ГГГГ)
+или список @telegram → конфиги всех студентов ставятся в ту же очередь.
 """
 
 import logging
 import os
+import re
 import traceback
+from datetime import datetime
 
 from telegram import Update, ReplyKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 
-from classes.vpn_config import VPNConfigManager, VPNConfigError
+from classes.vpn_config import VPNConfigManager
+from classes.vpn_issue_queue import VPNIssueBatch, VPNIssueQueue, VPNQueueFullError
 from commands.start_commands import exit_to_main_menu
-from commands.states import VPN_AWAITING_TELEGRAM
+from commands.states import VPN_AWAITING_TELEGRAM, VPN_AWAITING_COHORT
 from data_base.db import session
 from data_base.models import Student
 from utils.security import restrict_to
 
 logger = logging.getLogger(__name__)
 
+COHORT_BUTTON: str = "Выпустить для потока"
+# Статусы студентов, которые еще учатся и получают конфиг при выпуске для потока
+COHORT_STATUSES: tuple = ("Учится", "Получил 5 модуль")
+
 
 def _get_vpn_manager() -> VPNConfigManager:
     """
@@ -35,6 +45,8 @@ def _get_vpn_manager() -> VPNConfigManager:
         - ``VPN_SSH_PORT`` — SSH-порт (по умолчанию 22)
         - ``VPN_SSH_USERNAME`` — SSH-пользователь (по умолчанию ``adminbot``)
         - ``VPN_SSH_KEY_PATH`` — путь к приватному SSH-ключу
+        - ``VPN_SSH_POOL_SIZE`` — максимум SSH-соединений в пуле (по умолчанию 2)
+        - ``VPN_SSH_KEEPALIVE`` — интервал keepalive в секундах (по умолчанию 30)
 
     Returns:
         Сконфигурированный экземпляр ``VPNConfigManager``.
@@ -46,6 +58,8 @@ def _get_vpn_manager() -> VPNConfigManager:
     port: int = int(os.getenv("VPN_SSH_PORT", "22"))
     username: str = os.getenv("VPN_SSH_USERNAME", "adminbot")
     key_path: str = os.getenv("VPN_SSH_KEY_PATH", "")
+    pool_size: int = int(os.getenv("VPN_SSH_POOL_SIZE", "2"))
+    keepalive: int = int(os.getenv("VPN_SSH_KEEPALIVE", "30"))
 
     if not host:
         raise ValueError("Переменная окружения VPN_SSH_HOST не задана")
@@ -57,9 +71,28 @@ def _get_vpn_manager() -> VPNConfigManager:
         username=username,
         key_path=key_path,
         port=port,
+        pool_size=pool_size,
+        keepalive=keepalive,
     )
 
 
+# Общая очередь выпуска: воркеров столько же, сколько SSH-соединений в пуле
+vpn_issue_queue = VPNIssueQueue(
+    _get_vpn_manager,
+    workers=int(os.getenv("VPN_SSH_POOL_SIZE", "2")),
+)
+
+
+async def shutdown_vpn_queue(application) -> None:
+    """post_shutdown-хук Application: останавливает очередь выпуска VPN-конфигов."""
+    await vpn_issue_queue.shutdown()
+
+
+def _student_label(student: Student) -> str:
+    telegram: str = student.telegram if student.telegram.startswith("@") else f"@{student.telegram}"
+    return f"{student.fio} ({telegram})"
+
+
 @restrict_to(["admin", "mentor"])
 async def start_vpn_config(update: Update, context: ContextTypes.DEFAULT_TYPE) -> str:
     """
@@ -73,9 +106,10 @@ async def start_vpn_config(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         Состояние ``VPN_AWAITING_TELEGRAM``.
     """
     await update.message.reply_text(
-        "Введите Telegram ученика (например: @student):",
+        "Введите Telegram ученика (например: @student)\n"
+        f"или нажмите «{COHORT_BUTTON}» для выпуска конфигов группе студентов:",
         reply_markup=ReplyKeyboardMarkup(
-            [["Главное меню"]],
+            [[COHORT_BUTTON], ["Главное меню"]],
             one_time_keyboard=True,
             resize_keyboard=True,
         ),
@@ -91,11 +125,10 @@ async def handle_vpn_telegram(update: Update, context: ContextTypes.DEFAULT_TYPE
         1. Нормализация @хэндла
         2. Поиск студента в БД
         3. Проверка наличия chat_id (Telegram user_id)
-        4. Генерация VPN-конфига через SSH
-        5. Отправка .ovpn файла запросившему
+        4. Постановка выпуска в очередь ``vpn_issue_queue`` и ответ с позицией
+        5. Файл отправляется запросившему, когда очередь дойдёт до выпуска
 
-    При любой ошибке отправляет детали исключения пользователю
-    и возвращает в главное меню.
+    Хендлер не ждёт SSH: ошибки выпуска приходят отдельным сообщением.
 
     Args:
         update: Входящее обновление Telegram.
@@ -110,6 +143,19 @@ async def handle_vpn_telegram(update: Update, context: ContextTypes.DEFAULT_TYPE
     if text == "Главное меню":
         return await exit_to_main_menu(update, context)
 
+    if text == COHORT_BUTTON:
+        await update.message.reply_text(
+            "Введите месяц старта потока в формате ММ.ГГГГ (например: 09.2026) —\n"
+            "конфиги будут выпущены всем обучающимся студентам потока («Учится», «Получил 5 модуль»).\n\n"
+            "Или отправьте список Telegram через пробел, запятую или с новой строки.",
+            reply_markup=ReplyKeyboardMarkup(
+                [["Главное меню"]],
+                one_time_keyboard=True,
+                resize_keyboard=True,
+            ),
+        )
+        return VPN_AWAITING_COHORT
+
     try:
         # 1. Нормализация хэндла
         tg_clean: str = text.replace("@", "").strip()
@@ -148,37 +194,30 @@ async def handle_vpn_telegram(update: Update, context: ContextTypes.DEFAULT_TYPE
 
         user_id: int = int(student.chat_id)
 
-        # 4. Уведомление о начале генерации
-        await update.message.reply_text(
-            f"⏳ Генерация VPN конфига для {student.fio} ({tg_with_at})...\n"
-            "Это может занять несколько секунд."
-        )
-
-        # 5. Генерация конфига
-        manager: VPNConfigManager = _get_vpn_manager()
-        local_path: str = manager.issue_config(user_id)
-
-        # 6. Отправка файла
-        with open(local_path, "rb") as ovpn_file:
-            await update.message.reply_document(
-                document=ovpn_file,
-                filename=os.path.basename(local_path),
-                caption=f"✅ VPN конфиг для {student.fio} ({tg_with_at})",
+        # 4. Постановка в очередь
+        try:
+            position, duplicate = vpn_issue_queue.submit(
+                context.bot, update.effective_chat.id, user_id, _student_label(student)
+            )
+        except VPNQueueFullError:
+            await update.message.reply_text(
+                "⏳ Сейчас выпускается слишком много конфигов. Попробуйте через пару минут."
             )
+            return await exit_to_main_menu(update, context)
 
-        return await exit_to_main_menu(update, context)
+        if duplicate:
+            status: str = "уже выпускается" if position == 0 else f"уже в очереди, позиция {position}"
+            await update.message.reply_text(
+                f"⏳ Конфиг для {student.fio} ({tg_with_at}) {status}.\n"
+                "Файл придёт отдельным сообщением."
+            )
+        else:
+            await update.message.reply_text(
+                f"⏳ Генерация VPN конфига для {student.fio} ({tg_with_at}) поставлена в очередь "
+                f"(позиция {position}).\n"
+                "Файл придёт отдельным сообщением."
+            )
 
-    except VPNConfigError as e:
-        logger.error("VPN config error: %s", e, exc_info=True)
-        await update.message.reply_text(
-            f"❌ Ошибка генерации VPN конфига:\n{e}\n\n"
-            "Обратитесь к администратору сервера.",
-            reply_markup=ReplyKeyboardMarkup(
-                [["Главное меню"]],
-                one_time_keyboard=True,
-                resize_keyboard=True,
-            ),
-        )
         return await exit_to_main_menu(update, context)
 
     except Exception as e:
@@ -196,3 +235,85 @@ async def handle_vpn_telegram(update: Update, context: ContextTypes.DEFAULT_TYPE
             ),
         )
         return await exit_to_main_menu(update, context)
+
+
+async def handle_vpn_cohort(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Пакетный выпуск VPN-конфигов для потока или списка студентов.
+
+    Принимает месяц старта потока (``ММ.ГГГГ``) или список @telegram,
+    ставит выпуск каждого студента в ``vpn_issue_queue`` и сразу отвечает.
+    Файлы приходят по мере готовности, в конце — итог со списком ошибок.
+
+    Args:
+        update: Входящее обновление Telegram.
+        context: Контекст обработчика.
+
+    Returns:
+        ``VPN_AWAITING_COHORT`` при ошибке ввода, иначе выход в главное меню.
+    """
+    text: str = update.message.text.strip()
+
+    if text == "Главное меню":
+        return await exit_to_main_menu(update, context)
+
+    not_found: list = []
+    try:
+        cohort_month = datetime.strptime(text, "%m.%Y").date()
+    except ValueError:
+        cohort_month = None
+
+    if cohort_month is not None:
+        next_month = cohort_month.replace(year=cohort_month.year + cohort_month.month // 12,
+                                          month=cohort_month.month % 12 + 1)
+        students = session.query(Student).filter(
+            Student.start_date >= cohort_month,
+            Student.start_date < next_month,
+            Student.training_status.in_(COHORT_STATUSES),
+        ).order_by(Student.fio).all()
+        title: str = f"VPN-конфиги потока {text}"
+    else:
+        handles = {handle.lstrip("@") for handle in re.split(r"[\s,;]+", text) if handle.lstrip("@")}
+        variants = list(handles | {f"@{handle}" for handle in handles})
+        students = session.query(Student).filter(Student.telegram.in_(variants)).order_by(Student.fio).all()
+        found = {student.telegram.lstrip("@") for student in students}
+        not_found = sorted(f"@{handle}" for handle in handles - found)
+        title = f"VPN-конфиги ({len(handles)} студентов)"
+
+    if not students:
+        await update.message.reply_text(
+            "❌ Студенты не найдены. Введите месяц потока (ММ.ГГГГ) или список Telegram\n"
+            "или нажмите «Главное меню».",
+        )
+        return VPN_AWAITING_COHORT
+
+    without_chat_id = [_student_label(student) for student in students if not student.chat_id]
+    batch = VPNIssueBatch(update.effective_chat.id, title)
+    queued: int = 0
+    duplicates: int = 0
+    try:
+        # Все submit подряд, без await — см. VPNIssueQueue.submit
+        for student in students:
+            if not student.chat_id:
+                continue
+            _, duplicate = vpn_issue_queue.submit(
+                context.bot, update.effective_chat.id, int(student.chat_id), _student_label(student), batch
+            )
+            queued += 1
+            duplicates += int(duplicate)
+    except VPNQueueFullError:
+        logger.warning("VPN: очередь заполнена, поставлено %d из %d", queued, len(students))
+
+    lines: list = [f"⏳ {title}: в очереди {queued} из {len(students)}."]
+    if duplicates:
+        lines.append(f"Из них уже выпускались по другим запросам: {duplicates}.")
+    if queued < len(students) - len(without_chat_id):
+        lines.append("⚠️ Очередь заполнена, остальных запустите позже.")
+    if without_chat_id:
+        lines.append(f"\n❌ Без chat_id (не писали боту /start): {', '.join(without_chat_id)}")
+    if not_found:
+        lines.append(f"\n❌ Не найдены в базе: {', '.join(not_found)}")
+    lines.append("\nФайлы придут отдельными сообщениями, в конце — итог.")
+    await update.message.reply_text("\n".join(lines))
+
+    return await exit_to_main_menu(update, context)
@@ -0,0 +1,48 @@
+import os
+from contextlib import asynccontextmanager
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from data_base.db import DATABASE_URL, DB_POOL_RECYCLE, DB_POOL_TIMEOUT, DB_POOL_PRE_PING
+
+# Асинхронный драйвер asyncpg: тот же DSN, что и у синхронного движка, если не задан отдельно
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL",
+    DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+)
+
+# Отдельный, меньший пул: соединения асинхронного движка добавляются к пулу синхронного
+# (DB_POOL_SIZE + DB_MAX_OVERFLOW), а через него идут только короткие запросы горячих хендлеров
+ASYNC_DB_POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", "5"))
+ASYNC_DB_MAX_OVERFLOW = int(os.getenv("ASYNC_DB_MAX_OVERFLOW", "5"))
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    echo=False,
+    pool_size=ASYNC_DB_POOL_SIZE,
+    max_overflow=ASYNC_DB_MAX_OVERFLOW,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_pre_ping=DB_POOL_PRE_PING,
+)
+
+# expire_on_commit=False: объекты остаются читаемыми после выхода из сессии
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+
+@asynccontextmanager
+async def get_async_session():
+    """
+    Асинхронная сессия на один блок работы.
+    Коммит при успешном выходе, откат при ошибке, соединение возвращается в пул.
+    """
+    async with AsyncSessionLocal() as db_session:
+        try:
+            yield db_session
+            await db_session.commit()
+        except Exception:
+            await db_session.rollback()
+            raise
+
+
+__all__ = ['async_engine', 'AsyncSessionLocal', 'get_async_session']
@@ -0,0 +1,44 @@
+# Асинхронные варианты горячих функций из data_base/operations.py.
+# Возвращаемые ORM-объекты отвязаны от сессии: ленивые связи (student.meta и т.п.)
+# у них не загружаются, нужные поля выбираются в самом запросе.
+from sqlalchemy import select
+
+from data_base.async_db import get_async_session
+from data_base.models import Student, Mentor
+from data_base.operations import student_search_select
+
+
+async def get_student_by_fio_or_telegram(value):
+    """
+    Ищет студента по ФИО или Telegram.
+    """
+    try:
+        async with get_async_session() as db_session:
+            result = await db_session.execute(
+                select(Student).where((Student.fio == value) | (Student.telegram == value)).limit(1)
+            )
+            return result.scalars().first()
+    except Exception as e:
+        return None
+
+
+async def search_students(query, limit=20):
+    """Поиск студентов по подстроке в ФИО или Telegram (тот же SELECT, что у operations.search_students)."""
+    query = (query or "").strip().lower()
+    if not query:
+        return []
+    async with get_async_session() as db_session:
+        result = await db_session.execute(student_search_select(query, limit))
+        return result.scalars().all()
+
+
+async def get_mentor_names(mentor_ids):
+    """ФИО менторов одним запросом: {mentor_id: full_name}."""
+    mentor_ids = [mentor_id for mentor_id in set(mentor_ids) if mentor_id]
+    if not mentor_ids:
+        return {}
+    async with get_async_session() as db_session:
+        result = await db_session.execute(
+            select(Mentor.id, Mentor.full_name).where(Mentor.id.in_(mentor_ids))
+        )
+        return dict(result.all())
@@ -0,0 +1,44 @@
+from sqlalchemy.dialects.postgresql import insert
+
+from data_base.models import TelegramFileCache
+
+# Виды кэшируемых документов
+CONTRACT = "contract"
+VPN_CONFIG = "vpn_config"
+
+
+def get_cached_file_id(db_session, kind, owner, content_hash):
+    """file_id ранее загруженного документа с таким же содержимым или None."""
+    return db_session.query(TelegramFileCache.file_id).filter(
+        TelegramFileCache.kind == kind,
+        TelegramFileCache.owner == str(owner),
+        TelegramFileCache.content_hash == content_hash
+    ).scalar()
+
+
+def remember_file_id(db_session, kind, owner, content_hash, file_id):
+    """
+    Запоминает file_id загруженного документа, записи со старым содержимым того же
+    владельца удаляются. Коммит — на стороне вызывающего.
+    """
+    owner = str(owner)
+    db_session.execute(TelegramFileCache.__table__.delete().where(
+        TelegramFileCache.kind == kind,
+        TelegramFileCache.owner == owner,
+        TelegramFileCache.content_hash != content_hash
+    ))
+    stmt = insert(TelegramFileCache).values(
+        kind=kind, owner=owner, content_hash=content_hash, file_id=file_id
+    )
+    db_session.execute(stmt.on_conflict_do_update(
+        index_elements=[TelegramFileCache.kind, TelegramFileCache.owner, TelegramFileCache.content_hash],
+        set_={"file_id": stmt.excluded.file_id}
+    ))
+
+
+def invalidate_file_ids(db_session, kind, owner):
+    """Удаляет кэш документов владельца (например, конфиг перевыпущен). Коммит — на стороне вызывающего."""
+    db_session.execute(TelegramFileCache.__table__.delete().where(
+        TelegramFileCache.kind == kind,
+        TelegramFileCache.owner == str(owner)
+    ))
@@ -0,0 +1,119 @@
+"""
+Поддержка записей холдирования (held_amounts) по событиям вместо пересчета при просмотре отчета.
+
+- создание студента, смена статуса обучения или куратора — sync_student_held_amounts(student_id);
+- принятие темы (fullstack_topic_assignments пишет бот менторов) — триггер БД
+  refresh_held_modules (migrations/2026_10_18_held_amounts_triggers.sql) обновляет
+  modules_completed / paid_amount / held_amount затронутых записей кураторов.
+
+Полный пересчет (первичное заполнение, смена ставок в Config):
+    python -m data_base.held_amounts
+"""
+import logging
+from datetime import date
+
+from config import Config
+from data_base.db import session
+from data_base.models import HeldAmount, Student
+from data_base.operations import calculate_held_amount
+
+# Дата начала действия системы холдирования
+HELD_AMOUNTS_START_DATE = date(2025, 9, 1)
+# Статусы, при которых холдирование освобождается
+RELEASED_STATUSES = ("Не учится", "Отчислен")
+
+
+def get_held_logger():
+    """Логгер холдирования с записью в held_amounts.log."""
+    held_logger = logging.getLogger('held_amounts')
+    held_logger.setLevel(logging.INFO)
+    if not held_logger.handlers:
+        held_file_handler = logging.FileHandler('held_amounts.log', encoding='utf-8')
+        held_file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        held_logger.addHandler(held_file_handler)
+    return held_logger
+
+
+def _release(records, student, held_logger):
+    for held in records:
+        if held.status != "active":
+            continue
+        released_amount = float(held.held_amount or 0)
+        held.status = "released"
+        held.held_amount = 0.0
+        held.updated_at = date.today()
+        held_logger.info(f"🔓 Освобождено холдирование: Студент {student.fio} (ID {student.id}) | "
+                         f"Направление: {held.direction} | "
+                         f"Освобождено: {released_amount} руб. | training_status={student.training_status}")
+
+
+def _upsert(records, student, direction, mentor_id, director_id):
+    result = calculate_held_amount(student.id, direction, mentor_id, is_director=mentor_id == director_id)
+    if not result:
+        return
+    held_record = records.get(direction)
+    if held_record is None:
+        held_record = HeldAmount(
+            student_id=student.id,
+            direction=direction,
+            created_at=date.today()
+        )
+        session.add(held_record)
+    held_record.mentor_id = mentor_id
+    held_record.held_amount = result['held_amount']
+    held_record.potential_amount = result['potential_amount']
+    held_record.paid_amount = result['paid_amount']
+    held_record.modules_completed = result['modules_completed']
+    held_record.total_modules = result['total_modules']
+    held_record.status = "active"
+    held_record.updated_at = date.today()
+
+
+def sync_student_held_amounts(student_id):
+    """
+    Приводит записи холдирования студента в соответствие с его текущими данными:
+    фуллстек с 01.09.2025 — записи manual/auto создаются или пересчитываются,
+    "Не учится"/"Отчислен" или другой тип обучения — активные записи освобождаются.
+    Ошибки логируются и не пробрасываются, чтобы не ломать редактирование студента.
+    """
+    if not Config.HELD_AMOUNTS_ENABLED:
+        return
+    held_logger = get_held_logger()
+    try:
+        student = session.query(Student).filter(Student.id == student_id).first()
+        if not student:
+            return
+        records = {
+            held.direction: held
+            for held in session.query(HeldAmount).filter(HeldAmount.student_id == student_id).all()
+        }
+
+        if (student.training_status in RELEASED_STATUSES or student.training_type != "Фуллстек"
+                or not student.start_date or student.start_date < HELD_AMOUNTS_START_DATE):
+            _release(records.values(), student, held_logger)
+        else:
+            _upsert(records, student, "manual", student.mentor_id, Config.DIRECTOR_MANUAL_ID)
+            _upsert(records, student, "auto", student.auto_mentor_id, Config.DIRECTOR_AUTO_ID)
+        session.commit()
+    except Exception as e:
+        held_logger.error(f"❌ Ошибка при обновлении холдирования студента ID {student_id}: {e}")
+        session.rollback()
+
+
+def rebuild_held_amounts():
+    """Полный пересчет холдирования по всем студентам с записями или фуллстеку с 01.09.2025."""
+    student_ids = {
+        student_id for (student_id,) in session.query(Student.id).filter(
+            Student.training_type == "Фуллстек",
+            Student.start_date >= HELD_AMOUNTS_START_DATE
+        )
+    }
+    student_ids.update(student_id for (student_id,) in session.query(HeldAmount.student_id).distinct())
+    for student_id in sorted(student_ids):
+        sync_student_held_amounts(student_id)
+    get_held_logger().info(f"✅ Пересчитано холдирование для {len(student_ids)} студентов")
+    return len(student_ids)
+
+
+if __name__ == "__main__":
+    print(f"✅ Пересчитано холдирование для {rebuild_held_amounts()} студентов")
@@ -0,0 +1,98 @@
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import insert
+
+from data_base.models import JobState, NotificationHistory
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def _jsonable(payload):
+    return json.loads(json.dumps(payload, ensure_ascii=False, default=_json_default))
+
+
+def lock_job(db_session, job_name):
+    """
+    Транзакционная advisory-блокировка джобы: если джоба уже идёт на другом хосте, вернёт False.
+    Блокировка снимается на commit/rollback.
+    """
+    return db_session.execute(
+        text("SELECT pg_try_advisory_xact_lock(hashtext(:job_name))"), {"job_name": job_name}
+    ).scalar()
+
+
+def sync_job_state(db_session, job_name, current):
+    """
+    Сохраняет текущие проблемы джобы и возвращает (новые, решённые).
+
+    current — {student_id: payload}. Сравнение идёт в БД: выбираются только уже известные
+    ключи из current, решённые удаляются одним DELETE ... RETURNING, текущие
+    записываются одним upsert. Коммит — на стороне вызывающего.
+    """
+    current_ids = list(current.keys())
+
+    known_ids = set()
+    if current_ids:
+        known_ids = {
+            student_id for (student_id,) in db_session.query(JobState.student_id).filter(
+                JobState.job_name == job_name,
+                JobState.student_id.in_(current_ids)
+            )
+        }
+
+    resolved_query = JobState.__table__.delete().where(JobState.job_name == job_name)
+    if current_ids:
+        resolved_query = resolved_query.where(JobState.student_id.notin_(current_ids))
+    resolved = [
+        payload or {"student_id": student_id}
+        for student_id, payload in db_session.execute(
+            resolved_query.returning(JobState.student_id, JobState.payload)
+        )
+    ]
+
+    if current_ids:
+        stmt = insert(JobState).values([
+            {"job_name": job_name, "student_id": student_id, "payload": _jsonable(payload)}
+            for student_id, payload in current.items()
+        ])
+        db_session.execute(stmt.on_conflict_do_update(
+            index_elements=[JobState.job_name, JobState.student_id],
+            set_={"payload": stmt.excluded.payload, "updated_at": func.now()}
+        ))
+
+    new = [payload for student_id, payload in current.items() if student_id not in known_ids]
+    return new, resolved
+
+
+def recently_notified(db_session, kind, student_ids, today, cooldown_days):
+    """id студентов, которым напоминание вида kind уже отправлялось меньше cooldown_days дней назад."""
+    if not student_ids:
+        return set()
+    return {
+        student_id for (student_id,) in db_session.query(NotificationHistory.student_id).filter(
+            NotificationHistory.kind == kind,
+            NotificationHistory.student_id.in_(list(student_ids)),
+            NotificationHistory.last_sent_on > today - timedelta(days=cooldown_days)
+        )
+    }
+
+
+def record_notifications(db_session, kind, student_ids, sent_on):
+    """Отмечает отправку напоминаний одним upsert. Коммит — на стороне вызывающего."""
+    if not student_ids:
+        return
+    stmt = insert(NotificationHistory).values([
+        {"student_id": student_id, "kind": kind, "last_sent_on": sent_on}
+        for student_id in student_ids
+    ])
+    db_session.execute(stmt.on_conflict_do_update(
+        index_elements=[NotificationHistory.student_id, NotificationHistory.kind],
+        set_={"last_sent_on": stmt.excluded.last_sent_on}
+    ))
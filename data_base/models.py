@@ -1,7 +1,7 @@
 from datetime import datetime
 
 from sqlalchemy import Column, Integer, BigInteger, String, Date, DECIMAL, Boolean, ForeignKey, Numeric, Text, DateTime, \
-    TIMESTAMP, func, UniqueConstraint, CheckConstraint, Computed
+    TIMESTAMP, func, UniqueConstraint, CheckConstraint, Computed, Index, Enum, event, JSON
 from sqlalchemy.orm import relationship
 
 
@@ -45,6 +45,7 @@ class Student(Base):
     auto_mentor_id = Column(Integer, ForeignKey("mentors.id"), nullable=True)
     career_consultant_id = Column(Integer, ForeignKey("career_consultants.id"), nullable=True)
     consultant_start_date = Column(Date, nullable=True)  # Дата взятия студента в работу карьерным консультантом
+    updated_at = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())  # Для инкрементальной синхронизации
     # mentor = relationship("Mentor", backref="students")
     career_consultant = relationship("CareerConsultant", back_populates="students")
 
@@ -58,6 +59,49 @@ class Mentor(Base):
     chat_id = Column(String, nullable=True)
     direction = Column(String, nullable=False)
     is_admin = Column(Boolean, default=False)
+    updated_at = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())  # Для инкрементальной синхронизации
+
+
+class PaymentKind:
+    """
+    Категория платежа (колонка payments.payment_kind).
+    Раньше категория определялась по подстроке в Payment.comment.
+    """
+    INITIAL = "initial"        # Первоначальный платёж при регистрации
+    EXTRA = "extra"            # Доплата
+    ADDITIONAL = "additional"  # Дополнительный платёж через редактирование студента
+    COMMISSION = "commission"  # Комиссия после трудоустройства
+    BONUS = "bonus"            # Премия сотруднику
+    REFUND = "refund"          # Возврат
+    EXPENSE = "expense"        # Доп расход / системное восстановление
+    OTHER = "other"
+
+    ALL = (INITIAL, EXTRA, ADDITIONAL, COMMISSION, BONUS, REFUND, EXPENSE, OTHER)
+    # Платежи студента за обучение (предоплата)
+    TUITION = (INITIAL, EXTRA, ADDITIONAL)
+
+    @staticmethod
+    def classify(comment):
+        """
+        Категория по тексту комментария. Те же правила — в SQL-функции classify_payment_kind
+        (migrations/2026_10_18_payment_kind.sql), которой заполнены старые записи.
+        """
+        text = (comment or "").lower()
+        if "преми" in text:
+            return PaymentKind.BONUS
+        if "комисс" in text:
+            return PaymentKind.COMMISSION
+        if "возврат" in text:
+            return PaymentKind.REFUND
+        if "доп расход" in text or "системное восстановление" in text:
+            return PaymentKind.EXPENSE
+        if "первонач" in text:
+            return PaymentKind.INITIAL
+        if "доплат" in text:
+            return PaymentKind.EXTRA
+        if "платёж" in text or "платеж" in text:
+            return PaymentKind.ADDITIONAL
+        return PaymentKind.OTHER
 
 
 class Payment(Base):
@@ -73,6 +117,15 @@ class Payment(Base):
     payment_date = Column(Date, nullable=False)  # Дата платежа
     comment = Column(Text, nullable=True)  # Комментарий к платежу (например, "Первый платеж")
     status = Column(String(20), default="не подтвержден", nullable=False)
+    payment_kind = Column(Enum(*PaymentKind.ALL, name="payment_kind"), nullable=False)  # Категория (PaymentKind)
+
+    # Индексы из migrations/2026_10_18_payment_indexes.sql и 2026_10_18_payment_kind.sql
+    __table_args__ = (
+        Index("idx_payments_student_status_date", "student_id", "status", "payment_date"),
+        Index("idx_payments_date_status", "payment_date", "status"),
+        Index("idx_payments_kind_date_status", "payment_kind", "payment_date", "status"),
+        Index("idx_payments_student_kind_date", "student_id", "payment_kind", "payment_date"),
+    )
 
     # Отношения (если нужны)
     student = relationship("Student", back_populates="payments")
@@ -82,6 +135,13 @@ class Payment(Base):
         return f"<Payment(id={self.id}, student_id={self.student_id}, mentor_id={self.mentor_id}, amount={self.amount}, date={self.payment_date})>"
 
 
+@event.listens_for(Payment, "before_insert")
+def _fill_payment_kind(mapper, connection, target):
+    # Страховка для мест, где категорию не передали явно
+    if target.payment_kind is None:
+        target.payment_kind = PaymentKind.classify(target.comment)
+
+
 class FullstackTopicAssign(Base):
     """
     Модель для отслеживания принятых тем по фуллстек курсу.
@@ -95,6 +155,11 @@ class FullstackTopicAssign(Base):
     topic_auto = Column(String(255), nullable=True)    # Название авто темы
     assigned_at = Column(Date, nullable=False)  # Дата принятия темы
 
+    __table_args__ = (
+        Index("idx_fullstack_topic_assignments_student_id", "student_id"),
+        Index("idx_fullstack_topic_assignments_mentor_id", "mentor_id"),
+    )
+
     # Отношения
     student = relationship("Student")
     mentor = relationship("Mentor")
@@ -272,6 +337,12 @@ class HeldAmount(Base):
     created_at = Column(Date, nullable=True)
     updated_at = Column(Date, nullable=True)
 
+    __table_args__ = (
+        Index("idx_held_amounts_student_id", "student_id"),
+        Index("idx_held_amounts_mentor_id", "mentor_id"),
+        Index("idx_held_amounts_status_student", "status", "student_id"),
+    )
+
     # Отношения
     student = relationship("Student", foreign_keys=[student_id])
     mentor = relationship("Mentor", foreign_keys=[mentor_id])
@@ -309,6 +380,29 @@ class AutoProgress(Base):
     m7_topic_mentor_id = Column(Integer, nullable=True)
 
 
+
+class ModuleSubmission(Base):
+    """
+    Журнал сдач тем/модулей (append-only) из manual_progress и auto_progress.
+    Пишется триггерами БД при изменении даты или ментора темы (migrations/2026_10_18_module_submissions.sql),
+    актуальна последняя запись по (student_id, direction, module_code); submitted_at = NULL — сдача отменена.
+    Запросы — через data_base/module_submissions.py.
+    """
+    __tablename__ = "module_submissions"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), nullable=False)
+    direction = Column(String(10), nullable=False)  # "manual" или "auto"
+    module_code = Column(String(30), nullable=False)  # "m1", "m2_1_2_2", "m2_exam", "m4_topic", ...
+    mentor_id = Column(Integer, nullable=True)  # Кто принял (как *_mentor_id в прогрессе)
+    submitted_at = Column(Date, nullable=True)
+    recorded_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index("idx_module_submissions_submitted_mentor", "submitted_at", "mentor_id"),
+        Index("idx_module_submissions_student_module", "student_id", "direction", "module_code", "id"),
+    )
+
 # class Commission(Base):
 #     """
 #     Модель данных для таблицы зарплаты (salary).
@@ -379,6 +473,12 @@ class Salary(Base):
     mentor_id = Column(Integer, nullable=False)
     date_calculated = Column(DateTime, default=datetime.now)  # Или Date
 
+    __table_args__ = (
+        Index("idx_salary_payment_id", "payment_id"),
+        Index("idx_salary_mentor_id", "mentor_id"),
+        Index("idx_salary_date_calculated", "date_calculated"),
+    )
+
     def __repr__(self):
         # Используем self.salary_id для соответствия имени колонки
         return (f"<Salary(id={self.salary_id}, payment_id={self.payment_id}, "
@@ -431,6 +531,13 @@ class SalaryKK(Base):
     date_calculated = Column(DateTime, default=datetime.utcnow)
     comment = Column(Text, nullable=True)
 
+    __table_args__ = (
+        Index("idx_salary_kk_payment_id", "payment_id"),
+        Index("idx_salary_kk_kk_id", "kk_id"),
+        Index("idx_salary_kk_student_id", "student_id"),
+        Index("idx_salary_kk_date_calculated", "date_calculated"),
+    )
+
     # Отношения
     student = relationship("Student")
     kk = relationship("CareerConsultant")
@@ -576,4 +683,43 @@ class FixedExpense(Base):
     id = Column(Integer, primary_key=True)
     report_month = Column(Date, nullable=False)
     category = Column(String(100), nullable=False) # Cineskop, ChatPlace, Bots, Salaries_fixed
-    amount = Column(Numeric(10, 2), default=0)
\ No newline at end of file
+    amount = Column(Numeric(10, 2), default=0)
+
+
+class JobState(Base):
+    """
+    Текущие проблемы, найденные cron-джобами (должники, постоплата).
+    По разнице между прошлым и текущим запуском джоба сообщает о новых и решённых проблемах.
+    """
+    __tablename__ = "job_state"
+
+    job_name = Column(String(50), primary_key=True)  # "debtors", "postpayment_issues"
+    student_id = Column(Integer, primary_key=True)  # Без FK: удалённый студент должен попасть в "решённые"
+    payload = Column(JSON, nullable=True)  # Данные для текста уведомления
+    detected_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
+
+
+class NotificationHistory(Base):
+    """
+    Когда студенту последний раз отправлялось напоминание данного вида (кулдаун рассылок).
+    """
+    __tablename__ = "notification_history"
+
+    student_id = Column(Integer, primary_key=True)
+    kind = Column(String(20), primary_key=True)  # "pre" — предоплата, "post" — комиссия
+    last_sent_on = Column(Date, nullable=False)
+
+
+class TelegramFileCache(Base):
+    """
+    file_id документов, уже загруженных в Telegram: повторная отправка того же содержимого
+    идёт по file_id без загрузки файла. Одна запись на (вид, владелец) — старые хэши удаляются.
+    """
+    __tablename__ = "telegram_file_cache"
+
+    kind = Column(String(30), primary_key=True)  # "contract", "vpn_config"
+    owner = Column(String(100), primary_key=True)  # telegram студента / telegram user_id
+    content_hash = Column(String(64), primary_key=True)  # sha256 содержимого
+    file_id = Column(String(255), nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
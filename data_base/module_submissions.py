@@ -0,0 +1,82 @@
+from datetime import date
+
+from sqlalchemy import func
+from sqlalchemy.orm import aliased
+
+from data_base.models import ModuleSubmission
+
+# Направления
+MANUAL = "manual"
+AUTO = "auto"
+
+# {код темы: (поле даты, поле ментора)} — те же пары, что пишет триггер в module_submissions
+MANUAL_MODULES = {
+    "m1": ("m1_submission_date", "m1_mentor_id"),
+    "m2_1_2_2": ("m2_1_2_2_submission_date", "m2_1_2_2_mentor_id"),
+    "m2_3_3_1": ("m2_3_3_1_submission_date", "m2_3_3_1_mentor_id"),
+    "m3_2": ("m3_2_submission_date", "m3_2_mentor_id"),
+    "m3_3": ("m3_3_submission_date", "m3_3_mentor_id"),
+    "m4_1": ("m4_1_submission_date", "m4_1_mentor_id"),
+    "m4_2_4_3": ("m4_2_4_3_submission_date", "m4_2_4_3_mentor_id"),
+    "m4_mock_exam": ("m4_mock_exam_passed_date", "m4_mock_exam_mentor_id"),
+    # Получение 5 модуля (отдельной даты сдачи нет, используется m5_start_date)
+    "m5": ("m5_start_date", None),
+}
+
+AUTO_MODULES = {
+    "m2_exam": ("m2_exam_passed_date", "m2_exam_mentor_id"),
+    "m3_exam": ("m3_exam_passed_date", "m3_exam_mentor_id"),
+    "m4_topic": ("m4_topic_passed_date", "m4_topic_mentor_id"),
+    "m5_topic": ("m5_topic_passed_date", "m5_topic_mentor_id"),
+    "m6_topic": ("m6_topic_passed_date", "m6_topic_mentor_id"),
+    "m7_topic": ("m7_topic_passed_date", "m7_topic_mentor_id"),
+}
+
+
+def _current(db_session):
+    """Запрос по актуальным записям: без более поздней записи по той же теме студента."""
+    newer = aliased(ModuleSubmission)
+    superseded = db_session.query(newer.id).filter(
+        newer.student_id == ModuleSubmission.student_id,
+        newer.direction == ModuleSubmission.direction,
+        newer.module_code == ModuleSubmission.module_code,
+        newer.id > ModuleSubmission.id
+    ).exists()
+    return db_session.query(ModuleSubmission).filter(~superseded)
+
+
+def submissions_in_period(db_session, start_date: date, end_date: date, direction=None, mentor_id=None,
+                          module_codes=None, student_ids=None):
+    """
+    Актуальные сдачи тем с submitted_at в [start_date, end_date] (индекс по (submitted_at, mentor_id)).
+    Возвращает запрос ModuleSubmission — фильтры и сортировку можно добавить на стороне вызывающего.
+    """
+    query = _current(db_session).filter(
+        ModuleSubmission.submitted_at >= start_date,
+        ModuleSubmission.submitted_at <= end_date
+    )
+    if direction is not None:
+        query = query.filter(ModuleSubmission.direction == direction)
+    if mentor_id is not None:
+        query = query.filter(ModuleSubmission.mentor_id == mentor_id)
+    if module_codes is not None:
+        query = query.filter(ModuleSubmission.module_code.in_(list(module_codes)))
+    if student_ids is not None:
+        query = query.filter(ModuleSubmission.student_id.in_(list(student_ids)))
+    return query
+
+
+def accepted_counts_by_mentor(db_session, start_date: date, end_date: date, direction=None, module_codes=None):
+    """Количество принятых в периоде тем по менторам: {mentor_id: count}."""
+    query = submissions_in_period(db_session, start_date, end_date, direction=direction, module_codes=module_codes)
+    rows = query.with_entities(ModuleSubmission.mentor_id, func.count()).group_by(ModuleSubmission.mentor_id).all()
+    return {mentor_id: count for mentor_id, count in rows}
+
+
+def get_submission_date(db_session, student_id: int, direction: str, module_code: str):
+    """Актуальная дата сдачи темы студентом или None."""
+    return db_session.query(ModuleSubmission.submitted_at).filter(
+        ModuleSubmission.student_id == student_id,
+        ModuleSubmission.direction == direction,
+        ModuleSubmission.module_code == module_code
+    ).order_by(ModuleSubmission.id.desc()).limit(1).scalar()
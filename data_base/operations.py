@@ -3,9 +3,9 @@ import random
 from typing import Optional
 
 from data_base.db import session
-from data_base.models import Student, Mentor, Payment, CareerConsultant, UnitEconomics, StudentMeta, MarketingSpend
+from data_base.models import Student, Mentor, Payment, PaymentKind, CareerConsultant, UnitEconomics, StudentMeta, MarketingSpend
 from datetime import datetime, timedelta
-from sqlalchemy import or_, func
+from sqlalchemy import or_, func, case, select
 from sqlalchemy import desc
 
 
@@ -143,7 +143,7 @@ def calculate_career_consultant_salary(consultant_id, start_date, end_date):
         Payment.payment_date >= start_date,
         Payment.payment_date <= end_date,
         Payment.status == "подтвержден",
-        Payment.comment.ilike("%комисси%")
+        Payment.payment_kind == PaymentKind.COMMISSION
     ).all()
     
     # Рассчитываем комиссию: 20% если КК с ID=1 взял студента после 18.11.2025, иначе 10%
@@ -232,6 +232,57 @@ def get_all_students():
     return session.query(Student).all()
 
 
+def search_students(query, limit=20):
+    """
+    Регистронезависимый поиск студентов по подстроке в ФИО или Telegram.
+
+    На Postgres поиск и ранжирование выполняются в БД (триграммные индексы
+    из migrations/2026_10_18_student_search_indexes.sql), на других СУБД —
+    через триграммный индекс в памяти (data_base/student_search.py).
+    Сначала точные совпадения, затем совпадения с начала, затем по подстроке.
+    """
+    from data_base.student_search import match_rank, student_search_index
+
+    query = (query or "").strip().lower()
+    if not query:
+        return []
+
+    if session.bind.dialect.name != "postgresql":
+        ids = student_search_index.candidate_ids(session, query)
+        if not ids:
+            return []
+        students = session.query(Student).filter(Student.id.in_(ids)).all()
+        ranked = [(match_rank(query, s.fio, s.telegram), s) for s in students]
+        ranked = [(rank, s) for rank, s in ranked if rank is not None]
+        ranked.sort(key=lambda item: (item[0], item[1].fio.lower()))
+        return [s for _, s in ranked[:limit]]
+
+    return session.execute(student_search_select(query, limit)).scalars().all()
+
+
+def student_search_select(query, limit=20):
+    """
+    SELECT поиска студентов для Postgres (query уже в нижнем регистре): подстрока в ФИО или Telegram,
+    порядок — точное совпадение, совпадение с начала, подстрока. Общий для search_students
+    и async_operations.search_students.
+    """
+    fio = func.lower(Student.fio)
+    telegram = func.lower(Student.telegram)
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+    rank = case(
+        (or_(fio == query, telegram == query), 0),
+        (or_(fio.like(f"{escaped}%", escape="\\"), telegram.like(f"{escaped}%", escape="\\")), 1),
+        else_=2
+    )
+    return (
+        select(Student)
+        .where(or_(fio.like(f"%{escaped}%", escape="\\"), telegram.like(f"%{escaped}%", escape="\\")))
+        .order_by(rank, fio)
+        .limit(limit)
+    )
+
+
 def get_student_by_fio_or_telegram(value):
     """
     Ищет студента по ФИО или Telegram.
@@ -255,6 +306,9 @@ def update_student(student_id, updates):
     for key, value in updates.items():
         setattr(student, key, value)
     session.commit()
+    if "fio" in updates or "telegram" in updates:
+        from data_base.student_search import student_search_index
+        student_search_index.invalidate()
 
 
 # Удаление студента
@@ -264,6 +318,8 @@ def delete_student(student_id):
     if student:
         session.delete(student)
         session.commit()
+        from data_base.student_search import student_search_index
+        student_search_index.invalidate()
 
 
 # Получение статистики
@@ -325,7 +381,7 @@ def get_students_with_unpaid_payment():
     for student in students:
         last_payment = session.query(func.max(Payment.payment_date)).filter(
             Payment.student_id == student.id,
-            Payment.comment == "Доплата",
+            Payment.payment_kind == PaymentKind.EXTRA,
             Payment.payment_date >= one_month_ago  # Ищем доплаты за последний месяц
         ).scalar()
 
@@ -0,0 +1,91 @@
+import threading
+
+from sqlalchemy import func
+
+from data_base.models import Student
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def match_rank(query, fio, telegram):
+    """
+    Ранг совпадения (меньше — выше в выдаче), None — не совпадает.
+    0 — точное совпадение, 1 — совпадение с начала, 2 — подстрока.
+    Тот же порядок использует SQL-вариант в operations.search_students.
+    """
+    fio = (fio or "").lower()
+    telegram = (telegram or "").lower()
+    if query == fio or query == telegram:
+        return 0
+    if fio.startswith(query) or telegram.startswith(query):
+        return 1
+    if query in fio or query in telegram:
+        return 2
+    return None
+
+
+class StudentSearchIndex:
+    """
+    Триграммный индекс по ФИО и Telegram в памяти процесса.
+
+    Используется вместо pg_trgm, когда бот работает не на Postgres (SQLite в тестах/локально).
+    Индекс перестраивается, если изменились количество студентов, максимальный id
+    или max(updated_at) — так подхватываются и добавления/удаления, и правки ФИО/Telegram
+    (в том числе сделанные другим процессом).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._signature = None
+        # {trigram: set(student_id)}
+        self._postings = {}
+        # {student_id: (fio_lower, telegram_lower)}
+        self._rows = {}
+
+    def invalidate(self):
+        with self._lock:
+            self._signature = None
+
+    def _ensure_built(self, db_session):
+        signature = db_session.query(
+            func.count(Student.id), func.max(Student.id), func.max(Student.updated_at)
+        ).one()
+        signature = tuple(signature)
+        with self._lock:
+            if signature == self._signature:
+                return
+
+            postings = {}
+            rows = {}
+            for student_id, fio, telegram in db_session.query(Student.id, Student.fio, Student.telegram):
+                fio = (fio or "").lower()
+                telegram = (telegram or "").lower()
+                rows[student_id] = (fio, telegram)
+                for gram in _trigrams(fio) | _trigrams(telegram):
+                    postings.setdefault(gram, set()).add(student_id)
+
+            self._postings = postings
+            self._rows = rows
+            self._signature = signature
+
+    def candidate_ids(self, db_session, query):
+        """id студентов, у которых query может входить в ФИО или Telegram."""
+        self._ensure_built(db_session)
+        with self._lock:
+            grams = _trigrams(query)
+            if not grams:
+                # Запрос короче трёх символов — проверяем все строки индекса
+                ids = self._rows.keys()
+            else:
+                postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+                ids = set.intersection(*postings)
+            return [
+                student_id for student_id in ids
+                if match_rank(query, *self._rows[student_id]) is not None
+            ]
+
+
+# Общий индекс процесса
+student_search_index = StudentSearchIndex()
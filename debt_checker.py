@@ -1,15 +1,17 @@
-import json
 import asyncio
 import os
 from datetime import datetime, date, timedelta
-from sqlalchemy import desc, or_
+from sqlalchemy import func, or_
 from telegram import Bot
+from telegram.error import RetryAfter
 from dotenv import load_dotenv
 
 load_dotenv()
 
 from data_base.db import session
-from data_base.models import Student, Payment
+from data_base.job_state import lock_job, sync_job_state, recently_notified, record_notifications
+from data_base.models import Student, Payment, PaymentKind
+from utils.rate_limit import AsyncRateLimiter
 
 # Настройки
 SPECIAL_USER_ID = 1257163820
@@ -18,128 +20,171 @@ DEBT_DAYS_THRESHOLD = 30
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 STUDENT_BOT = os.getenv("STUDENT_BOT_TOKEN")
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-STATE_FILE = os.path.join(BASE_DIR, "prev_debtors.json")
-HISTORY_FILE = os.path.join(BASE_DIR, "notification_history.json")
-
+# Состояние хранится в БД (job_state / notification_history)
+DEBTORS_JOB = "debtors"
+NOTIFY_JOB = "student_debt_notifications"
+NOTIFY_COOLDOWN_DAYS = 4
+
+# Лимиты рассылки: Telegram допускает ~30 сообщений в секунду от одного бота
+SEND_RATE_PER_SECOND = 25
+SEND_CONCURRENCY = 10
+
+
+def _last_payment_subquery(*criteria):
+    """
+    Дата последнего платежа каждого студента по условию — один GROUP BY по индексу
+    (student_id, payment_kind, payment_date) вместо отдельного запроса на студента.
+    """
+    return (
+        session.query(
+            Payment.student_id.label("student_id"),
+            func.max(Payment.payment_date).label("last_date")
+        )
+        .filter(Payment.student_id.isnot(None), *criteria)
+        .group_by(Payment.student_id)
+        .subquery()
+    )
+
+
+async def _send_all(bot, messages):
+    """
+    Отправляет сообщения [(chat_id, text), ...] параллельно, не превышая лимиты Telegram.
+    Возвращает список флагов доставки в том же порядке.
+    """
+    limiter = AsyncRateLimiter(SEND_RATE_PER_SECOND)
+    semaphore = asyncio.Semaphore(SEND_CONCURRENCY)
+
+    async def send(chat_id, text):
+        if not chat_id:
+            return False
+        async with semaphore:
+            for attempt in range(2):
+                await limiter.acquire()
+                try:
+                    await bot.send_message(chat_id=chat_id, text=text)
+                    return True
+                except RetryAfter as e:
+                    # Telegram просит подождать — ждём и пробуем ещё раз
+                    retry_after = e.retry_after
+                    await asyncio.sleep(retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else retry_after)
+                except Exception:
+                    return False
+            return False
 
-def can_send_to_student(student_id, type_suffix, history):
-    key = f"{student_id}_{type_suffix}"
-    last_date_str = history.get(key)
-    if not last_date_str: return True
-    last_date = datetime.strptime(last_date_str, '%Y-%m-%d').date()
-    return (date.today() - last_date).days >= 4
+    return await asyncio.gather(*(send(chat_id, text) for chat_id, text in messages))
 
 
 async def check_new_debtors(bot):
     """Оригинальный функционал для админа."""
     cutoff = datetime.now().date() - timedelta(days=DEBT_DAYS_THRESHOLD)
-    students = session.query(Student).filter(Student.total_cost > Student.payment_amount,
-                                             Student.training_status != "Не учится").all()
-    current_debtors = []
-    for s in students:
-        last_p = session.query(Payment.payment_date).filter(Payment.student_id == s.id,
-                                                            Payment.comment != "Комиссия").order_by(
-            desc(Payment.payment_date)).first()
-        if not last_p or last_p[0] <= cutoff:
-            current_debtors.append(s.telegram or s.fio)
-
-    if os.path.exists(STATE_FILE):
-        with open(STATE_FILE, "r", encoding="utf-8") as f:
-            prev_debtors = json.load(f)
-    else:
-        prev_debtors = []
-
-    new = [d for d in current_debtors if d not in prev_debtors]
-    resolved = [d for d in prev_debtors if d not in current_debtors]
+    last_payment = _last_payment_subquery(Payment.payment_kind != PaymentKind.COMMISSION)
+
+    rows = (
+        session.query(Student.id, Student.telegram, Student.fio)
+        .outerjoin(last_payment, last_payment.c.student_id == Student.id)
+        .filter(
+            Student.total_cost > Student.payment_amount,
+            Student.training_status != "Не учится",
+            or_(last_payment.c.last_date.is_(None), last_payment.c.last_date <= cutoff)
+        )
+        .all()
+    )
+
+    if not lock_job(session, DEBTORS_JOB):
+        session.rollback()
+        return  # Джоба уже выполняется на другом хосте
+
+    current_debtors = {student_id: {"name": telegram or fio} for student_id, telegram, fio in rows}
+    new, resolved = sync_job_state(session, DEBTORS_JOB, current_debtors)
+    session.commit()
+
+    new = sorted(item["name"] for item in new)
+    resolved = sorted(item.get("name", f"ID {item.get('student_id')}") for item in resolved)
 
     if new: await bot.send_message(chat_id=ADMIN_CHAT_ID, text="❗️ Новые должники:\n" + "\n".join(new))
     if resolved: await bot.send_message(chat_id=ADMIN_CHAT_ID,
                                         text="✅ Решены проблемы с должниками:\n" + "\n".join(resolved))
 
-    with open(STATE_FILE, "w", encoding="utf-8") as f:
-        json.dump(sorted(current_debtors), f, ensure_ascii=False, indent=2)
-
 
 async def notify_students_logic(bot):
     """Рассылка с учетом интервала в 1 месяц от платежа и 4 дня от уведомления."""
     today = date.today()
     month_ago = today - timedelta(days=30)
 
-    if os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
-            history = json.load(f)
-    else:
-        history = {}
+    if not lock_job(session, NOTIFY_JOB):
+        session.rollback()
+        return  # Рассылка уже идёт на другом хосте
 
-    delivered, stub = [], []
+    # [(вид напоминания, student_id, chat_id, текст, строка отчета)]
+    outgoing = []
 
     # 1. ПРЕДОПЛАТА (Первоначальный платёж или Доплата)
-    prepaid = session.query(Student).filter(Student.total_cost > Student.payment_amount,
-                                            Student.training_status != "Не учится").all()
+    # Студенты, у которых последний платёж по предоплате был больше месяца назад (или его нет)
+    last_prepayment = _last_payment_subquery(
+        Payment.status == "подтвержден",
+        Payment.payment_kind.in_(PaymentKind.TUITION)
+    )
+    prepaid = (
+        session.query(Student.id, Student.fio, Student.telegram, Student.chat_id,
+                      Student.total_cost, Student.payment_amount)
+        .outerjoin(last_prepayment, last_prepayment.c.student_id == Student.id)
+        .filter(
+            Student.total_cost > Student.payment_amount,
+            Student.training_status != "Не учится",
+            or_(last_prepayment.c.last_date.is_(None), last_prepayment.c.last_date <= month_ago)
+        )
+        .all()
+    )
+    on_cooldown = recently_notified(session, "pre", [s.id for s in prepaid], today, NOTIFY_COOLDOWN_DAYS)
     for s in prepaid:
-        # Ищем последний платеж по предоплате
-        last_p = session.query(Payment).filter(
-            Payment.student_id == s.id,
-            Payment.status == "подтвержден",
-            or_(Payment.comment.ilike("%платёж%"), Payment.comment.ilike("%доплата%"))
-        ).order_by(Payment.payment_date.desc()).first()
-
-        # УСЛОВИЕ: Прошло больше месяца с платежа И кулдаун 4 дня
-        if last_p and last_p.payment_date > month_ago:
-            continue  # Слишком рано напоминать, он платил меньше месяца назад
-
-        if can_send_to_student(s.id, "pre", history):
+        if s.id not in on_cooldown:
             debt = s.total_cost - (s.payment_amount or 0)
             msg = f"Здравствуйте, {s.fio}! Напоминаем об оплате обучения. Остаток: {debt}р."
-            sent = False
-            if s.chat_id:
-                try:
-                    await bot.send_message(chat_id=s.chat_id, text=msg)
-                    sent = True
-                except:
-                    pass
-
-            history[f"{s.id}_pre"] = today.strftime('%Y-%m-%d')
-            (delivered if sent else stub).append(f"{s.telegram} (предоплата, {debt}р)")
+            outgoing.append(("pre", s.id, s.chat_id, msg, f"{s.telegram} (предоплата, {debt}р)"))
 
     # 2. ПОСТОПЛАТА (Комиссия)
-    employed = session.query(Student).filter(Student.training_status == "Устроился").all()
+    last_commission = _last_payment_subquery(
+        Payment.status == "подтвержден",
+        Payment.payment_kind == PaymentKind.COMMISSION
+    )
+    employed = (
+        session.query(Student.id, Student.fio, Student.telegram, Student.chat_id,
+                      Student.commission, Student.salary, Student.commission_paid)
+        .outerjoin(last_commission, last_commission.c.student_id == Student.id)
+        .filter(
+            Student.training_status == "Устроился",
+            Student.commission.isnot(None),
+            Student.commission != "",
+            or_(last_commission.c.last_date.is_(None), last_commission.c.last_date <= month_ago)
+        )
+        .all()
+    )
+    on_cooldown = recently_notified(session, "post", [s.id for s in employed], today, NOTIFY_COOLDOWN_DAYS)
     for s in employed:
-        if s.commission:
-            try:
-                # Ищем последний платеж комиссии
-                last_p = session.query(Payment).filter(
-                    Payment.student_id == s.id,
-                    Payment.comment.ilike("%комисс%"),
-                    Payment.status == "подтвержден"
-                ).order_by(Payment.payment_date.desc()).first()
-
-                # УСЛОВИЕ: Прошло больше месяца с платежа
-                if last_p and last_p.payment_date > month_ago:
-                    continue
-
-                if can_send_to_student(s.id, "post", history):
-                    c = [i.strip() for i in s.commission.split(",")]
-                    num, perc = int(c[0]), int(c[1].replace("%", ""))
-                    debt = ((s.salary or 0) * perc / 100) * num - (s.commission_paid or 0)
-
-                    if debt > 0:
-                        msg = f"Здравствуйте, {s.fio}! Напоминаем о выплате комиссии. Долг: {debt}р."
-                        sent = False
-                        if s.chat_id:
-                            try:
-                                await bot.send_message(chat_id=s.chat_id, text=msg)
-                                sent = True
-                            except:
-                                pass
-                        history[f"{s.id}_post"] = today.strftime('%Y-%m-%d')
-                        (delivered if sent else stub).append(f"{s.telegram} (комиссия, {debt}р)")
-            except:
-                continue
-
-    with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
-        json.dump(history, f, ensure_ascii=False, indent=4)
+        if s.id in on_cooldown:
+            continue
+        try:
+            c = [i.strip() for i in s.commission.split(",")]
+            num, perc = int(c[0]), int(c[1].replace("%", ""))
+        except:
+            continue
+        debt = ((s.salary or 0) * perc / 100) * num - (s.commission_paid or 0)
+
+        if debt > 0:
+            msg = f"Здравствуйте, {s.fio}! Напоминаем о выплате комиссии. Долг: {debt}р."
+            outgoing.append(("post", s.id, s.chat_id, msg, f"{s.telegram} (комиссия, {debt}р)"))
+
+    # 3. Рассылка параллельно с ограничением частоты
+    results = await _send_all(bot, [(chat_id, msg) for _, _, chat_id, msg, _ in outgoing])
+
+    delivered, stub = [], []
+    for (_, _, _, _, label), sent in zip(outgoing, results):
+        (delivered if sent else stub).append(label)
+
+    # Кулдаун ставится и для недоставленных (ученик не в боте), как и раньше
+    for kind in ("pre", "post"):
+        record_notifications(session, kind, [student_id for k, student_id, *_ in outgoing if k == kind], today)
+    session.commit()
 
     report = []
     if delivered: report.append("📩 Доставлено ученикам:\n" + "\n".join(delivered))
@@ -0,0 +1,13 @@
+-- Состояние синхронизации с Airtable (migrations/airtable_sync.py):
+-- id записи в Airtable и хэш содержимого строки на момент последней отправки.
+-- Неизменившиеся строки не отправляются, а карта id не скачивается из Airtable каждый запуск.
+
+CREATE TABLE IF NOT EXISTS airtable_sync_state (
+    pg_table VARCHAR(64) NOT NULL,
+    row_key VARCHAR(64) NOT NULL,
+    airtable_record_id VARCHAR(32) NOT NULL,
+    content_hash CHAR(64) NOT NULL,
+    synced_at TIMESTAMP NOT NULL DEFAULT NOW(),
+
+    CONSTRAINT pk_airtable_sync_state PRIMARY KEY (pg_table, row_key)
+);
@@ -0,0 +1,44 @@
+-- Холдирование по событиям (data_base/held_amounts.py): при принятии/удалении темы в
+-- fullstack_topic_assignments пересчитываются только записи held_amounts этого студента.
+-- Формула та же, что в calculate_held_amount: paid = сдано / всего * potential,
+-- held = max(0, potential - paid). Записи директоров (total_modules = 0) и освобожденные не трогаются.
+
+CREATE INDEX IF NOT EXISTS idx_held_amounts_status_student
+    ON held_amounts (status, student_id);
+
+CREATE OR REPLACE FUNCTION refresh_held_modules(target_student_id INTEGER) RETURNS VOID AS $$
+    UPDATE held_amounts h
+    SET modules_completed = c.completed,
+        paid_amount = ROUND(c.completed::NUMERIC / h.total_modules * h.potential_amount, 2),
+        held_amount = ROUND(GREATEST(0, h.potential_amount - c.completed::NUMERIC / h.total_modules * h.potential_amount), 2),
+        updated_at = CURRENT_DATE
+    FROM (
+        SELECT 'manual' AS direction, COUNT(DISTINCT topic_manual) AS completed
+        FROM fullstack_topic_assignments WHERE student_id = target_student_id
+        UNION ALL
+        SELECT 'auto', COUNT(DISTINCT topic_auto)
+        FROM fullstack_topic_assignments WHERE student_id = target_student_id
+    ) c
+    WHERE h.student_id = target_student_id
+      AND h.direction = c.direction
+      AND h.status = 'active'
+      AND h.total_modules > 0
+      AND h.modules_completed IS DISTINCT FROM c.completed;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION held_on_topic_change() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM refresh_held_modules(NEW.student_id);
+    END IF;
+    IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD.student_id IS DISTINCT FROM NEW.student_id) THEN
+        PERFORM refresh_held_modules(OLD.student_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_fullstack_topic_assignments_held ON fullstack_topic_assignments;
+CREATE TRIGGER trg_fullstack_topic_assignments_held
+    AFTER INSERT OR DELETE OR UPDATE OF student_id, topic_manual, topic_auto ON fullstack_topic_assignments
+    FOR EACH ROW EXECUTE FUNCTION held_on_topic_change();
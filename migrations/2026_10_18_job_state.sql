@@ -0,0 +1,23 @@
+-- Состояние cron-джоб в БД вместо файлов prev_debtors.json, notification_history.json
+-- и prev_postpayment_issues.json (data_base/job_state.py).
+
+CREATE TABLE IF NOT EXISTS job_state (
+    job_name VARCHAR(50) NOT NULL,
+    student_id INTEGER NOT NULL,
+    payload JSONB,
+    detected_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+
+    CONSTRAINT pk_job_state PRIMARY KEY (job_name, student_id)
+);
+
+CREATE TABLE IF NOT EXISTS notification_history (
+    student_id INTEGER NOT NULL,
+    kind VARCHAR(20) NOT NULL,
+    last_sent_on DATE NOT NULL,
+
+    CONSTRAINT pk_notification_history PRIMARY KEY (student_id, kind)
+);
+
+CREATE INDEX IF NOT EXISTS idx_notification_history_kind_sent
+    ON notification_history (kind, last_sent_on);
@@ -0,0 +1,146 @@
+-- Журнал сдач тем/модулей (ModuleSubmission, data_base/module_submissions.py).
+-- manual_progress и auto_progress хранят по паре колонок (дата, ментор) на тему, поэтому вопрос
+-- "какие темы принял ментор X за период" требовал обхода всех строк и колонок. Журнал append-only:
+-- триггеры добавляют запись при изменении даты или ментора темы, актуальна последняя запись
+-- по (student_id, direction, module_code), submitted_at = NULL — сдача отменена.
+
+CREATE TABLE IF NOT EXISTS module_submissions (
+    id BIGSERIAL PRIMARY KEY,
+    student_id INTEGER NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+    direction VARCHAR(10) NOT NULL,
+    module_code VARCHAR(30) NOT NULL,
+    mentor_id INTEGER,
+    submitted_at DATE,
+    recorded_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_module_submissions_submitted_mentor
+    ON module_submissions (submitted_at, mentor_id);
+
+CREATE INDEX IF NOT EXISTS idx_module_submissions_student_module
+    ON module_submissions (student_id, direction, module_code, id);
+
+-- Бэкфилл текущего состояния прогресса (повторный запуск не дублирует уже перенесенных студентов)
+BEGIN;
+
+LOCK TABLE manual_progress, auto_progress IN SHARE MODE;
+
+INSERT INTO module_submissions (student_id, direction, module_code, mentor_id, submitted_at)
+SELECT p.student_id, 'manual', t.module_code, t.mentor_id, t.submitted_at
+FROM manual_progress p
+CROSS JOIN LATERAL (VALUES
+        ('m1', p.m1_submission_date, p.m1_mentor_id),
+        ('m2_1_2_2', p.m2_1_2_2_submission_date, p.m2_1_2_2_mentor_id),
+        ('m2_3_3_1', p.m2_3_3_1_submission_date, p.m2_3_3_1_mentor_id),
+        ('m3_2', p.m3_2_submission_date, p.m3_2_mentor_id),
+        ('m3_3', p.m3_3_submission_date, p.m3_3_mentor_id),
+        ('m4_1', p.m4_1_submission_date, p.m4_1_mentor_id),
+        ('m4_2_4_3', p.m4_2_4_3_submission_date, p.m4_2_4_3_mentor_id),
+        ('m4_mock_exam', p.m4_mock_exam_passed_date, p.m4_mock_exam_mentor_id),
+        ('m5', p.m5_start_date, NULL::INTEGER)
+) AS t(module_code, submitted_at, mentor_id)
+WHERE t.submitted_at IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM module_submissions s WHERE s.direction = 'manual' AND s.student_id = p.student_id);
+
+INSERT INTO module_submissions (student_id, direction, module_code, mentor_id, submitted_at)
+SELECT p.student_id, 'auto', t.module_code, t.mentor_id, t.submitted_at
+FROM auto_progress p
+CROSS JOIN LATERAL (VALUES
+        ('m2_exam', p.m2_exam_passed_date, p.m2_exam_mentor_id),
+        ('m3_exam', p.m3_exam_passed_date, p.m3_exam_mentor_id),
+        ('m4_topic', p.m4_topic_passed_date, p.m4_topic_mentor_id),
+        ('m5_topic', p.m5_topic_passed_date, p.m5_topic_mentor_id),
+        ('m6_topic', p.m6_topic_passed_date, p.m6_topic_mentor_id),
+        ('m7_topic', p.m7_topic_passed_date, p.m7_topic_mentor_id)
+) AS t(module_code, submitted_at, mentor_id)
+WHERE t.submitted_at IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM module_submissions s WHERE s.direction = 'auto' AND s.student_id = p.student_id);
+
+-- Синхронизация: прогресс редактирует бот менторов, поэтому журнал ведется триггерами в БД.
+-- Триггеры создаются в той же транзакции после бэкфилла, чтобы не потерять изменения между ними
+
+CREATE OR REPLACE FUNCTION log_manual_progress_submissions() RETURNS TRIGGER AS $$
+BEGIN
+    IF (TG_OP = 'INSERT' AND NEW.m1_submission_date IS NOT NULL) OR (TG_OP = 'UPDATE' AND (NEW.m1_submission_date IS DISTINCT FROM OLD.m1_submission_date OR NEW.m1_mentor_id IS DISTINCT FROM OLD.m1_mentor_id)) THEN
+        INSERT INTO module_submissions (student_id, direction, module_code, mentor_id, submitted_at)
+        VALUES (NEW.student_id, 'manual', 'm1', NEW.m1_mentor_id, NEW.m1_submission_date);
+    END IF;
+    IF (TG_OP = 'INSERT' AND NEW.m2_1_2_2_submission_date IS NOT NULL) OR (TG_OP = 'UPDATE' AND (NEW.m2_1_2_2_submission_date IS DISTINCT FROM OLD.m2_1_2_2_submission_date OR NEW.m2_1_2_2_mentor_id IS DISTINCT FROM OLD.m2_1_2_2_mentor_id)) THEN
+        INSERT INTO module_submissions (student_id, direction, module_code, mentor_id, submitted_at)
+        VALUES (NEW.student_id, 'manual', 'm2_1_2_2', NEW.m2_1_2_2_mentor_id, NEW.m2_1_2_2_submission_date);
+    END IF;
+    IF (TG_OP = 'INSERT' AND NEW.m2_3_3_1_submission_date IS NOT NULL) OR (TG_OP = 'UPDATE' AND (NEW.m2_3_3_1_submission_date IS DISTINCT FROM OLD.m2_3_3_1_submission_date OR NEW.m2_3_3_1_mentor_id IS DISTINCT FROM OLD.m2_3_3_1_mentor_id)) THEN
+        INSERT INTO module_submissions (student_id, direction, module_code, mentor_id, submitted_at)
+        VALUES (NEW.student_id, 'manual', 'm2_3_3_1', NEW.m2_3_3_1_mentor_id, NEW.m2_3_3_1_submission_date);
+    END IF;
+    IF (TG_OP = 'INSERT' AND NEW.m3_2_submission_date IS NOT NULL) OR (TG_OP = 'UPDATE' AND (NEW.m3_2_submission_date IS DISTINCT FROM OLD.m3_2_submission_date OR NEW.m3_2_mentor_id IS DISTINCT FROM OLD.m3_2_mentor_id)) THEN
+        INSERT INTO module_submissions (student_id, direction, module_code, mentor_id, submitted_at)
+        VALUES (NEW.student_id, 'manual', 'm3_2', NEW.m3_2_mentor_id, NEW.m3_2_submission_date);
+    END IF;
+    IF (TG_OP = 'INSERT' AND NEW.m3_3_submission_date IS NOT NULL) OR (TG_OP = 'UPDATE' AND (NEW.m3_3_submission_date IS DISTINCT FROM OLD.m3_3_submission_date OR NEW.m3_3_mentor_id IS DISTINCT FROM OLD.m3_3_mentor_id)) THEN
+        INSERT INTO module_submissions (student_id, direction, module_code, mentor_id, submitted_at)
+        VALUES (NEW.student_id, 'manual', 'm3_3', NEW.m3_3_mentor_id, NEW.m3_3_submission_date);
+    END IF;
+    IF (TG_OP = 'INSERT' AND NEW.m4_1_submission_date IS NOT NULL) OR (TG_OP = 'UPDATE' AND (NEW.m4_1_submission_date IS DISTINCT FROM OLD.m4_1_submission_date OR NEW.m4_1_mentor_id IS DISTINCT FROM OLD.m4_1_mentor_id)) THEN
+        INSERT INTO module_submissions (student_id, direction, module_code, mentor_id, submitted_at)
+        VALUES (NEW.student_id, 'manual', 'm4_1', NEW.m4_1_mentor_id, NEW.m4_1_submission_date);
+    END IF;
+    IF (TG_OP = 'INSERT' AND NEW.m4_2_4_3_submission_date IS NOT NULL) OR (TG_OP = 'UPDATE' AND (NEW.m4_2_4_3_submission_date IS DISTINCT FROM OLD.m4_2_4_3_submission_date OR NEW.m4_2_4_3_mentor_id IS DISTINCT FROM OLD.m4_2_4_3_mentor_id)) THEN
+        INSERT INTO module_submissions (student_id, direction, module_code, mentor_id, submitted_at)
+        VALUES (NEW.student_id, 'manual', 'm4_2_4_3', NEW.m4_2_4_3_mentor_id, NEW.m4_2_4_3_submission_date);
+    END IF;
+    IF (TG_OP = 'INSERT' AND NEW.m4_mock_exam_passed_date IS NOT NULL) OR (TG_OP = 'UPDATE' AND (NEW.m4_mock_exam_passed_date IS DISTINCT FROM OLD.m4_mock_exam_passed_date OR NEW.m4_mock_exam_mentor_id IS DISTINCT FROM OLD.m4_mock_exam_mentor_id)) THEN
+        INSERT INTO module_submissions (student_id, direction, module_code, mentor_id, submitted_at)
+        VALUES (NEW.student_id, 'manual', 'm4_mock_exam', NEW.m4_mock_exam_mentor_id, NEW.m4_mock_exam_passed_date);
+    END IF;
+    IF (TG_OP = 'INSERT' AND NEW.m5_start_date IS NOT NULL) OR (TG_OP = 'UPDATE' AND (NEW.m5_start_date IS DISTINCT FROM OLD.m5_start_date)) THEN
+        INSERT INTO module_submissions (student_id, direction, module_code, mentor_id, submitted_at)
+        VALUES (NEW.student_id, 'manual', 'm5', NULL, NEW.m5_start_date);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_manual_progress_submissions ON manual_progress;
+CREATE TRIGGER trg_manual_progress_submissions
+    AFTER INSERT OR UPDATE ON manual_progress
+    FOR EACH ROW EXECUTE FUNCTION log_manual_progress_submissions();
+
+CREATE OR REPLACE FUNCTION log_auto_progress_submissions() RETURNS TRIGGER AS $$
+BEGIN
+    IF (TG_OP = 'INSERT' AND NEW.m2_exam_passed_date IS NOT NULL) OR (TG_OP = 'UPDATE' AND (NEW.m2_exam_passed_date IS DISTINCT FROM OLD.m2_exam_passed_date OR NEW.m2_exam_mentor_id IS DISTINCT FROM OLD.m2_exam_mentor_id)) THEN
+        INSERT INTO module_submissions (student_id, direction, module_code, mentor_id, submitted_at)
+        VALUES (NEW.student_id, 'auto', 'm2_exam', NEW.m2_exam_mentor_id, NEW.m2_exam_passed_date);
+    END IF;
+    IF (TG_OP = 'INSERT' AND NEW.m3_exam_passed_date IS NOT NULL) OR (TG_OP = 'UPDATE' AND (NEW.m3_exam_passed_date IS DISTINCT FROM OLD.m3_exam_passed_date OR NEW.m3_exam_mentor_id IS DISTINCT FROM OLD.m3_exam_mentor_id)) THEN
+        INSERT INTO module_submissions (student_id, direction, module_code, mentor_id, submitted_at)
+        VALUES (NEW.student_id, 'auto', 'm3_exam', NEW.m3_exam_mentor_id, NEW.m3_exam_passed_date);
+    END IF;
+    IF (TG_OP = 'INSERT' AND NEW.m4_topic_passed_date IS NOT NULL) OR (TG_OP = 'UPDATE' AND (NEW.m4_topic_passed_date IS DISTINCT FROM OLD.m4_topic_passed_date OR NEW.m4_topic_mentor_id IS DISTINCT FROM OLD.m4_topic_mentor_id)) THEN
+        INSERT INTO module_submissions (student_id, direction, module_code, mentor_id, submitted_at)
+        VALUES (NEW.student_id, 'auto', 'm4_topic', NEW.m4_topic_mentor_id, NEW.m4_topic_passed_date);
+    END IF;
+    IF (TG_OP = 'INSERT' AND NEW.m5_topic_passed_date IS NOT NULL) OR (TG_OP = 'UPDATE' AND (NEW.m5_topic_passed_date IS DISTINCT FROM OLD.m5_topic_passed_date OR NEW.m5_topic_mentor_id IS DISTINCT FROM OLD.m5_topic_mentor_id)) THEN
+        INSERT INTO module_submissions (student_id, direction, module_code, mentor_id, submitted_at)
+        VALUES (NEW.student_id, 'auto', 'm5_topic', NEW.m5_topic_mentor_id, NEW.m5_topic_passed_date);
+    END IF;
+    IF (TG_OP = 'INSERT' AND NEW.m6_topic_passed_date IS NOT NULL) OR (TG_OP = 'UPDATE' AND (NEW.m6_topic_passed_date IS DISTINCT FROM OLD.m6_topic_passed_date OR NEW.m6_topic_mentor_id IS DISTINCT FROM OLD.m6_topic_mentor_id)) THEN
+        INSERT INTO module_submissions (student_id, direction, module_code, mentor_id, submitted_at)
+        VALUES (NEW.student_id, 'auto', 'm6_topic', NEW.m6_topic_mentor_id, NEW.m6_topic_passed_date);
+    END IF;
+    IF (TG_OP = 'INSERT' AND NEW.m7_topic_passed_date IS NOT NULL) OR (TG_OP = 'UPDATE' AND (NEW.m7_topic_passed_date IS DISTINCT FROM OLD.m7_topic_passed_date OR NEW.m7_topic_mentor_id IS DISTINCT FROM OLD.m7_topic_mentor_id)) THEN
+        INSERT INTO module_submissions (student_id, direction, module_code, mentor_id, submitted_at)
+        VALUES (NEW.student_id, 'auto', 'm7_topic', NEW.m7_topic_mentor_id, NEW.m7_topic_passed_date);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_auto_progress_submissions ON auto_progress;
+CREATE TRIGGER trg_auto_progress_submissions
+    AFTER INSERT OR UPDATE ON auto_progress
+    FOR EACH ROW EXECUTE FUNCTION log_auto_progress_submissions();
+
+COMMIT;
+
+ANALYZE module_submissions;
@@ -0,0 +1,40 @@
+-- Индексы под горячие предикаты отчетов по платежам и FK-индексы таблиц начислений.
+-- Проверка планов: python migrations/explain_payment_indexes.py
+--
+-- На живой базе индексы лучше создавать без блокировки записи:
+-- выполнить каждую команду отдельно (вне транзакции), заменив CREATE INDEX на CREATE INDEX CONCURRENTLY.
+
+-- Платежи студента: debt_checker, check_postpayment_job, calculate_ue_data
+-- (student_id = ? AND status = 'подтвержден' ORDER BY payment_date DESC)
+CREATE INDEX IF NOT EXISTS idx_payments_student_status_date
+    ON payments (student_id, status, payment_date);
+
+-- Платежи за период: calc_total_salaries_for_dates, отчеты по ЗП и комиссиям
+-- (payment_date BETWEEN ? AND ? AND status = 'подтвержден')
+CREATE INDEX IF NOT EXISTS idx_payments_date_status
+    ON payments (payment_date, status);
+
+-- Начисления менторов
+CREATE INDEX IF NOT EXISTS idx_salary_payment_id ON salary (payment_id);
+CREATE INDEX IF NOT EXISTS idx_salary_mentor_id ON salary (mentor_id);
+CREATE INDEX IF NOT EXISTS idx_salary_date_calculated ON salary (date_calculated);
+
+-- Начисления КК
+CREATE INDEX IF NOT EXISTS idx_salary_kk_payment_id ON salary_kk (payment_id);
+CREATE INDEX IF NOT EXISTS idx_salary_kk_kk_id ON salary_kk (kk_id);
+CREATE INDEX IF NOT EXISTS idx_salary_kk_student_id ON salary_kk (student_id);
+CREATE INDEX IF NOT EXISTS idx_salary_kk_date_calculated ON salary_kk (date_calculated);
+
+-- Холдирование
+CREATE INDEX IF NOT EXISTS idx_held_amounts_student_id ON held_amounts (student_id);
+CREATE INDEX IF NOT EXISTS idx_held_amounts_mentor_id ON held_amounts (mentor_id);
+
+-- Принятые темы фуллстеков
+CREATE INDEX IF NOT EXISTS idx_fullstack_topic_assignments_student_id ON fullstack_topic_assignments (student_id);
+CREATE INDEX IF NOT EXISTS idx_fullstack_topic_assignments_mentor_id ON fullstack_topic_assignments (mentor_id);
+
+ANALYZE payments;
+ANALYZE salary;
+ANALYZE salary_kk;
+ANALYZE held_amounts;
+ANALYZE fullstack_topic_assignments;
@@ -0,0 +1,59 @@
+-- Категория платежа вместо поиска по подстроке в payments.comment.
+-- Значения соответствуют data_base.models.PaymentKind.
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'payment_kind') THEN
+        CREATE TYPE payment_kind AS ENUM (
+            'initial', 'extra', 'additional', 'commission', 'bonus', 'refund', 'expense', 'other'
+        );
+    END IF;
+END $$;
+
+-- Правила классификации те же, что в PaymentKind.classify
+CREATE OR REPLACE FUNCTION classify_payment_kind(comment TEXT) RETURNS payment_kind AS $$
+    SELECT CASE
+        WHEN comment ILIKE '%преми%' THEN 'bonus'
+        WHEN comment ILIKE '%комисс%' THEN 'commission'
+        WHEN comment ILIKE '%возврат%' THEN 'refund'
+        WHEN comment ILIKE '%доп расход%' OR comment ILIKE '%системное восстановление%' THEN 'expense'
+        WHEN comment ILIKE '%первонач%' THEN 'initial'
+        WHEN comment ILIKE '%доплат%' THEN 'extra'
+        WHEN comment ILIKE '%платёж%' OR comment ILIKE '%платеж%' THEN 'additional'
+        ELSE 'other'
+    END::payment_kind
+$$ LANGUAGE sql IMMUTABLE;
+
+ALTER TABLE payments ADD COLUMN IF NOT EXISTS payment_kind payment_kind;
+
+-- Backfill существующих записей
+UPDATE payments SET payment_kind = classify_payment_kind(comment) WHERE payment_kind IS NULL;
+
+ALTER TABLE payments ALTER COLUMN payment_kind SET NOT NULL;
+
+-- Платежи, которые пишутся в обход бота (другие сервисы, ручной SQL) без категории,
+-- классифицируются по комментарию
+CREATE OR REPLACE FUNCTION payments_fill_kind() RETURNS trigger AS $$
+BEGIN
+    IF NEW.payment_kind IS NULL THEN
+        NEW.payment_kind := classify_payment_kind(NEW.comment);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_payments_fill_kind ON payments;
+CREATE TRIGGER trg_payments_fill_kind
+    BEFORE INSERT ON payments
+    FOR EACH ROW EXECUTE FUNCTION payments_fill_kind();
+
+CREATE INDEX IF NOT EXISTS idx_payments_kind_date_status
+    ON payments (payment_kind, payment_date, status);
+
+CREATE INDEX IF NOT EXISTS idx_payments_student_kind_date
+    ON payments (student_id, payment_kind, payment_date);
+
+-- Отчеты больше не фильтруют comment ILIKE — триграммный индекс по comment только замедляет запись
+DROP INDEX IF EXISTS idx_payments_comment_trgm;
+
+ANALYZE payments;
@@ -0,0 +1,20 @@
+-- Индексы для серверного поиска студентов по ФИО и Telegram (data_base/operations.search_students).
+-- Поиск регистронезависимый по подстроке: lower(fio) LIKE '%запрос%'.
+-- Триграммные GIN-индексы обслуживают поиск по подстроке,
+-- btree с text_pattern_ops — поиск по префиксу и точное совпадение.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_students_fio_trgm
+    ON students USING gin (lower(fio) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_students_telegram_trgm
+    ON students USING gin (lower(telegram) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_students_fio_lower_prefix
+    ON students (lower(fio) text_pattern_ops);
+
+CREATE INDEX IF NOT EXISTS idx_students_telegram_lower_prefix
+    ON students (lower(telegram) text_pattern_ops);
+
+ANALYZE students;
@@ -0,0 +1,12 @@
+-- Кэш file_id Telegram для повторной отправки договоров и VPN-конфигов
+-- без загрузки файла (data_base/file_id_cache.py, utils/telegram_files.py).
+
+CREATE TABLE IF NOT EXISTS telegram_file_cache (
+    kind VARCHAR(30) NOT NULL,
+    owner VARCHAR(100) NOT NULL,
+    content_hash VARCHAR(64) NOT NULL,
+    file_id VARCHAR(255) NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+
+    CONSTRAINT pk_telegram_file_cache PRIMARY KEY (kind, owner, content_hash)
+);
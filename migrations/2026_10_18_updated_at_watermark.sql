@@ -0,0 +1,33 @@
+-- updated_at для инкрементальной синхронизации с Airtable (airtable_sync.py --since-last-run)
+-- и таблица водяных знаков синхронизации.
+
+ALTER TABLE students ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT NOW();
+ALTER TABLE mentors ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT NOW();
+
+-- Триггер ставит updated_at при любом UPDATE, в том числе из ручного SQL и других сервисов
+CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_students_updated_at ON students;
+CREATE TRIGGER trg_students_updated_at
+    BEFORE UPDATE ON students
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+DROP TRIGGER IF EXISTS trg_mentors_updated_at ON mentors;
+CREATE TRIGGER trg_mentors_updated_at
+    BEFORE UPDATE ON mentors
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+CREATE INDEX IF NOT EXISTS idx_students_updated_at ON students (updated_at);
+CREATE INDEX IF NOT EXISTS idx_mentors_updated_at ON mentors (updated_at);
+
+-- Момент, на который таблица полностью выгружена в Airtable
+CREATE TABLE IF NOT EXISTS airtable_sync_watermark (
+    pg_table VARCHAR(64) PRIMARY KEY,
+    synced_until TIMESTAMP NOT NULL,
+    last_full_sync_at TIMESTAMP
+);
@@ -1,11 +1,33 @@
 
+import argparse
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import psycopg2
+from psycopg2.extras import execute_values
 import requests
 import datetime
 import time
 from decimal import Decimal
 from config import AIRTABLE_API_KEY, AIRTABLE_BASE_ID, POSTGRESQL_CONFIG
 
+# Адрес API можно подменить локальной заглушкой для проверки синхронизации
+AIRTABLE_API_URL = os.getenv("AIRTABLE_API_URL", "https://api.airtable.com/v0").rstrip("/")
+AIRTABLE_BATCH_SIZE = 10  # Максимум записей в одном запросе create/update
+AIRTABLE_REQUESTS_PER_SECOND = 5  # Лимит Airtable на базу
+MAX_RETRIES = 5
+RETRY_AFTER_429 = 30  # секунды
+FETCH_ITERSIZE = 500  # Строк за один FETCH серверного курсора
+STATE_CHUNK_SIZE = 500  # Строк, для которых состояние читается одним запросом
+SYNC_EXCLUDED_COLUMNS = {"updated_at"}  # Служебные колонки, которых нет в Airtable
+# Инкрементальный режим берёт строки с updated_at позже водяного знака минус запас:
+# транзакция, начатая до прошлой выгрузки и закоммиченная после, не потеряется
+WATERMARK_OVERLAP = datetime.timedelta(minutes=10)
+FULL_RECONCILE_DAYS = 7  # --since-last-run делает полную сверку, если последней больше недели
+
 # Таблицы для синхронизации
 TABLES_TO_SYNC = [
     {
@@ -20,6 +42,26 @@ TABLES_TO_SYNC = [
     }
 ]
 
+class AirtableFetchError(Exception):
+    """Не удалось получить полный список записей таблицы Airtable."""
+
+
+class RateLimiter:
+    """Общий для всех потоков лимит: не больше rate запросов в секунду."""
+
+    def __init__(self, rate):
+        self._interval = 1.0 / rate
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self._interval
+        if wait > 0:
+            time.sleep(wait)
+
 def serialize_for_airtable(record: dict, key_field: str):
     result = {}
     for k, v in record.items():
@@ -36,20 +78,54 @@ def serialize_for_airtable(record: dict, key_field: str):
 def get_connection():
     return psycopg2.connect(**POSTGRESQL_CONFIG)
 
-def fetch_rows(conn, table_name):
-    with conn.cursor() as cur:
-        cur.execute(f"SELECT * FROM {table_name}")
-        columns = [desc[0] for desc in cur.description]
-        rows = [dict(zip(columns, row)) for row in cur.fetchall()]
-        print(f"📊 Получено из PostgreSQL ({table_name}): {len(rows)} записей")
-        if rows:
-            print(f"📋 Поля: {list(rows[0].keys())}")
-            print(f"🔍 Пример записи: {rows[0]}")
-        return rows
-
-def get_existing_airtable_records(table_id):
-    url = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{table_id}"
-    headers = {"Authorization": f"Bearer {AIRTABLE_API_KEY}"}
+def fetch_rows(conn, table_name, since=None):
+    """
+    Построчно отдаёт строки таблицы через серверный (named) курсор:
+    с сервера за раз приходит FETCH_ITERSIZE строк, память не зависит от размера таблицы.
+    since — только строки с updated_at > since.
+    Соединение conn не должно коммититься, пока генератор не дочитан.
+    """
+    with conn.cursor(name=f"airtable_sync_{table_name}") as cur:
+        cur.itersize = FETCH_ITERSIZE
+        if since is not None:
+            cur.execute(f"SELECT * FROM {table_name} WHERE updated_at > %s", (since,))
+        else:
+            cur.execute(f"SELECT * FROM {table_name}")
+        columns = None
+        count = 0
+        for row in cur:
+            if columns is None:
+                # У named-курсора description появляется после первого FETCH
+                columns = [desc[0] for desc in cur.description]
+                print(f"📋 Поля ({table_name}): {columns}")
+            count += 1
+            yield dict(zip(columns, row))
+        print(f"📊 Прочитано из PostgreSQL ({table_name}): {count} записей")
+
+def serialized_rows(conn, table_name, key, since=None):
+    """Генератор (row_key, поля для Airtable, хэш) поверх fetch_rows."""
+    for row in fetch_rows(conn, table_name, since):
+        try:
+            cleaned = serialize_for_airtable(
+                {k: v for k, v in row.items() if v is not None and k not in SYNC_EXCLUDED_COLUMNS}, key
+            )
+            yield normalize_key(cleaned.get(key)), cleaned, content_hash(cleaned)
+        except Exception as e:
+            print(f"❌ Ошибка обработки записи {row}: {e}")
+            continue
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def get_existing_airtable_records(http, limiter, table_id):
+    url = f"{AIRTABLE_API_URL}/{AIRTABLE_BASE_ID}/{table_id}"
     records = []
     offset = None
 
@@ -60,12 +136,12 @@ def get_existing_airtable_records(table_id):
         if offset:
             params["offset"] = offset
 
-        response = requests.get(url, headers=headers, params=params)
-        print(f"📡 Airtable ответ: {response.status_code}")
-        
+        response = airtable_request(http, limiter, "GET", url, params=params)
         if response.status_code != 200:
-            print(f"❌ Ошибка Airtable ({response.status_code}):", response.text)
-            break
+            # Неполный список нельзя использовать: отсутствующие в нём записи были бы созданы повторно
+            raise AirtableFetchError(
+                f"Ошибка Airtable ({response.status_code}) после {len(records)} записей: {response.text}"
+            )
 
         data = response.json()
         records.extend(data.get("records", []))
@@ -74,10 +150,6 @@ def get_existing_airtable_records(table_id):
             break
 
     print(f"📦 Получено из Airtable: {len(records)} записей")
-    if records:
-        print(f"📋 Поля в Airtable: {list(records[0].get('fields', {}).keys())}")
-        print(f"🔍 Пример записи Airtable: {records[0]}")
-    
     return records
 
 def build_airtable_id_map(records, key_field):
@@ -85,15 +157,13 @@ def build_airtable_id_map(records, key_field):
     print(f"🔍 Построение карты ID для поля: {key_field}")
     
     for rec in records:
+        raw_id = rec.get("fields", {}).get(key_field)
         try:
-            raw_id = rec.get("fields", {}).get(key_field)
             if raw_id is None:
                 print(f"⚠️ Пропускаем запись без поля {key_field}: {rec}")
                 continue
                 
-            normalized = str(int(float(raw_id)))
-            id_map[normalized] = rec["id"]
-            print(f"✅ ID маппинг: {raw_id} -> {normalized} -> {rec['id']}")
+            id_map[normalize_key(raw_id)] = rec["id"]
         except (TypeError, ValueError) as e:
             print(f"❌ Ошибка обработки ID {raw_id}: {e}")
             continue
@@ -101,98 +171,236 @@ def build_airtable_id_map(records, key_field):
     print(f"📊 Построена карта ID: {len(id_map)} записей")
     return id_map
 
-def update_to_airtable(record_id, record, table_id, key):
-    url = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{table_id}/{record_id}"
-    headers = {
-        "Authorization": f"Bearer {AIRTABLE_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
-    print(f"🔄 Обновление записи {record_id}:")
-    print(f"   📤 Данные: {record}")
-    
-    response = requests.patch(url, headers=headers, json={"fields": record})
-    time.sleep(0.25)
-    
-    if response.status_code == 200:
-        print(f"✅ Обновлено: {record[key]} ({response.status_code})")
+def normalize_key(raw_id):
+    return str(int(float(raw_id)))
+
+def content_hash(record: dict):
+    payload = json.dumps(record, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def airtable_request(http, limiter, method, url, **kwargs):
+    """Запрос к Airtable через общий лимитер; на 429 ждём и повторяем."""
+    for attempt in range(MAX_RETRIES):
+        limiter.acquire()
+        response = http.request(method, url, timeout=30, **kwargs)
+        if response.status_code != 429:
+            return response
+        # Airtable блокирует базу на 30 секунд после превышения лимита
+        print(f"⏳ Airtable 429, повтор через {RETRY_AFTER_429} с")
+        time.sleep(RETRY_AFTER_429)
+    return response
+
+def load_sync_state(conn, table_name, row_keys):
+    """{row_key: (airtable_record_id, content_hash)} из прошлых запусков — только для переданных ключей."""
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT row_key, airtable_record_id, content_hash FROM airtable_sync_state "
+            "WHERE pg_table = %s AND row_key = ANY(%s)",
+            (table_name, list(row_keys))
+        )
+        state = {row_key: (record_id, row_hash) for row_key, record_id, row_hash in cur.fetchall()}
+    conn.commit()
+    return state
+
+def save_sync_state(conn, table_name, items):
+    """items — [(row_key, airtable_record_id, content_hash)], один upsert на батч."""
+    if not items:
+        return
+    with conn.cursor() as cur:
+        execute_values(cur, """
+            INSERT INTO airtable_sync_state (pg_table, row_key, airtable_record_id, content_hash, synced_at)
+            VALUES %s
+            ON CONFLICT (pg_table, row_key) DO UPDATE
+            SET airtable_record_id = EXCLUDED.airtable_record_id,
+                content_hash = EXCLUDED.content_hash,
+                synced_at = EXCLUDED.synced_at
+        """, [(table_name, row_key, record_id, row_hash, datetime.datetime.now()) for row_key, record_id, row_hash in items])
+    conn.commit()
+
+def db_now(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT NOW()::timestamp")
+        return cur.fetchone()[0]
+
+def load_watermark(conn, table_name):
+    """(synced_until, last_full_sync_at) или (None, None), если таблица ещё не выгружалась."""
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT synced_until, last_full_sync_at FROM airtable_sync_watermark WHERE pg_table = %s",
+            (table_name,)
+        )
+        row = cur.fetchone()
+    conn.commit()
+    return row or (None, None)
+
+def save_watermark(conn, table_name, synced_until, full):
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO airtable_sync_watermark (pg_table, synced_until, last_full_sync_at)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (pg_table) DO UPDATE
+            SET synced_until = EXCLUDED.synced_until,
+                last_full_sync_at = COALESCE(EXCLUDED.last_full_sync_at, airtable_sync_watermark.last_full_sync_at)
+        """, (table_name, synced_until, synced_until if full else None))
+    conn.commit()
+
+def write_batch(http, limiter, conn, table_name, table_id, method, batch):
+    """
+    Отправляет до 10 записей одним запросом (PATCH — обновление, POST — создание)
+    и сохраняет их хэши. batch — [(row_key, airtable_record_id | None, fields, content_hash)].
+    """
+    url = f"{AIRTABLE_API_URL}/{AIRTABLE_BASE_ID}/{table_id}"
+    if method == "PATCH":
+        body = {"records": [{"id": record_id, "fields": fields} for _, record_id, fields, _ in batch]}
     else:
-        print(f"❌ Ошибка обновления: {response.status_code} - {response.text}")
+        body = {"records": [{"fields": fields} for _, _, fields, _ in batch]}
+
+    response = airtable_request(http, limiter, method, url, json=body)
+    if response.status_code != 200:
+        print(f"❌ Ошибка {method} ({table_name}): {response.status_code} - {response.text}")
+        return 0
+
+    # Airtable возвращает записи в том же порядке, что и в запросе
+    returned = response.json().get("records", [])
+    save_sync_state(conn, table_name, [
+        (row_key, rec["id"], row_hash)
+        for (row_key, _, _, row_hash), rec in zip(batch, returned)
+    ])
+    return len(returned)
 
-def create_to_airtable(record, table_id, key):
-    url = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/{table_id}"
-    headers = {
+def sync_table(table_name, airtable_table_id, key, limiter, mode="all"):
+    """
+    mode:
+      "all"         — все строки, неизменившиеся (по хэшу) пропускаются;
+      "incremental" — только строки, изменённые после прошлой выгрузки (--since-last-run);
+      "full"        — полная сверка: все строки + проверка, что записи ещё есть в Airtable (--full).
+    """
+    print(f"\n🔁 Синхронизация таблицы: {table_name} → {airtable_table_id} (ключ {key}, режим {mode})")
+
+    # У каждой таблицы свои подключения и HTTP-сессия — таблицы синхронизируются параллельно.
+    # read_conn держит серверный курсор и не коммитится, состояние пишется через conn.
+    read_conn = get_connection()
+    conn = get_connection()
+    http = requests.Session()
+    http.headers.update({
         "Authorization": f"Bearer {AIRTABLE_API_KEY}",
         "Content-Type": "application/json"
-    }
-    
-    print(f"➕ Создание новой записи:")
-    print(f"   📤 Данные: {record}")
-    
-    response = requests.post(url, headers=headers, json={"fields": record})
-    time.sleep(0.25)
-    
-    if response.status_code == 200:
-        print(f"✅ Добавлено: {record[key]} ({response.status_code})")
-    else:
-        print(f"❌ Ошибка создания: {response.status_code} - {response.text}")
+    })
 
-def sync_table(conn, table_name, airtable_table_id, key):
-    print(f"\n🔁 Синхронизация таблицы: {table_name}")
-    print(f"🔑 Ключевое поле: {key}")
-    print(f"📋 Airtable таблица: {airtable_table_id}")
-    print("=" * 60)
-    
-    # Получаем данные из PostgreSQL
-    rows = fetch_rows(conn, table_name)
-    if not rows:
-        print("⚠️ Нет данных в PostgreSQL")
-        return
-    
-    # Получаем данные из Airtable
-    airtable_records = get_existing_airtable_records(airtable_table_id)
-    airtable_id_map = build_airtable_id_map(airtable_records, key)
+    try:
+        since = None
+        if mode == "incremental":
+            synced_until, last_full_sync_at = load_watermark(conn, table_name)
+            if synced_until is None or last_full_sync_at is None or \
+                    synced_until - last_full_sync_at > datetime.timedelta(days=FULL_RECONCILE_DAYS):
+                print(f"🔎 Давно не было полной сверки {table_name} — выполняем полную")
+                mode = "full"
+            else:
+                since = synced_until - WATERMARK_OVERLAP
+                print(f"⏱ Изменения {table_name} с {since}")
 
-    print(f"\n🔄 Начинаем синхронизацию...")
-    updated_count = 0
-    created_count = 0
+        # Водяной знак — время начала чтения; строки, изменённые позже, попадут в следующий запуск
+        started_at = db_now(read_conn)
 
-    for row in rows:
-        try:
-            cleaned = serialize_for_airtable({k: v for k, v in row.items() if v is not None}, key)
-            row_id = str(int(float(cleaned.get(key))))
-            
-            print(f"\n🔍 Обработка записи {key}={row_id}")
-
-            if row_id in airtable_id_map:
-                print(f"   🔄 Найдена в Airtable, обновляем...")
-                update_to_airtable(airtable_id_map[row_id], cleaned, airtable_table_id, key)
-                updated_count += 1
-            else:
-                print(f"   ➕ Не найдена в Airtable, создаем...")
-                create_to_airtable(cleaned, airtable_table_id, key)
-                created_count += 1
-                
-        except Exception as e:
-            print(f"❌ Ошибка обработки записи {row}: {e}")
-            continue
+        airtable_id_map = None
+        existing_record_ids = None
+        if mode == "full":
+            # Полная сверка: заново получаем записи Airtable, чтобы найти удалённые там строки
+            airtable_id_map = build_airtable_id_map(
+                get_existing_airtable_records(http, limiter, airtable_table_id), key
+            )
+            existing_record_ids = set(airtable_id_map.values())
+
+        to_update, to_create = [], []
+        updated_count = created_count = skipped_count = 0
+        failed = False
+
+        # Строки идут пачками по STATE_CHUNK_SIZE: для каждой пачки читаем только её состояние
+        for chunk in chunked(serialized_rows(read_conn, table_name, key, since), STATE_CHUNK_SIZE):
+            state = load_sync_state(conn, table_name, [row_key for row_key, _, _ in chunk])
+
+            for row_key, cleaned, row_hash in chunk:
+                record_id, saved_hash = state.get(row_key, (None, None))
+                if existing_record_ids is not None and record_id not in existing_record_ids:
+                    record_id = None  # Запись удалили в Airtable — найдём по ключу или создадим заново
+                if record_id and saved_hash == row_hash:
+                    skipped_count += 1
+                    continue
+
+                if not record_id:
+                    # Записи, о которых ещё нет состояния, ищем в Airtable (скачиваем один раз за запуск)
+                    if airtable_id_map is None:
+                        airtable_id_map = build_airtable_id_map(
+                            get_existing_airtable_records(http, limiter, airtable_table_id), key
+                        )
+                    record_id = airtable_id_map.get(row_key)
+
+                if record_id:
+                    to_update.append((row_key, record_id, cleaned, row_hash))
+                else:
+                    to_create.append((row_key, None, cleaned, row_hash))
+
+                if len(to_update) == AIRTABLE_BATCH_SIZE:
+                    sent = write_batch(http, limiter, conn, table_name, airtable_table_id, "PATCH", to_update)
+                    updated_count += sent
+                    failed = failed or sent < len(to_update)
+                    to_update = []
+                if len(to_create) == AIRTABLE_BATCH_SIZE:
+                    sent = write_batch(http, limiter, conn, table_name, airtable_table_id, "POST", to_create)
+                    created_count += sent
+                    failed = failed or sent < len(to_create)
+                    to_create = []
+
+        if to_update:
+            sent = write_batch(http, limiter, conn, table_name, airtable_table_id, "PATCH", to_update)
+            updated_count += sent
+            failed = failed or sent < len(to_update)
+        if to_create:
+            sent = write_batch(http, limiter, conn, table_name, airtable_table_id, "POST", to_create)
+            created_count += sent
+            failed = failed or sent < len(to_create)
 
-    print(f"\n📊 Итоги синхронизации {table_name}:")
-    print(f"   🔄 Обновлено: {updated_count}")
-    print(f"   ➕ Создано: {created_count}")
+        # Водяной знак двигаем только если все записи ушли — иначе следующий запуск повторит их
+        if not failed:
+            save_watermark(conn, table_name, started_at, full=(mode == "full"))
+        else:
+            print(f"⚠️ Были ошибки отправки — водяной знак {table_name} не сдвинут")
+
+        print(f"\n📊 Итоги синхронизации {table_name}:")
+        print(f"   🔄 Обновлено: {updated_count}")
+        print(f"   ➕ Создано: {created_count}")
+        print(f"   ⏭ Без изменений: {skipped_count}")
+    except AirtableFetchError as e:
+        # Без полного списка нельзя ни отличить удалённые в Airtable записи, ни найти существующие по ключу
+        print(f"❌ {e}\n⚠️ Синхронизация {table_name} прервана, водяной знак не сдвинут")
+    finally:
+        http.close()
+        read_conn.close()
+        conn.close()
 
 def main():
-    print("🚀 Запуск синхронизации с Airtable")
+    parser = argparse.ArgumentParser(description="Синхронизация PostgreSQL → Airtable")
+    mode_group = parser.add_mutually_exclusive_group()
+    mode_group.add_argument("--since-last-run", action="store_true",
+                            help="только строки, изменённые после прошлой синхронизации")
+    mode_group.add_argument("--full", action="store_true",
+                            help="полная сверка с Airtable (например, раз в неделю)")
+    args = parser.parse_args()
+    mode = "incremental" if args.since_last_run else "full" if args.full else "all"
+
+    print(f"🚀 Запуск синхронизации с Airtable (режим: {mode})")
     print("=" * 60)
-    
+
+    limiter = RateLimiter(AIRTABLE_REQUESTS_PER_SECOND)
     try:
-        conn = get_connection()
-        print("✅ Подключение к PostgreSQL установлено")
-        
-        for table_conf in TABLES_TO_SYNC:
-            sync_table(conn, table_conf["pg_table"], table_conf["airtable_table_id"], table_conf["key"])
-            
-        conn.close()
+        with ThreadPoolExecutor(max_workers=len(TABLES_TO_SYNC)) as pool:
+            futures = [
+                pool.submit(sync_table, conf["pg_table"], conf["airtable_table_id"], conf["key"], limiter, mode)
+                for conf in TABLES_TO_SYNC
+            ]
+            for future in futures:
+                future.result()
+
         print("\n✅ Синхронизация завершена")
         
     except Exception as e:
@@ -0,0 +1,161 @@
+"""
+Проверка планов отчетных запросов по платежам после 2026_10_18_payment_indexes.sql
+и 2026_10_18_payment_kind.sql.
+
+Для каждого запроса выполняется EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) дважды:
+с запретом индексных сканов (так выглядел план до миграции) и в обычном режиме.
+Скрипт печатает типы узлов, использованные индексы и время выполнения.
+
+Запуск (из каталога migrations, как airtable_sync.py):
+    python explain_payment_indexes.py [--date-from 2025-01-01] [--date-to 2025-12-31]
+"""
+import argparse
+import datetime
+import json
+
+import psycopg2
+
+from config import POSTGRESQL_CONFIG
+
+# Запросы повторяют фильтры debt_checker.py, check_postpayment_job.py,
+# calc_total_salaries_for_dates и calculate_ue_data
+QUERIES = [
+    (
+        "Должники по предоплате (debt_checker)",
+        """
+        SELECT s.id, s.fio, s.telegram, s.chat_id, s.total_cost, s.payment_amount
+        FROM students s
+        LEFT JOIN (
+            SELECT student_id, MAX(payment_date) AS last_date FROM payments
+            WHERE student_id IS NOT NULL AND status = 'подтвержден'
+              AND payment_kind IN ('initial', 'extra', 'additional')
+            GROUP BY student_id
+        ) lp ON lp.student_id = s.id
+        WHERE s.total_cost > s.payment_amount AND s.training_status != 'Не учится'
+          AND (lp.last_date IS NULL OR lp.last_date <= CURRENT_DATE - 30)
+        """,
+    ),
+    (
+        "Устроившиеся и последняя комиссия (check_postpayment_job)",
+        """
+        SELECT s.id, s.commission, s.salary, s.commission_paid, s.employment_date, lc.last_commission_date
+        FROM students s
+        LEFT JOIN (
+            SELECT student_id, MAX(payment_date) AS last_commission_date FROM payments
+            WHERE payment_kind = 'commission' AND status = 'подтвержден'
+            GROUP BY student_id
+        ) lc ON lc.student_id = s.id
+        WHERE s.training_status = 'Устроился' AND s.commission IS NOT NULL
+        """,
+    ),
+    (
+        "Платежи за период (calc_total_salaries_for_dates)",
+        """
+        SELECT p.id, p.amount, p.payment_kind, s.training_type
+        FROM payments p LEFT JOIN students s ON s.id = p.student_id
+        WHERE p.payment_date BETWEEN %(date_from)s AND %(date_to)s
+          AND p.status = 'подтвержден' AND p.comment IS NOT NULL
+        """,
+    ),
+    (
+        "Комиссии за период (calculate_ue_data)",
+        """
+        SELECT student_id, SUM(amount) FROM payments
+        WHERE payment_date BETWEEN %(date_from)s AND %(date_to)s
+          AND status = 'подтвержден' AND payment_kind = 'commission'
+        GROUP BY student_id
+        """,
+    ),
+    (
+        "Начисления КК за период (SalaryReport)",
+        """
+        SELECT sk.id, sk.calculated_amount, p.amount
+        FROM salary_kk sk JOIN payments p ON p.id = sk.payment_id
+        WHERE sk.date_calculated BETWEEN %(date_from)s AND %(date_to)s
+        """,
+    ),
+    (
+        "Холдирование студента (held_amounts)",
+        "SELECT * FROM held_amounts WHERE student_id = %(student_id)s",
+    ),
+]
+
+DISABLE_INDEXES = "SET LOCAL enable_indexscan = off; SET LOCAL enable_bitmapscan = off; SET LOCAL enable_indexonlyscan = off;"
+
+
+def walk_plan(node, nodes):
+    nodes.append((node.get("Node Type"), node.get("Index Name"), node.get("Relation Name")))
+    for child in node.get("Plans", []):
+        walk_plan(child, nodes)
+    return nodes
+
+
+def explain(conn, sql, params, disable_indexes):
+    with conn.cursor() as cur:
+        if disable_indexes:
+            cur.execute(DISABLE_INDEXES)
+        cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, params)
+        result = cur.fetchone()[0]
+    conn.rollback()
+
+    if isinstance(result, str):
+        result = json.loads(result)
+    plan = result[0]
+    return walk_plan(plan["Plan"], []), plan.get("Execution Time", 0.0)
+
+
+def format_nodes(nodes):
+    parts = []
+    for node_type, index_name, relation in nodes:
+        if index_name:
+            parts.append(f"{node_type} [{index_name}]")
+        elif relation:
+            parts.append(f"{node_type} ({relation})")
+        else:
+            parts.append(node_type)
+    return " → ".join(parts)
+
+
+def pick_student_id(conn):
+    """Берём студента с наибольшим числом платежей — худший случай для отчетов."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT student_id FROM payments WHERE student_id IS NOT NULL
+            GROUP BY student_id ORDER BY COUNT(*) DESC LIMIT 1
+        """)
+        row = cur.fetchone()
+    conn.rollback()
+    return row[0] if row else 0
+
+
+def main():
+    today = datetime.date.today()
+    parser = argparse.ArgumentParser(description="EXPLAIN отчетных запросов по платежам")
+    parser.add_argument("--date-from", default=today.replace(day=1).isoformat())
+    parser.add_argument("--date-to", default=today.isoformat())
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**POSTGRESQL_CONFIG)
+    try:
+        params = {
+            "student_id": pick_student_id(conn),
+            "date_from": args.date_from,
+            "date_to": args.date_to,
+        }
+        print(f"Параметры: {params}\n")
+
+        for title, sql in QUERIES:
+            before_nodes, before_ms = explain(conn, sql, params, disable_indexes=True)
+            after_nodes, after_ms = explain(conn, sql, params, disable_indexes=False)
+            uses_index = any(index_name for _, index_name, _ in after_nodes)
+
+            print(f"📊 {title}")
+            print(f"   без индексов: {before_ms:8.2f} мс | {format_nodes(before_nodes)}")
+            print(f"   с индексами:  {after_ms:8.2f} мс | {format_nodes(after_nodes)}")
+            print(f"   {'✅ используется индекс' if uses_index else '⚠️ индекс не используется'}\n")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 import logging
 from datetime import date
 from data_base.db import session
-from data_base.models import Student, ManualProgress, AutoProgress, Salary
+from data_base.models import Student, Salary, ModuleSubmission
+from data_base.module_submissions import submissions_in_period, MANUAL
 
 logging.basicConfig(level=logging.INFO, format='%(message)s')
 logger = logging.getLogger(__name__)
@@ -13,45 +14,43 @@ def deep_audit_submissions():
     start_date = date(2025, 12, 1)
     end_date = date(2025, 12, 31)
 
-    # Маппинг для поиска в текстовых комментариях (из вашего скриншота)
-    manual_search = [
-        ('m1_submission_date', 'm1_mentor_id', '1 модуль'),
-        ('m2_1_2_2_submission_date', 'm2_1_2_2_mentor_id', 'Тема 2.1 + 2.2'),
-        ('m2_3_3_1_submission_date', 'm2_3_3_1_mentor_id', 'Тема 2.3 + 3.1'),
-        ('m3_2_submission_date', 'm3_2_mentor_id', 'Тема 3.2'),
-        ('m3_3_submission_date', 'm3_3_mentor_id', 'Тема 3.3'),
-        ('m4_mock_exam_passed_date', 'm4_mock_exam_mentor_id', 'экзамен')
-    ]
+    # Маппинг для поиска в текстовых комментариях (из вашего скриншота): код темы в module_submissions -> текст
+    manual_search = {
+        'm1': '1 модуль',
+        'm2_1_2_2': 'Тема 2.1 + 2.2',
+        'm2_3_3_1': 'Тема 2.3 + 3.1',
+        'm3_2': 'Тема 3.2',
+        'm3_3': 'Тема 3.3',
+        'm4_mock_exam': 'экзамен',
+    }
 
     stats = {"total_found_in_progress": 0, "verified": 0, "missing": 0}
 
-    # Получаем всех студентов
-    students = session.query(Student).all()
+    # Сдачи ручных тем за период из журнала module_submissions (индекс по дате) вместо обхода всего прогресса
+    submissions = submissions_in_period(
+        session, start_date, end_date, direction=MANUAL, module_codes=manual_search
+    ).join(Student, Student.id == ModuleSubmission.student_id).with_entities(
+        ModuleSubmission.module_code, ModuleSubmission.mentor_id, ModuleSubmission.submitted_at,
+        Student.id, Student.fio, Student.telegram
+    ).all()
 
-    for st in students:
-        # 1. Проверка ManualProgress
-        mp = session.query(ManualProgress).filter_by(student_id=st.id).first()
-        if mp:
-            for date_col, mentor_col, search_text in manual_search:
-                p_date = getattr(mp, date_col)
-                m_id = getattr(mp, mentor_col)
+    for module_code, m_id, p_date, student_id, fio, telegram in submissions:
+        search_text = manual_search[module_code]
+        stats["total_found_in_progress"] += 1
 
-                if p_date and start_date <= p_date <= end_date:
-                    stats["total_found_in_progress"] += 1
+        # Ищем запись в Salary по ментору и упоминанию ника или текста темы
+        # На скриншоте видно формат: "Принял Тема ... у @username"
+        exists = session.query(Salary).filter(
+            Salary.mentor_id == m_id,
+            Salary.comment.ilike(f"%{search_text}%"),
+            Salary.comment.ilike(f"%{telegram}%")
+        ).first()
 
-                    # Ищем запись в Salary по ментору и упоминанию ника или текста темы
-                    # На скриншоте видно формат: "Принял Тема ... у @username"
-                    exists = session.query(Salary).filter(
-                        Salary.mentor_id == m_id,
-                        Salary.comment.ilike(f"%{search_text}%"),
-                        Salary.comment.ilike(f"%{st.telegram}%")
-                    ).first()
-
-                    if exists:
-                        stats["verified"] += 1
-                    else:
-                        logger.warning(f"❌ ПРОПУЩЕНО: {st.fio} (@{st.telegram}){st.id} | {search_text} | Дата: {p_date}")
-                        stats["missing"] += 1
+        if exists:
+            stats["verified"] += 1
+        else:
+            logger.warning(f"❌ ПРОПУЩЕНО: {fio} (@{telegram}){student_id} | {search_text} | Дата: {p_date}")
+            stats["missing"] += 1
 
     logger.info(f"""
 -------------------------------------------
@@ -0,0 +1,168 @@
+import asyncio
+import itertools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from data_base.db import close_session
+
+logger = logging.getLogger(__name__)
+
+# Настройки пула тяжёлых задач (переопределяются переменными окружения)
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))  # одновременно выполняемых задач
+REPORT_QUEUE_SIZE = int(os.getenv("REPORT_QUEUE_SIZE", "20"))  # максимум задач в очереди и в работе
+REPORT_JOB_TIMEOUT = int(os.getenv("REPORT_JOB_TIMEOUT", "300"))  # секунды
+
+
+class JobQueueFullError(Exception):
+    """Очередь тяжёлых задач заполнена."""
+
+
+def _run_in_worker(func, args, kwargs):
+    """
+    Выполняет задачу в потоке пула.
+    У потока своя сессия БД (scoped по потоку), она закрывается после каждой задачи.
+    """
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_session()
+
+
+async def _send_text(bot, chat_id, result, reply_markup=None):
+    from commands.student_management_command import split_long_message
+
+    parts = split_long_message(str(result))
+    for i, part in enumerate(parts):
+        # Клавиатуру прикрепляем к последнему сообщению
+        markup = reply_markup if i == len(parts) - 1 else None
+        await bot.send_message(chat_id=chat_id, text=part, reply_markup=markup)
+
+
+class ReportJobQueue:
+    """
+    Пул для тяжёлых отчётов и генерации документов.
+
+    Хендлер ставит задачу через submit() и сразу отвечает пользователю,
+    а результат отправляется в чат, когда задача завершится. Одновременно
+    выполняется не больше max_workers задач, в очереди — не больше max_pending,
+    у каждой задачи есть таймаут и её можно отменить по job_id.
+    """
+
+    def __init__(self, max_workers=REPORT_WORKERS, max_pending=REPORT_QUEUE_SIZE, timeout=REPORT_JOB_TIMEOUT):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report")
+        self._semaphore = None
+        self._ids = itertools.count(1)
+        # {job_id: (asyncio.Task, chat_id, title)}
+        self._jobs = {}
+
+    @property
+    def pending(self):
+        return len(self._jobs)
+
+    def submit(self, bot, chat_id, func, *args, title="Отчет", on_result=None, reply_markup=None,
+               timeout=None, **kwargs):
+        """
+        Ставит func(*args, **kwargs) в очередь и возвращает job_id.
+
+        on_result(bot, chat_id, result) — корутина доставки результата;
+        по умолчанию результат отправляется текстом (с разбивкой на части).
+        В func нельзя передавать ORM-объекты текущей сессии — только id и простые значения.
+        """
+        if len(self._jobs) >= self.max_pending:
+            raise JobQueueFullError(f"В очереди уже {len(self._jobs)} задач")
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+
+        job_id = next(self._ids)
+        task = asyncio.get_running_loop().create_task(
+            self._run(job_id, bot, chat_id, func, args, kwargs, title, on_result, reply_markup,
+                      timeout or self.timeout)
+        )
+        self._jobs[job_id] = (task, chat_id, title)
+        return job_id
+
+    def cancel(self, job_id):
+        """Отменяет задачу. Уже запущенный в потоке расчёт доработает, но результат не будет отправлен."""
+        job = self._jobs.get(job_id)
+        if not job:
+            return False
+        job[0].cancel()
+        return True
+
+    def cancel_chat_jobs(self, chat_id):
+        """Отменяет все задачи чата, возвращает количество отменённых."""
+        job_ids = [job_id for job_id, (_, job_chat_id, _) in self._jobs.items() if job_chat_id == chat_id]
+        for job_id in job_ids:
+            self.cancel(job_id)
+        return len(job_ids)
+
+    async def _run(self, job_id, bot, chat_id, func, args, kwargs, title, on_result, reply_markup, timeout):
+        loop = asyncio.get_running_loop()
+        try:
+            async with self._semaphore:
+                logger.info(f"▶️ Задача #{job_id} ({title}) запущена")
+                result = await asyncio.wait_for(
+                    loop.run_in_executor(self._executor, _run_in_worker, func, args, kwargs),
+                    timeout=timeout
+                )
+
+            if on_result is not None:
+                await on_result(bot, chat_id, result)
+            else:
+                await _send_text(bot, chat_id, result, reply_markup)
+            logger.info(f"✅ Задача #{job_id} ({title}) выполнена")
+
+        except asyncio.TimeoutError:
+            logger.error(f"⏱ Задача #{job_id} ({title}) превысила таймаут {timeout}с")
+            await bot.send_message(chat_id=chat_id, text=f"⏱ {title}: превышено время ожидания ({timeout} с).",
+                                   reply_markup=reply_markup)
+        except asyncio.CancelledError:
+            logger.info(f"🚫 Задача #{job_id} ({title}) отменена")
+            await bot.send_message(chat_id=chat_id, text=f"🚫 {title}: формирование отменено.",
+                                   reply_markup=reply_markup)
+        except Exception as e:
+            logger.error(f"❌ Ошибка в задаче #{job_id} ({title}): {e}")
+            await bot.send_message(chat_id=chat_id, text=f"❌ {title}: ошибка при формировании: {e}",
+                                   reply_markup=reply_markup)
+        finally:
+            self._jobs.pop(job_id, None)
+
+    def shutdown(self):
+        for task, _, _ in list(self._jobs.values()):
+            task.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Общий пул для всех хендлеров бота
+report_jobs = ReportJobQueue()
+
+
+async def submit_report(update, context, func, *args, title="Отчет", on_result=None, reply_markup=None, **kwargs):
+    """
+    Ставит тяжёлый отчёт в пул и сразу отвечает пользователю.
+    Возвращает job_id или None, если очередь заполнена.
+    """
+    try:
+        job_id = report_jobs.submit(
+            context.bot, update.effective_chat.id, func, *args,
+            title=title, on_result=on_result, reply_markup=reply_markup, **kwargs
+        )
+    except JobQueueFullError:
+        await update.effective_message.reply_text(
+            "⏳ Сейчас формируется слишком много отчетов. Попробуйте через пару минут.",
+            reply_markup=reply_markup
+        )
+        return None
+
+    await update.effective_message.reply_text(f"⏳ {title}: формируется, результат пришлю отдельным сообщением.")
+    return job_id
+
+
+async def shutdown_report_jobs(application):
+    """post_shutdown-хук Application: отменяет незавершённые задачи и останавливает пул."""
+    report_jobs.shutdown()
@@ -0,0 +1,32 @@
+import logging
+
+from telegram.ext import Application
+
+from data_base.db import update_session_scope
+
+logger = logging.getLogger(__name__)
+
+
+class DBSessionApplication(Application):
+    """
+    Application, который оборачивает обработку каждого апдейта в отдельную сессию БД.
+
+    Сессия открывается при получении апдейта, в конце откатывается всё, что хендлер
+    не закоммитил сам (в т.ч. изменения упавшего хендлера), и закрывается, возвращая соединение в пул. Хендлеры продолжают
+    использовать `from data_base.db import session` — прокси сам находит сессию апдейта.
+
+    Подключение: Application.builder().application_class(DBSessionApplication)
+    """
+
+    async def process_update(self, update: object) -> None:
+        user_data = None
+        user = getattr(update, "effective_user", None)
+        if user is not None and user.id in self.user_data:
+            user_data = self.user_data[user.id]
+
+        try:
+            with update_session_scope(user_data):
+                await super().process_update(update)
+        except Exception as e:
+            # Ошибки хендлеров обрабатывает сам Application, сюда попадают только ошибки rollback
+            logger.error(f"Ошибка при завершении сессии БД для апдейта: {e}")
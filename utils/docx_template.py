@@ -0,0 +1,201 @@
+import io
+import os
+import re
+import threading
+import zipfile
+from xml.sax.saxutils import escape
+
+from lxml import etree
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+_NSMAP = {"w": W_NS}
+
+# Части docx, в которых ищем плейсхолдеры
+TEMPLATE_PARTS = re.compile(r"^word/(document|header\d*|footer\d*)\.xml$")
+PLACEHOLDER = re.compile(r"\{\{[^{}]*\}\}")
+
+# Текстовые узлы параграфа (как paragraph.runs в python-docx + runs внутри гиперссылок и правок)
+_PARAGRAPH_TEXTS = "./w:r/w:t | ./w:hyperlink/w:r/w:t | ./w:ins/w:r/w:t"
+
+# Маркер слота в сериализованном XML: символ из private use area, в шаблонах не встречается
+_SLOT_MARK = "\ue000"
+_SLOT_PATTERN = re.compile(
+    r"<w:t(?: [^>]*)?>{0}(\d+){0}</w:t>".format(_SLOT_MARK).encode("utf-8")
+)
+
+
+def _text_xml(text):
+    """XML содержимого run для текста: переносы строк → <w:br/>, табы → <w:tab/> (как run.text в python-docx)."""
+    parts = []
+    for i, line in enumerate(text.split("\n")):
+        if i:
+            parts.append("<w:br/>")
+        for j, chunk in enumerate(line.split("\t")):
+            if j:
+                parts.append("<w:tab/>")
+            if chunk:
+                parts.append(f'<w:t xml:space="preserve">{escape(chunk)}</w:t>')
+    return "".join(parts) or '<w:t xml:space="preserve"></w:t>'
+
+
+class DocxTemplate:
+    """
+    Предкомпилированный docx-шаблон с плейсхолдерами вида {{name}}.
+
+    При компиляции шаблон разбирается один раз: в каждом параграфе ищутся плейсхолдеры
+    (в том числе разбитые Word'ом на несколько runs), затронутые текстовые узлы <w:t>
+    заменяются слотами, а XML части режется на статические куски между слотами.
+    Рендер только склеивает куски с подставленным текстом и пишет zip — без разбора XML
+    и без проходов по всем параграфам. Остальные runs и их форматирование не трогаются.
+
+    Плейсхолдеры, которых нет в values (или со значением None), остаются в документе как есть.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        # {имя части: [bytes | слот]}, слот — [str | (placeholder, фрагмент исходного текста, начинается ли плейсхолдер в этом узле)]
+        self._compiled = {}
+        # [ZipInfo] частей с плейсхолдерами
+        self._template_parts = []
+        self.placeholders = set()
+
+        # Части без плейсхолдеров (стили, шрифты, картинки) сжимаются один раз в готовый zip,
+        # при рендере он копируется как есть и дописывается только изменённый XML
+        static_zip = io.BytesIO()
+        with zipfile.ZipFile(path) as archive, zipfile.ZipFile(static_zip, "w") as static_archive:
+            for info in archive.infolist():
+                data = archive.read(info)
+                compiled = self._compile_part(data) if TEMPLATE_PARTS.match(info.filename) else None
+                if compiled is None:
+                    static_archive.writestr(info, data)
+                else:
+                    self._compiled[info.filename] = compiled
+                    self._template_parts.append(info)
+        self._static_zip = static_zip.getvalue()
+
+    def _compile_part(self, data):
+        root = etree.fromstring(data)
+        slots = []
+
+        for paragraph in root.iter(f"{{{W_NS}}}p"):
+            nodes = paragraph.xpath(_PARAGRAPH_TEXTS, namespaces=_NSMAP)
+            if not nodes:
+                continue
+            texts = [node.text or "" for node in nodes]
+            full_text = "".join(texts)
+            if "{{" not in full_text:
+                continue
+            matches = list(PLACEHOLDER.finditer(full_text))
+            if not matches:
+                continue
+
+            # Границы текстовых узлов в тексте параграфа
+            bounds = []
+            offset = 0
+            for text in texts:
+                bounds.append((offset, offset + len(text)))
+                offset += len(text)
+
+            for node, (start, end) in zip(nodes, bounds):
+                if not any(m.start() < end and m.end() > start for m in matches):
+                    continue
+                # Текст узла как последовательность литералов и кусков плейсхолдеров
+                pieces = []
+                position = start
+                for m in matches:
+                    if m.end() <= start or m.start() >= end:
+                        continue
+                    piece_start = max(m.start(), start)
+                    piece_end = min(m.end(), end)
+                    if piece_start > position:
+                        pieces.append(full_text[position:piece_start])
+                    pieces.append((m.group(0), full_text[piece_start:piece_end], m.start() >= start))
+                    position = piece_end
+                if position < end:
+                    pieces.append(full_text[position:end])
+
+                node.text = f"{_SLOT_MARK}{len(slots)}{_SLOT_MARK}"
+                slots.append(pieces)
+                self.placeholders.update(m.group(0) for m in matches)
+
+        if not slots:
+            return None
+
+        xml = etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+        chunks = []
+        position = 0
+        for m in _SLOT_PATTERN.finditer(xml):
+            chunks.append(xml[position:m.start()])
+            chunks.append(slots[int(m.group(1))])
+            position = m.end()
+        chunks.append(xml[position:])
+        return chunks
+
+    @staticmethod
+    def _render_slot(pieces, values):
+        text = []
+        for piece in pieces:
+            if isinstance(piece, str):
+                text.append(piece)
+                continue
+            placeholder, original, is_first = piece
+            value = values.get(placeholder)
+            if value is None:
+                text.append(original)
+            elif is_first:
+                text.append(str(value))
+        return _text_xml("".join(text)).encode("utf-8")
+
+    def render_part(self, name, values):
+        chunks = self._compiled[name]
+        return b"".join(
+            chunk if isinstance(chunk, bytes) else self._render_slot(chunk, values)
+            for chunk in chunks
+        )
+
+    def render(self, values, target):
+        """
+        Рендерит документ в target (путь или файловый объект с чтением и seek, например BytesIO).
+        values — {"{{placeholder}}": текст}.
+        """
+        if isinstance(target, (str, os.PathLike)):
+            with open(target, "w+b") as stream:
+                self._write(values, stream)
+        else:
+            self._write(values, target)
+
+    def _write(self, values, stream):
+        stream.write(self._static_zip)
+        with zipfile.ZipFile(stream, "a") as archive:
+            for info in self._template_parts:
+                archive.writestr(info, self.render_part(info.filename, values))
+
+    def render_bytes(self, values):
+        buffer = io.BytesIO()
+        self.render(values, buffer)
+        return buffer.getvalue()
+
+
+class DocxTemplateCache:
+    """
+    Кэш скомпилированных шаблонов процесса по пути к файлу.
+    Шаблон перекомпилируется, если файл на диске изменился (по mtime).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._templates = {}
+
+    def get(self, path):
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            template = self._templates.get(path)
+            if template is None or template.mtime != mtime:
+                template = DocxTemplate(path)
+                self._templates[path] = template
+            return template
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
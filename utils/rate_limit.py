@@ -0,0 +1,35 @@
+import asyncio
+import time
+
+
+class AsyncRateLimiter:
+    """
+    Ограничитель частоты для корутин: не больше `rate` вызовов за `per` секунд.
+
+    Использование:
+        limiter = AsyncRateLimiter(25, 1.0)
+        async with limiter:
+            await bot.send_message(...)
+    """
+
+    def __init__(self, rate, per=1.0):
+        self.rate = rate
+        self.per = per
+        self._interval = per / rate
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self._interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
@@ -1,37 +1,134 @@
 # utils/security.py
-from data_base.db import get_session
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+
 from data_base.models import Mentor, CareerConsultant
 from functools import wraps
 
 from data_base.operations import get_mentor_by_telegram, get_career_consultant_by_telegram
 
+# Настройки кэша ролей (переопределяются переменными окружения)
+ROLE_CACHE_TTL = int(os.getenv("ROLE_CACHE_TTL", "300"))  # секунды
+ROLE_CACHE_SIZE = int(os.getenv("ROLE_CACHE_SIZE", "1024"))  # максимум пользователей в кэше
+
+_MISSING = object()
+
+
+class RoleCache:
+    """
+    TTL + LRU кэш ролей по (telegram id, username).
+
+    Кэшируется и отсутствие роли (None), поэтому после добавления или изменения
+    ментора/КК кэш нужно сбросить — это делают слушатели событий ниже.
+    Изменения в обход ORM (ручной SQL) подхватываются по истечении TTL.
+    """
+
+    def __init__(self, ttl=ROLE_CACHE_TTL, max_size=ROLE_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # {(user_id, username): (role, expires_at)}
+        self._data = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return _MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, role):
+        with self._lock:
+            self._data[key] = (role, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, username=None):
+        """Сбрасывает записи пользователя по username (@login) или весь кэш."""
+        with self._lock:
+            if username is None:
+                self._data.clear()
+                return
+            username = f"@{username.replace('@', '')}"
+            for key in [key for key in self._data if key[1] == username]:
+                del self._data[key]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+role_cache = RoleCache()
+
+
+def invalidate_user_roles(username=None):
+    """Сбросить кэш ролей (после добавления/редактирования ментора или КК)."""
+    role_cache.invalidate(username)
+
+
+def _on_staff_changed(mapper, connection, target):
+    # Telegram мог поменяться, поэтому сбрасываем кэш целиком — такие изменения редки
+    role_cache.invalidate()
+
+
+for _model in (Mentor, CareerConsultant):
+    for _event_name in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event_name, _on_staff_changed)
+
 
 async def get_user_role(user_id: int, username: str = None):
     if not username:
         return  None
 
     formatted_username = f"@{username.replace('@', '')}"
-    session = get_session()
-    try:
-        # 1. Проверяем КК (возвращаем именно "cc")
-        cc = get_career_consultant_by_telegram(formatted_username)
-        if cc and cc.is_active:
-            return "cc"
-
-        # 2. Проверяем Ментора
-        mentor = get_mentor_by_telegram(formatted_username)
-        if mentor:
-            # Если в базе есть флаг is_admin, проверяем его здесь
-            return "admin" if getattr(mentor, 'is_admin', False) else "mentor"
-            # return "mentor"
-
-        # # 3. Резервная проверка админов по ID
-        # if user_id in AUTHORIZED_USERS:
-        #     return "admin"
-
-        return None
-    finally:
-        session.close()
+    cache_key = (user_id, formatted_username)
+    role = role_cache.get(cache_key)
+    if role is not _MISSING:
+        return role
+
+    role = _load_user_role(formatted_username)
+    role_cache.set(cache_key, role)
+    return role
+
+
+def _load_user_role(formatted_username: str):
+    # Запросы идут через сессию текущего апдейта (ей управляет DBSessionApplication)
+
+    # 1. Проверяем КК (возвращаем именно "cc")
+    cc = get_career_consultant_by_telegram(formatted_username)
+    if cc and cc.is_active:
+        return "cc"
+
+    # 2. Проверяем Ментора
+    mentor = get_mentor_by_telegram(formatted_username)
+    if mentor:
+        # Если в базе есть флаг is_admin, проверяем его здесь
+        return "admin" if getattr(mentor, 'is_admin', False) else "mentor"
+        # return "mentor"
+
+    # # 3. Резервная проверка админов по ID
+    # if user_id in AUTHORIZED_USERS:
+    #     return "admin"
+
+    return None
 
 
 def restrict_to(allowed_roles: list):
@@ -1,14 +1,18 @@
 """
 Модуль SSH-клиента для подключения к удалённым серверам.
 
-Обёртка над paramiko: выполнение команд и передача файлов по SFTP.
+Обёртка над paramiko: выполнение команд и передача файлов по SFTP,
+пул долгоживущих соединений с keepalive и переподключением.
 Работает на Linux и Windows.
 """
 
 import logging
 import os
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import paramiko
 
@@ -47,6 +51,11 @@ class SSHClient:
         key_path: Путь к приватному SSH-ключу (поддерживает ``~``).
         port: Порт SSH (по умолчанию 22).
         timeout: Таймаут подключения в секундах (по умолчанию 10).
+        keepalive: Интервал keepalive-пакетов в секундах (0 — выключено).
+
+    Если соединение было установлено и потом оборвалось, ``execute`` и
+    ``download_file`` переподключаются сами. SFTP-сессия открывается один раз
+    и переиспользуется до разрыва соединения.
     """
 
     def __init__(
@@ -56,13 +65,17 @@ class SSHClient:
         key_path: str,
         port: int = 22,
         timeout: int = 10,
+        keepalive: int = 30,
     ) -> None:
         self._host: str = host
         self._port: int = port
         self._username: str = username
         self._key_path: str = self._resolve_key_path(key_path)
         self._timeout: int = timeout
+        self._keepalive: int = keepalive
         self._client: Optional[paramiko.SSHClient] = None
+        self._sftp: Optional[paramiko.SFTPClient] = None
+        self._private_key: Optional[paramiko.Ed25519Key] = None
 
     # ── context manager ──────────────────────────────────────────
 
@@ -91,17 +104,20 @@ class SSHClient:
             client = paramiko.SSHClient()
             client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
-            private_key = paramiko.Ed25519Key.from_private_key_file(self._key_path)
+            if self._private_key is None:
+                self._private_key = paramiko.Ed25519Key.from_private_key_file(self._key_path)
 
             client.connect(
                 hostname=self._host,
                 port=self._port,
                 username=self._username,
-                pkey=private_key,
+                pkey=self._private_key,
                 timeout=self._timeout,
                 allow_agent=False,
                 look_for_keys=False,
             )
+            if self._keepalive:
+                client.get_transport().set_keepalive(self._keepalive)
             self._client = client
             logger.info("SSH: подключено к %s@%s:%s", self._username, self._host, self._port)
 
@@ -120,11 +136,31 @@ class SSHClient:
 
     def disconnect(self) -> None:
         """Закрыть SSH-соединение."""
+        self._close_sftp()
         if self._client is not None:
             self._client.close()
             self._client = None
             logger.info("SSH: отключено от %s", self._host)
 
+    @property
+    def is_connected(self) -> bool:
+        """Соединение установлено и транспорт жив."""
+        if self._client is None:
+            return False
+        transport = self._client.get_transport()
+        return transport is not None and transport.is_active()
+
+    def reconnect(self) -> None:
+        """
+        Переподключиться: закрыть текущее соединение (если есть) и открыть новое.
+
+        Raises:
+            SSHConnectionError: Если соединение не удалось.
+        """
+        logger.info("SSH: переподключение к %s", self._host)
+        self.disconnect()
+        self.connect()
+
     def execute(self, command: str, timeout: int = 30) -> Tuple[str, str, int]:
         """
         Выполнить команду на удалённом сервере.
@@ -140,12 +176,17 @@ class SSHClient:
             SSHConnectionError: Если соединение не установлено.
             SSHCommandError: Если команда завершилась с ненулевым кодом.
         """
-        if self._client is None:
-            raise SSHConnectionError("SSH-соединение не установлено. Вызовите connect().")
+        self._ensure_alive()
 
         logger.debug("SSH exec: %s", command)
 
-        stdin, stdout_ch, stderr_ch = self._client.exec_command(command, timeout=timeout)
+        try:
+            stdin, stdout_ch, stderr_ch = self._client.exec_command(command, timeout=timeout)
+        except (paramiko.SSHException, EOFError, OSError) as e:
+            # Канал не открылся — команда не запускалась, повторяем на новом соединении
+            logger.warning("SSH: не удалось открыть канал на %s (%s), переподключение", self._host, e)
+            self.reconnect()
+            stdin, stdout_ch, stderr_ch = self._client.exec_command(command, timeout=timeout)
         stdin.close()
 
         stdout_text: str = stdout_ch.read().decode("utf-8", errors="replace").strip()
@@ -179,20 +220,22 @@ class SSHClient:
             SSHConnectionError: Если соединение не установлено.
             FileNotFoundError: Если файл на сервере не найден.
         """
-        if self._client is None:
-            raise SSHConnectionError("SSH-соединение не установлено. Вызовите connect().")
+        self._ensure_alive()
 
         local_dir: str = os.path.dirname(local_path)
         if local_dir:
             os.makedirs(local_dir, exist_ok=True)
 
         try:
-            sftp: paramiko.SFTPClient = self._client.open_sftp()
             try:
-                sftp.get(remote_path, local_path)
-                logger.info("SFTP: скачан %s -> %s", remote_path, local_path)
-            finally:
-                sftp.close()
+                self._get_sftp().get(remote_path, local_path)
+            except (paramiko.SSHException, EOFError) as e:
+                # SFTP-канал закрылся (например, сервер оборвал сессию) — открываем заново
+                logger.warning("SFTP: канал к %s закрыт (%s), переоткрываем", self._host, e)
+                self._close_sftp()
+                self._ensure_alive()
+                self._get_sftp().get(remote_path, local_path)
+            logger.info("SFTP: скачан %s -> %s", remote_path, local_path)
         except FileNotFoundError:
             raise FileNotFoundError(f"Файл не найден на сервере: {remote_path}")
         except IOError as e:
@@ -202,6 +245,32 @@ class SSHClient:
 
     # ── private ──────────────────────────────────────────────────
 
+    def _ensure_alive(self) -> None:
+        """
+        Проверить соединение перед операцией и переподключиться, если оно оборвалось.
+
+        Raises:
+            SSHConnectionError: Если ``connect()`` ещё не вызывался или переподключение не удалось.
+        """
+        if self._client is None:
+            raise SSHConnectionError("SSH-соединение не установлено. Вызовите connect().")
+        if not self.is_connected:
+            self.reconnect()
+
+    def _get_sftp(self) -> paramiko.SFTPClient:
+        """Вернуть открытую SFTP-сессию, открыв её при первом обращении."""
+        if self._sftp is None:
+            self._sftp = self._client.open_sftp()
+        return self._sftp
+
+    def _close_sftp(self) -> None:
+        if self._sftp is not None:
+            try:
+                self._sftp.close()
+            except Exception:
+                pass
+            self._sftp = None
+
     @staticmethod
     def _resolve_key_path(key_path: str) -> str:
         """
@@ -222,3 +291,175 @@ class SSHClient:
             raise FileNotFoundError(f"SSH-ключ не найден: {resolved}")
 
         return resolved
+
+
+class SSHConnectionPool:
+    """
+    Пул долгоживущих SSH-соединений к одному серверу.
+
+    Соединения создаются по требованию (не больше ``max_size``), после работы
+    возвращаются в пул и поддерживаются keepalive-пакетами. Перед выдачей
+    соединение проверяется и при необходимости переподключается; соединение,
+    на котором произошла ошибка транспорта, закрывается и не возвращается в пул.
+    Простаивающие дольше ``idle_timeout`` соединения закрываются.
+
+    Пример::
+
+        pool = get_connection_pool("1.2.3.4", "adminbot", "~/.ssh/adminbot_key")
+        with pool.connection() as ssh:
+            stdout, _, _ = ssh.execute("whoami")
+
+    Args:
+        host: Имя хоста или IP-адрес удалённого сервера.
+        username: Имя пользователя для SSH-авторизации.
+        key_path: Путь к приватному SSH-ключу (поддерживает ``~``).
+        port: Порт SSH (по умолчанию 22).
+        max_size: Максимум одновременно открытых соединений.
+        keepalive: Интервал keepalive-пакетов в секундах.
+        idle_timeout: Через сколько секунд простоя соединение закрывается.
+        acquire_timeout: Сколько секунд ждать свободное соединение.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        username: str,
+        key_path: str,
+        port: int = 22,
+        max_size: int = 2,
+        keepalive: int = 30,
+        idle_timeout: int = 600,
+        acquire_timeout: int = 120,
+    ) -> None:
+        self._host: str = host
+        self._username: str = username
+        self._key_path: str = key_path
+        self._port: int = port
+        self._max_size: int = max_size
+        self._keepalive: int = keepalive
+        self._idle_timeout: int = idle_timeout
+        self._acquire_timeout: int = acquire_timeout
+        self._condition = threading.Condition()
+        # [(клиент, время возврата в пул)] — последний возвращённый в конце
+        self._idle: List[Tuple[SSHClient, float]] = []
+        self._created: int = 0
+
+    # ── public API ───────────────────────────────────────────────
+
+    @contextmanager
+    def connection(self) -> Iterator[SSHClient]:
+        """
+        Взять соединение из пула на время блока ``with``.
+
+        Raises:
+            SSHConnectionError: Если подключиться не удалось или не дождались свободного соединения.
+        """
+        client = self._acquire()
+        broken = False
+        try:
+            yield client
+        except FileNotFoundError:
+            # Нет файла на сервере — с соединением всё в порядке
+            raise
+        except (SSHConnectionError, paramiko.SSHException, EOFError, OSError):
+            broken = True
+            raise
+        finally:
+            self._release(client, broken)
+
+    def close(self) -> None:
+        """Закрыть все простаивающие соединения."""
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+            self._condition.notify_all()
+        for client, _ in idle:
+            client.disconnect()
+
+    # ── private ──────────────────────────────────────────────────
+
+    def _acquire(self) -> SSHClient:
+        deadline = time.monotonic() + self._acquire_timeout
+        expired: List[SSHClient] = []
+        client: Optional[SSHClient] = None
+
+        with self._condition:
+            while client is None:
+                now = time.monotonic()
+                while self._idle and now - self._idle[0][1] > self._idle_timeout:
+                    expired.append(self._idle.pop(0)[0])
+                    self._created -= 1
+
+                if self._idle:
+                    client = self._idle.pop()[0]
+                elif self._created < self._max_size:
+                    client = SSHClient(
+                        host=self._host,
+                        username=self._username,
+                        key_path=self._key_path,
+                        port=self._port,
+                        keepalive=self._keepalive,
+                    )
+                    self._created += 1
+                else:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise SSHConnectionError(
+                            f"Нет свободных SSH-соединений к {self._host} (пул: {self._max_size})"
+                        )
+                    self._condition.wait(remaining)
+
+        for expired_client in expired:
+            expired_client.disconnect()
+
+        try:
+            if client.is_connected:
+                return client
+            client.reconnect()
+            return client
+        except Exception:
+            self._release(client, broken=True)
+            raise
+
+    def _release(self, client: SSHClient, broken: bool = False) -> None:
+        if broken:
+            client.disconnect()
+        with self._condition:
+            if broken:
+                self._created -= 1
+            else:
+                self._idle.append((client, time.monotonic()))
+            self._condition.notify()
+
+
+_pools: Dict[Tuple[str, int, str, str], SSHConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_connection_pool(
+    host: str,
+    username: str,
+    key_path: str,
+    port: int = 22,
+    **pool_options: int,
+) -> SSHConnectionPool:
+    """
+    Общий пул соединений процесса для сервера (создаётся при первом обращении).
+
+    Args:
+        host: Имя хоста или IP-адрес удалённого сервера.
+        username: Имя пользователя для SSH-авторизации.
+        key_path: Путь к приватному SSH-ключу.
+        port: Порт SSH.
+        **pool_options: Параметры ``SSHConnectionPool`` для нового пула.
+
+    Returns:
+        Экземпляр ``SSHConnectionPool``.
+    """
+    key = (host, port, username, key_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = SSHConnectionPool(host, username, key_path, port=port, **pool_options)
+            _pools[key] = pool
+        return pool
@@ -0,0 +1,64 @@
+import hashlib
+import logging
+
+from telegram.error import BadRequest
+
+from data_base.db import update_session_scope
+from data_base.file_id_cache import get_cached_file_id, remember_file_id, invalidate_file_ids
+
+logger = logging.getLogger(__name__)
+
+
+def _with_cache_session(func, *args):
+    """Отдельная короткая сессия: хелпер вызывается и из хендлеров, и из фоновых задач."""
+    with update_session_scope() as db_session:
+        result = func(db_session, *args)
+        db_session.commit()
+        return result
+
+
+async def send_cached_document(bot, chat_id, kind, owner, content, filename, caption=None, reply_markup=None):
+    """
+    Отправляет документ, используя file_id Telegram, если такое же содержимое уже загружалось.
+
+    content — байты или путь к файлу. Ключ кэша — (kind, owner, sha256 содержимого),
+    при первой отправке file_id запоминается. Если Telegram не принял file_id,
+    файл загружается заново. Ошибки кэша не мешают отправке.
+    """
+    if isinstance(content, str):
+        with open(content, "rb") as source:
+            content = source.read()
+    content_hash = hashlib.sha256(content).hexdigest()
+
+    try:
+        file_id = _with_cache_session(get_cached_file_id, kind, owner, content_hash)
+    except Exception as e:
+        logger.error(f"Кэш file_id недоступен: {e}")
+        file_id = None
+
+    if file_id:
+        try:
+            return await bot.send_document(
+                chat_id=chat_id, document=file_id, caption=caption, reply_markup=reply_markup
+            )
+        except BadRequest as e:
+            logger.warning(f"file_id для {kind}/{owner} не принят Telegram ({e}), загружаем файл заново")
+
+    message = await bot.send_document(
+        chat_id=chat_id, document=content, filename=filename, caption=caption, reply_markup=reply_markup
+    )
+
+    if message.document is not None:
+        try:
+            _with_cache_session(remember_file_id, kind, owner, content_hash, message.document.file_id)
+        except Exception as e:
+            logger.error(f"Не удалось сохранить file_id для {kind}/{owner}: {e}")
+    return message
+
+
+def forget_cached_documents(kind, owner):
+    """Сбрасывает кэш file_id владельца (вызывается при перевыпуске документа)."""
+    try:
+        _with_cache_session(invalidate_file_ids, kind, owner)
+    except Exception as e:
+        logger.error(f"Не удалось сбросить кэш file_id для {kind}/{owner}: {e}")